@@ -1,6 +1,5 @@
 import abc
 import os
-import time
 
 import markupsafe
 import requests
@@ -16,6 +15,7 @@ from osf.models.user import OSFUser
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from website import settings
 from addons.base import logger, serializer
+from addons.base.crawler import FileTreeCrawler
 from website.oauth.signals import oauth_complete
 from website.util import waterbutler_url_for
 
@@ -574,33 +574,36 @@ class BaseStorageAddon(BaseModel):
 
         res = requests.get(metadata_url)
         if res.status_code != 200:
-            raise HTTPError(res.status_code, data={'error': res.json()})
+            try:
+                error = res.json()
+            except ValueError:
+                # e.g. a gateway error page
+                error = res.text
+            raise HTTPError(res.status_code, data={'error': error})
 
-        # TODO: better throttling?
-        time.sleep(1.0 / 5.0)
         return res.json().get('data', [])
 
     def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None):
         """
-        Recursively get file metadata
+        Get file metadata, listing folders concurrently (see addons.base.crawler)
         """
         filenode = filenode or {
             'path': '/',
             'kind': 'folder',
             'name': self.root_node.name,
         }
-        if filenode.get('kind') == 'file' or 'size' in filenode:
-            return filenode
-
-        kwargs = {
-            'version': version,
-            'cookie': cookie,
-        }
-        filenode['children'] = [
-            self._get_file_tree(child, user, cookie=cookie)
-            for child in self._get_fileobj_child_metadata(filenode, user, **kwargs)
-        ]
-        return filenode
+        # Look up the cookie and guid once, rather than from every listing thread;
+        # the owner's _id is cached on it, so the listings' URLs reuse it
+        if user and not cookie:
+            cookie = user.get_or_create_cookie()
+        node_id = self.owner._id
+
+        crawler = FileTreeCrawler(
+            lambda folder: self._get_fileobj_child_metadata(folder, user, cookie=cookie, version=version),
+            provider=self.config.short_name,
+            label=node_id,
+        )
+        return crawler.crawl(filenode)
 
 
 class BaseOAuthNodeSettings(BaseNodeSettings):
@@ -221,7 +221,7 @@ class NodeSettings(BaseOAuthNodeSettings, BaseStorageAddon):
         if not self.has_auth:
             raise exceptions.AddonError('Addon is not authorized')
         try:
-            Provider(self.external_account).refresh_oauth_key()
+            Provider(self.external_account).refresh_oauth_key_ahead()
             return {'token': self.external_account.oauth_key}
         except BoxClientException as error:
             raise HTTPError(error.status_code, data={'message_long': error.message})
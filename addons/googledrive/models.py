@@ -195,7 +195,8 @@ class NodeSettings(BaseStorageAddon, BaseOAuthNodeSettings):
     def serialize_waterbutler_credentials(self):
         if not self.has_auth:
             raise exceptions.AddonError('Addon is not authorized')
-        return {'token': self.fetch_access_token()}
+        self.api.refresh_oauth_key_ahead()
+        return {'token': self.external_account.oauth_key}
 
     def serialize_waterbutler_settings(self):
         if not self.folder_id:
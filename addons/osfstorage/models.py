@@ -3,8 +3,9 @@ from __future__ import unicode_literals
 import logging
 
 from django.apps import apps
-from django.db import models, connection
-from psycopg2._psycopg import AsIs
+from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 
 from addons.base.models import BaseNodeSettings, BaseStorageAddon
 from osf.exceptions import InvalidTagError, NodeStateError, TagNotFoundError
@@ -24,42 +25,39 @@ class OsfStorageFileNode(BaseFileNode):
 
     @property
     def materialized_path(self):
-        sql = """
-            WITH RECURSIVE materialized_path_cte(parent_id, GEN_PATH) AS (
-              SELECT
-                T.parent_id,
-                T.name :: TEXT AS GEN_PATH
-              FROM %s AS T
-              WHERE T.id = %s
-              UNION ALL
-              SELECT
-                T.parent_id,
-                (T.name || '/' || R.GEN_PATH) AS GEN_PATH
-              FROM materialized_path_cte AS R
-                JOIN %s AS T ON T.id = R.parent_id
-              WHERE R.parent_id IS NOT NULL
-            )
-            SELECT gen_path
-            FROM materialized_path_cte AS N
-            WHERE parent_id IS NULL
-            LIMIT 1;
+        """The path of this file or folder below the osfstorage root of its node.
+        Stored in ``_materialized_path`` on save, see ``_build_materialized_path``.
         """
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [AsIs(self._meta.db_table), self.pk, AsIs(self._meta.db_table)])
-            row = cursor.fetchone()
-            if not row:
-                return '/'
-
-            path = row[0]
-            if not self.is_file:
-                path = path + '/'
-            return path
+        return self._materialized_path or self._build_materialized_path()
 
     @materialized_path.setter
     def materialized_path(self, val):
         # raise Exception('Cannot set materialized path on OSFStorage as it is computed.')
         logger.warn('Cannot set materialized path on OSFStorage because it\'s computed.')
 
+    def _build_materialized_path(self):
+        if self.parent is None:
+            path = self.name
+        else:
+            path = self.parent.materialized_path + self.name
+        if not self.is_file:
+            path = path + '/'
+        return path
+
+    def _update_descendant_paths(self, node_id, old_path):
+        """Rewrite the stored paths below this folder after it was moved or renamed."""
+        OsfStorageFileNode.objects.filter(
+            node_id=node_id,
+            provider=self._provider,
+            _materialized_path__startswith=old_path,
+        ).exclude(id=self.id).update(
+            _materialized_path=Concat(
+                Value(self._materialized_path, output_field=models.TextField()),
+                Substr('_materialized_path', len(old_path) + 1),
+                output_field=models.TextField(),
+            )
+        )
+
     @classmethod
     def get(cls, _id, node):
         return cls.objects.get(_id=_id, node=node)
@@ -93,14 +91,14 @@ class OsfStorageFileNode(BaseFileNode):
         # representing ex-OsfStorageFolders, we will reimplement the `children` method of the
         # Folder class here.
         if not file_obj.is_file:
-            children = []
             if isinstance(file_obj, TrashedFileNode):
-                children = file_obj.trashed_children.all()
+                for item in file_obj.trashed_children.all():
+                    guids.extend(cls.get_file_guids(item.path, provider, node=node))
             else:
-                children = file_obj.children
-
-            for item in children:
-                guids.extend(cls.get_file_guids(item.path, provider, node=node))
+                for item in file_obj.descendants.filter(type=OsfStorageFile._typedmodels_type):
+                    guid = item.get_guid()
+                    if guid:
+                        guids.append(guid._id)
         else:
             guid = file_obj.get_guid()
             if guid:
@@ -205,8 +203,14 @@ class OsfStorageFileNode(BaseFileNode):
 
     def save(self):
         self._path = ''
-        self._materialized_path = ''
-        return super(OsfStorageFileNode, self).save()
+        self._materialized_path = self._build_materialized_path()
+        previous = None
+        if self.pk and not self.is_file:
+            previous = OsfStorageFileNode.objects.filter(pk=self.pk).values_list('node_id', '_materialized_path').first()
+        ret = super(OsfStorageFileNode, self).save()
+        if previous and previous[1] and previous[1] != self._materialized_path:
+            self._update_descendant_paths(*previous)
+        return ret
 
 
 class OsfStorageFile(OsfStorageFileNode, File):
@@ -340,37 +344,17 @@ class OsfStorageFile(OsfStorageFileNode, File):
 class OsfStorageFolder(OsfStorageFileNode, Folder):
 
     @property
-    def is_checked_out(self):
-        sql = """
-            WITH RECURSIVE is_checked_out_cte(id, parent_id, checkout_id) AS (
-              SELECT
-                T.id,
-                T.parent_id,
-                T.checkout_id
-              FROM %s AS T
-              WHERE T.id = %s
-              UNION ALL
-              SELECT
-                T.id,
-                T.parent_id,
-                T.checkout_id
-              FROM is_checked_out_cte AS R
-                JOIN %s AS T ON T.parent_id = R.id
-            )
-            SELECT N.checkout_id
-            FROM is_checked_out_cte as N
-            WHERE N.checkout_id IS NOT NULL
-            LIMIT 1;
-        """
-
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [AsIs(self._meta.db_table), self.pk, AsIs(self._meta.db_table)])
-            row = cursor.fetchone()
+    def descendants(self):
+        """Every file and folder below this one, found by path prefix."""
+        return OsfStorageFileNode.objects.filter(
+            node_id=self.node_id,
+            provider=self._provider,
+            _materialized_path__startswith=self.materialized_path,
+        ).exclude(id=self.id)
 
-            if row and row[0]:
-                return True
-
-        return False
+    @property
+    def is_checked_out(self):
+        return self.checkout_id is not None or self.descendants.filter(checkout__isnull=False).exists()
 
     @property
     def is_preprint_primary(self):
@@ -22,6 +22,9 @@ WATERBUTLER_RESOURCE = 'folder'
 
 DISK_SAVING_MODE = settings.DISK_SAVING_MODE
 
+# Rows fetched at a time when streaming a folder listing
+CHILDREN_STREAM_BATCH_SIZE = 1000
+
 
 try:
     mod = importlib.import_module('.{}'.format(settings.MIGRATION_ENV), package='addons.osfstorage.settings')
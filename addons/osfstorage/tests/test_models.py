@@ -190,9 +190,38 @@ class TestOsfstorageFileNode(StorageTestCase):
         assert_equals(child.get_download_count(1), 1)
         assert_equals(child.get_download_count(2), 1)
 
-    @unittest.skip
+    @mock.patch('framework.sessions.session')
+    def test_download_count_is_stored(self, mock_session):
+        mock_session.data = {}
+        child = self.node_settings.get_root().append_file('Test')
+
+        utils.update_analytics(self.project, child._id, 0)
+        utils.update_analytics(self.project, child._id, 0, download=False)
+        utils.update_analytics(self.project, child._id, 1)
+
+        child.reload()
+        assert_equals(child.download_count, 2)
+
     def test_create_version(self):
-        pass
+        child = self.node_settings.get_root().append_file('Test')
+        assert_equals(child.version_count, 0)
+        assert_is(child.latest_version, None)
+
+        first = child.create_version(self.user, {
+            'service': 'cloud',
+            settings.WATERBUTLER_RESOURCE: 'osf',
+            'object': '06d80e',
+        })
+        second = child.create_version(self.user, {
+            'service': 'cloud',
+            settings.WATERBUTLER_RESOURCE: 'osf',
+            'object': '07d80a',
+        })
+
+        child.reload()
+        assert_equals(child.version_count, 2)
+        assert_equals(child.latest_version, second)
+        assert_equals(child.first_version_date, first.date_created)
 
     @unittest.skip
     def test_update_version_metadata(self):
@@ -251,6 +280,40 @@ class TestOsfstorageFileNode(StorageTestCase):
         child = self.node_settings.get_root().append_folder('Cloud').append_file('Carp')
         assert_equals('/Cloud/Carp', child.materialized_path)
 
+    def test_materialized_path_is_stored(self):
+        child = self.node_settings.get_root().append_folder('Cloud').append_file('Carp')
+        assert_equals('/Cloud/Carp', OsfStorageFile.objects.values_list('_materialized_path', flat=True).get(id=child.id))
+
+    def test_materialized_path_restored(self):
+        folder = self.node_settings.get_root().append_folder('Cloud')
+        child = folder.append_file('Carp')
+        folder.delete()
+        trashed = models.TrashedFileNode.load(child._id)
+        assert_equals('/Cloud/Carp', trashed.materialized_path)
+
+        models.TrashedFileNode.load(folder._id).restore()
+        restored = OsfStorageFile.load(child._id)
+        assert_equals('/Cloud/Carp', restored.materialized_path)
+
+    def test_descendants(self):
+        root = self.node_settings.get_root()
+        folder = root.append_folder('Cloud')
+        nested = folder.append_folder('Carp')
+        child = nested.append_file('Koi')
+        root.append_file('Cloudy')
+
+        assert_equal(set(folder.descendants), {nested, child})
+        assert_equal(set(nested.descendants), {child})
+
+    def test_folder_is_checked_out_by_descendant(self):
+        folder = self.node_settings.get_root().append_folder('Cloud')
+        child = folder.append_folder('Carp').append_file('Koi')
+        assert_false(folder.is_checked_out)
+
+        child.checkout = self.user
+        child.save()
+        assert_true(folder.is_checked_out)
+
     def test_copy(self):
         to_copy = self.node_settings.get_root().append_file('Carp')
         copy_to = self.node_settings.get_root().append_folder('Cloud')
@@ -308,25 +371,50 @@ class TestOsfstorageFileNode(StorageTestCase):
         assert_equal(to_move.name, 'Tuna')
         assert_equal(moved.parent, move_to)
 
-    @unittest.skip
     def test_move_folder(self):
-        pass
+        to_move = self.node_settings.get_root().append_folder('Carp')
+        child = to_move.append_folder('Koi').append_file('Fin')
+        move_to = self.node_settings.get_root().append_folder('Cloud')
+
+        to_move.move_under(move_to)
+        child.reload()
+
+        assert_equal(to_move._materialized_path, '/Cloud/Carp/')
+        assert_equal(child._materialized_path, '/Cloud/Carp/Koi/Fin')
 
     @unittest.skip
     def test_move_folder_and_rename(self):
         pass
 
-    @unittest.skip
     def test_rename_folder(self):
-        pass
+        folder = self.node_settings.get_root().append_folder('Carp')
+        child = folder.append_file('Fin')
+        sibling = self.node_settings.get_root().append_file('Carpet')
+
+        folder.name = 'Tuna'
+        folder.save()
+        child.reload()
+        sibling.reload()
+
+        assert_equal(child._materialized_path, '/Tuna/Fin')
+        assert_equal(sibling._materialized_path, '/Carpet')
 
     @unittest.skip
     def test_rename_file(self):
         pass
 
-    @unittest.skip
     def test_move_across_nodes(self):
-        pass
+        other_node_settings = ProjectFactory().get_addon('osfstorage')
+        move_to = other_node_settings.get_root().append_folder('Cloud')
+        to_move = self.node_settings.get_root().append_folder('Carp')
+        child = to_move.append_file('Fin')
+
+        to_move.move_under(move_to)
+        child.reload()
+
+        assert_equal(child.node, other_node_settings.owner)
+        assert_equal(child._materialized_path, '/Cloud/Carp/Fin')
+        assert_equal(set(move_to.descendants), {to_move, child})
 
     @unittest.skip
     def test_move_folder_across_nodes(self):
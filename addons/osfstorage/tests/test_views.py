@@ -106,6 +106,29 @@ class TestGetMetadataHook(HookTestCase):
         assert_equal(res_date_created, expected_date_created)
         assert_equal(res_data, expected_data)
 
+    def test_children_metadata_stream(self):
+        root = self.node_settings.get_root()
+        for name in ('ant', 'bee', 'cow'):
+            root.append_file(name).versions.add(factories.FileVersionFactory())
+        root.append_folder('dog')
+
+        res = self.send_hook('osfstorage_get_children', {'fid': root._id}, {})
+        streamed = self.send_hook('osfstorage_get_children', {'fid': root._id, 'stream': 1}, {})
+
+        assert_equal(len(streamed.json), 4)
+        assert_equal(
+            sorted(streamed.json, key=lambda child: child['name']),
+            sorted(res.json, key=lambda child: child['name'])
+        )
+
+    def test_children_metadata_stream_empty(self):
+        res = self.send_hook(
+            'osfstorage_get_children',
+            {'fid': self.node_settings.get_root()._id, 'stream': 1},
+            {},
+        )
+        assert_equal(res.json, [])
+
 
     def test_osf_storage_root(self):
         auth = Auth(self.project.creator)
@@ -8,8 +8,9 @@ from django.db import IntegrityError
 from django.db import connection
 from django.db import transaction
 
-from flask import request
+from flask import request, Response, stream_with_context
 
+from framework.analytics.buffer import get_counter_buffer
 from framework.auth import Auth
 from framework.sessions import get_session
 from framework.exceptions import HTTPError
@@ -69,6 +70,8 @@ def osfstorage_get_revisions(file_node, node_addon, payload, **kwargs):
     version_count = file_node.versions.count()
     # Don't worry. The only % at the end of the LIKE clause, the index is still used
     counts = dict(PageCounter.objects.filter(_id__startswith=counter_prefix).values_list('_id', 'total'))
+    for page, total in get_counter_buffer().pending_page_totals(counter_prefix).items():
+        counts[page] = counts.get(page, 0) + total
     qs = FileVersion.includable_objects.filter(basefilenode__id=file_node.id).include('creator__guids').order_by('-date_created')
 
     for i, version in enumerate(qs):
@@ -135,69 +138,80 @@ def osfstorage_get_metadata(file_node, node_addon, **kwargs):
     return file_node.serialize(version=version, include_full=True)
 
 
+# Read the documentation on BaseFileNode's version summary fields before reading this code
+CHILD_JSON = '''
+    CASE
+    WHEN F.type = 'osf.osfstoragefile' THEN
+        json_build_object(
+            'id', F._id
+            , 'path', '/' || F._id
+            , 'name', F.name
+            , 'kind', 'file'
+            , 'size', V.size
+            , 'downloads', F.download_count
+            , 'version', F.version_count
+            , 'contentType', V.content_type
+            , 'modified', V.date_created
+            , 'created', F.first_version_date
+            , 'checkout', CASE WHEN F.checkout_id IS NULL THEN NULL ELSE (
+                SELECT _id FROM osf_guid
+                WHERE object_id = F.checkout_id
+                AND content_type_id = %s
+                LIMIT 1
+            ) END
+            , 'md5', V.metadata ->> 'md5'
+            , 'sha256', V.metadata ->> 'sha256'
+        )
+    ELSE
+        json_build_object(
+            'id', F._id
+            , 'path', '/' || F._id || '/'
+            , 'name', F.name
+            , 'kind', 'folder'
+        )
+    END
+'''
+
+CHILDREN_SQL = '''
+    SELECT {}
+    FROM osf_basefilenode AS F
+    LEFT JOIN osf_fileversion AS V ON V.id = F.latest_version_id
+    WHERE F.parent_id = %s
+    AND (NOT F.type IN ('osf.trashedfilenode', 'osf.trashedfile', 'osf.trashedfolder'))
+'''
+
+
+def stream_children(params):
+    """Yield the JSON array of children in pieces, reading them through a
+    server-side cursor so neither the database nor the app builds the whole array.
+    """
+    cursor = connection.chunked_cursor()
+    try:
+        cursor.execute(CHILDREN_SQL.format('({})::TEXT'.format(CHILD_JSON)), params)
+        separator = '['
+        while True:
+            rows = cursor.fetchmany(osf_storage_settings.CHILDREN_STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            yield separator + ','.join(row[0] for row in rows)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+    finally:
+        cursor.close()
+
+
 @must_be_signed
 @decorators.autoload_filenode(must_be='folder')
 def osfstorage_get_children(file_node, **kwargs):
     from django.contrib.contenttypes.models import ContentType
-    with connection.cursor() as cursor:
-        # Read the documentation on FileVersion's fields before reading this code
-        cursor.execute('''
-            SELECT json_agg(CASE
-                WHEN F.type = 'osf.osfstoragefile' THEN
-                    json_build_object(
-                        'id', F._id
-                        , 'path', '/' || F._id
-                        , 'name', F.name
-                        , 'kind', 'file'
-                        , 'size', LATEST_VERSION.size
-                        , 'downloads',  COALESCE(DOWNLOAD_COUNT, 0)
-                        , 'version', (SELECT COUNT(*) FROM osf_basefilenode_versions WHERE osf_basefilenode_versions.basefilenode_id = F.id)
-                        , 'contentType', LATEST_VERSION.content_type
-                        , 'modified', LATEST_VERSION.date_created
-                        , 'created', EARLIEST_VERSION.date_created
-                        , 'checkout', CHECKOUT_GUID
-                        , 'md5', LATEST_VERSION.metadata ->> 'md5'
-                        , 'sha256', LATEST_VERSION.metadata ->> 'sha256'
-                    )
-                ELSE
-                    json_build_object(
-                        'id', F._id
-                        , 'path', '/' || F._id || '/'
-                        , 'name', F.name
-                        , 'kind', 'folder'
-                    )
-                END
-            )
-            FROM osf_basefilenode AS F
-            LEFT JOIN LATERAL (
-                SELECT * FROM osf_fileversion
-                JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
-                WHERE osf_basefilenode_versions.basefilenode_id = F.id
-                ORDER BY date_created DESC
-                LIMIT 1
-            ) LATEST_VERSION ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT * FROM osf_fileversion
-                JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
-                WHERE osf_basefilenode_versions.basefilenode_id = F.id
-                ORDER BY date_created ASC
-                LIMIT 1
-            ) EARLIEST_VERSION ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT _id from osf_guid
-                WHERE object_id = F.checkout_id
-                AND content_type_id = %s
-                LIMIT 1
-            ) CHECKOUT_GUID ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT P.total AS DOWNLOAD_COUNT FROM osf_pagecounter AS P
-                WHERE P._id = 'download:' || %s || ':' || F._id
-                LIMIT 1
-            ) DOWNLOAD_COUNT ON TRUE
-            WHERE parent_id = %s
-            AND (NOT F.type IN ('osf.trashedfilenode', 'osf.trashedfile', 'osf.trashedfolder'))
-        ''', [ContentType.objects.get_for_model(OSFUser).id, file_node.node._id, file_node.id])
+    params = [ContentType.objects.get_for_model(OSFUser).id, file_node.id]
 
+    # Very large folders can ask for the listing to be streamed
+    if request.args.get('stream'):
+        return Response(stream_with_context(stream_children(params)), mimetype='application/json')
+
+    with connection.cursor() as cursor:
+        cursor.execute(CHILDREN_SQL.format('json_agg({})'.format(CHILD_JSON)), params)
         return cursor.fetchone()[0] or []
 
 
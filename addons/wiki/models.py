@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 import datetime
 import functools
+import hashlib
 import logging
 
 import markdown
 import pytz
 from addons.base.models import BaseNodeSettings
 from bleach.callbacks import nofollow
+from django.core.cache import cache
 from django.db import models
 from framework.forms.utils import sanitize
 from markdown.extensions import codehilite, fenced_code, wikilinks
@@ -33,6 +35,11 @@ SHAREJS_URL = '{}:{}'.format(SHAREJS_HOST, SHAREJS_PORT)
 SHAREJS_DB_NAME = 'sharejs'
 SHAREJS_DB_URL = 'mongodb://{}:{}/{}'.format(settings.DB_HOST, settings.DB_PORT, SHAREJS_DB_NAME)
 
+# Rendered HTML and text of a page's content, as linked from a node. Bump
+# RENDER_VERSION when changes to render_content or WIKI_WHITELIST change the output.
+RENDER_CACHE_KEY = 'osf:wiki-render:{version}:{node}:{content}'
+RENDER_VERSION = 1
+
 # TODO: Change to release date for wiki change
 WIKI_CHANGE_DATE = datetime.datetime.utcfromtimestamp(1423760098).replace(tzinfo=pytz.utc)
 
@@ -137,8 +144,28 @@ class NodeWikiPage(GuidMixin, BaseModel):
     def get_absolute_url(self):
         return self.absolute_api_v2_url
 
-    def html(self, node):
-        """The cleaned HTML of the page"""
+    def _render(self, node):
+        """Return the HTML and raw text of the page, rendering them at most once per
+        content and node (wiki links point into ``node``) for WIKI_RENDER_CACHE_TIMEOUT seconds.
+        """
+        key = RENDER_CACHE_KEY.format(
+            version=RENDER_VERSION,
+            node=node._id if node else None,
+            content=hashlib.sha1(self.content.encode('utf-8')).hexdigest(),
+        )
+        rendered_pages = self.__dict__.setdefault('_rendered', {})
+        rendered = rendered_pages.get(key)
+        if rendered is None and settings.WIKI_RENDER_CACHE_TIMEOUT:
+            rendered = cache.get(key)
+        if rendered is None:
+            html = self._render_html(node)
+            rendered = (html, sanitize(html, tags=[], strip=True))
+            if settings.WIKI_RENDER_CACHE_TIMEOUT:
+                cache.set(key, rendered, settings.WIKI_RENDER_CACHE_TIMEOUT)
+        rendered_pages[key] = rendered
+        return rendered
+
+    def _render_html(self, node):
         sanitized_content = render_content(self.content, node=node)
         try:
             from bleach import linkify
@@ -151,10 +178,14 @@ class NodeWikiPage(GuidMixin, BaseModel):
             logger.warning('Returning unlinkified content.')
             return sanitized_content
 
+    def html(self, node):
+        """The cleaned HTML of the page"""
+        return self._render(node)[0]
+
     def raw_text(self, node):
         """ The raw text of the page, suitable for using in a test search"""
 
-        return sanitize(self.html(node), tags=[], strip=True)
+        return self._render(node)[1]
 
     def get_draft(self, node):
         """
@@ -197,6 +228,8 @@ class NodeWikiPage(GuidMixin, BaseModel):
     def save(self, *args, **kwargs):
         rv = super(NodeWikiPage, self).save(*args, **kwargs)
         if self.node:
+            # Render the new version now, for the views, search and spam checks that follow
+            self._render(self.node)
             self.node.update_search()
         return rv
 
@@ -222,30 +255,6 @@ class NodeWikiPage(GuidMixin, BaseModel):
         clone.save()
         return clone
 
-    @classmethod
-    def clone_wiki_versions(cls, node, copy, user, save=True):
-        """Clone wiki pages for a forked or registered project.
-        :param node: The Node that was forked/registered
-        :param copy: The fork/registration
-        :param user: The user who forked or registered the node
-        :param save: Whether to save the fork/registration
-        :return: copy
-        """
-        copy.wiki_pages_versions = {}
-        copy.wiki_pages_current = {}
-
-        for key in node.wiki_pages_versions:
-            copy.wiki_pages_versions[key] = []
-            for wiki_id in node.wiki_pages_versions[key]:
-                node_wiki = NodeWikiPage.load(wiki_id)
-                cloned_wiki = node_wiki.clone_wiki(copy._id)
-                copy.wiki_pages_versions[key].append(cloned_wiki._id)
-                if node_wiki.is_current:
-                    copy.wiki_pages_current[key] = cloned_wiki._id
-        if save:
-            copy.save()
-        return copy
-
 
 class NodeSettings(BaseNodeSettings):
     complete = True
@@ -288,14 +297,10 @@ class NodeSettings(BaseNodeSettings):
 
         self.save()
 
-    def after_fork(self, node, fork, user, save=True):
-        """Copy wiki settings and wiki pages to forks."""
-        NodeWikiPage.clone_wiki_versions(node, fork, user, save)
-        return super(NodeSettings, self).after_fork(node, fork, user, save)
-
     def after_register(self, node, registration, user, save=True):
-        """Copy wiki settings and wiki pages to registrations."""
-        NodeWikiPage.clone_wiki_versions(node, registration, user, save)
+        """Copy wiki settings to registrations. Wiki pages are copied along with
+        the registered nodes, see osf.utils.node_copy.
+        """
         clone = self.clone()
         clone.owner = registration
         if save:
@@ -1,7 +1,10 @@
+import mock
 import pytest
+from django.core.cache import cache
 
 from addons.wiki.exceptions import NameMaximumLengthError
 
+from addons.wiki import models as wiki_models
 from addons.wiki.models import NodeWikiPage
 from addons.wiki.tests.factories import NodeWikiFactory
 from osf_tests.factories import NodeFactory, UserFactory, ProjectFactory
@@ -48,6 +51,47 @@ class TestNodeWikiPageModel:
         assert ver.is_current is False
 
 
+class TestNodeWikiPageRendering:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    def test_html_and_raw_text(self):
+        node = NodeFactory()
+        page = NodeWikiFactory(content='**bold** [[wiki2]]', node=node)
+        assert '<strong>bold</strong>' in page.html(node)
+        assert '/{}/wiki/wiki2/'.format(node._id) in page.html(node)
+        assert page.raw_text(node) == 'bold wiki2'
+
+    def test_rendered_once_per_version(self):
+        node = NodeFactory()
+        page = NodeWikiFactory(content='**bold**', node=node)
+        with mock.patch.object(wiki_models, 'render_content', wraps=wiki_models.render_content) as render:
+            page.html(node)
+            page.raw_text(node)
+            NodeWikiPage.load(page._id).raw_text(node)
+        # Rendered when saved
+        assert render.call_count == 0
+
+        page = NodeWikiFactory(content='*changed*', node=node, page_name=page.page_name)
+        assert page.html(node) == '<p><em>changed</em></p>'
+
+    def test_rendered_per_node(self):
+        node, other_node = NodeFactory(), NodeFactory()
+        page = NodeWikiFactory(content='[[wiki2]]', node=node)
+        assert node._id in page.html(node)
+        assert other_node._id in page.html(other_node)
+
+    @mock.patch('website.settings.WIKI_RENDER_CACHE_TIMEOUT', 0)
+    def test_cache_disabled(self):
+        node = NodeFactory()
+        page = NodeWikiFactory(content='**bold**', node=node)
+        with mock.patch.object(wiki_models, 'render_content', wraps=wiki_models.render_content) as render:
+            NodeWikiPage.load(page._id).html(node)
+        assert render.call_count == 1
+
+
 class TestNodeWikiPage(OsfTestCase):
 
     def setUp(self):
@@ -11,7 +11,8 @@ from api.base.exceptions import (UnconfirmedAccountError, UnclaimedAccountError,
                                  MergedAccountError, InvalidAccountError, TwoFactorRequiredError)
 from framework.auth import cas
 from framework.auth.core import get_user
-from osf.models import OSFUser, Session
+from framework.sessions.store import get_session_store
+from osf.models import OSFUser
 from website import settings
 
 
@@ -24,11 +25,7 @@ def get_session_from_cookie(cookie_val):
     """
 
     session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie_val)
-    try:
-        session = Session.objects.get(_id=session_id)
-        return session
-    except Session.DoesNotExist:
-        return None
+    return get_session_store().load(session_id)
 
 
 def check_user(user):
@@ -1,8 +1,13 @@
+import base64
+import json
+
 from django.utils import six
 from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.urlresolvers import reverse
 from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
-from django.db.models import QuerySet
+from django.db import connections
+from django.db.models import Q, QuerySet
 
 from rest_framework import pagination
 from rest_framework.exceptions import NotFound
@@ -10,6 +15,7 @@ from rest_framework.response import Response
 from rest_framework.utils.urls import (
     replace_query_param, remove_query_param
 )
+from api.base.exceptions import InvalidQueryStringError
 from api.base.serializers import is_anonymized
 from api.base.settings import MAX_PAGE_SIZE
 from api.base.utils import absolute_reverse
@@ -18,17 +24,41 @@ from osf.models import AbstractNode, Comment, Guid
 from website.search.elastic_search import DOC_TYPE_TO_MODEL
 
 
+def estimate_count(queryset):
+    """Return the planner's row estimate for ``queryset``, which is much cheaper than
+    ``COUNT(*)`` on large tables but may be off, especially for filtered querysets.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, six.string_types):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
 class JSONAPIPagination(pagination.PageNumberPagination):
     """
     Custom paginator that formats responses in a JSON-API compatible format.
 
     Properly handles pagination of embedded objects.
 
+    Passing ``page[cursor]`` (empty for the first page) switches to keyset pagination:
+    pages are fetched with ``WHERE (sort columns) > (last row seen)`` instead of ``OFFSET``,
+    so every page costs the same no matter how deep it is. Only ``prev`` and ``next``
+    links are available in this mode, and ``page[total]`` controls how ``meta.total``
+    is computed: ``estimate`` (default), ``exact`` or ``none``.
+
     """
 
     page_size_query_param = 'page[size]'
     max_page_size = MAX_PAGE_SIZE
 
+    cursor_query_param = 'page[cursor]'
+    total_query_param = 'page[total]'
+    total_modes = ('estimate', 'exact', 'none')
+    cursor_mode = False
+
     def page_number_query(self, url, page_number):
         """
         Builds uri and adds page param.
@@ -99,6 +129,48 @@ class JSONAPIPagination(pagination.PageNumberPagination):
             ])),
         ])
 
+    def cursor_query(self, url, cursor):
+        """
+        Builds uri and adds cursor param.
+        """
+        url = remove_query_param(self.request.build_absolute_uri(url), '_')
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_cursor_response_dict(self, data, url):
+        first = self.cursor_query(url, '')
+        prev = self.cursor_query(url, self.previous_cursor) if self.previous_cursor else None
+        next = self.cursor_query(url, self.next_cursor) if self.next_cursor else None
+        meta = OrderedDict([
+            ('total', self.cursor_count),
+            ('per_page', self.cursor_page_size),
+        ])
+        if self.cursor_count is not None and self.total_mode == 'estimate':
+            meta['total_is_estimate'] = True
+
+        if self.request.version < '2.1':
+            return OrderedDict([
+                ('data', data),
+                ('links', OrderedDict([
+                    ('first', first),
+                    ('last', None),
+                    ('prev', prev),
+                    ('next', next),
+                    ('meta', meta),
+                ])),
+            ])
+        return OrderedDict([
+            ('data', data),
+            ('meta', meta),
+            ('links', OrderedDict([
+                ('self', self.cursor_query(url, self.request.query_params[self.cursor_query_param])),
+                ('first', first),
+                ('last', None),
+                ('prev', prev),
+                ('next', next),
+            ])),
+        ])
+
     def get_paginated_response(self, data):
         """
         Formats paginated response in accordance with JSON API, as of version 2.1.
@@ -115,7 +187,9 @@ class JSONAPIPagination(pagination.PageNumberPagination):
         if embedded:
             reversed_url = reverse(view_name, kwargs=kwargs)
 
-        if self.request.version < '2.1':
+        if self.cursor_mode:
+            response_dict = self.get_cursor_response_dict(data, reversed_url)
+        elif self.request.version < '2.1':
             response_dict = self.get_response_dict_deprecated(data, reversed_url)
         else:
             response_dict = self.get_response_dict(data, reversed_url)
@@ -156,9 +230,127 @@ class JSONAPIPagination(pagination.PageNumberPagination):
             self.request = request
             return list(self.page)
 
+        elif self.cursor_query_param in request.query_params and isinstance(queryset, QuerySet):
+            return self.paginate_queryset_by_cursor(queryset, request)
+
         else:
             return super(JSONAPIPagination, self).paginate_queryset(queryset, request, view=None)
 
+    def get_cursor_ordering(self, queryset):
+        """
+        Returns a list of ``(field, descending)`` pairs for the queryset's ordering, with
+        the primary key appended as a tiebreaker so that the ordering is total.
+        """
+        model = queryset.model
+        ordering = queryset.query.order_by or (model._meta.ordering if queryset.query.default_ordering else [])
+        fields = []
+        for item in ordering:
+            field = None
+            if isinstance(item, six.string_types):
+                name = item.lstrip('-')
+                try:
+                    field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    pass
+            if field is None or not field.concrete or field.is_relation:
+                raise InvalidQueryStringError(
+                    detail='Cursor pagination is not supported for this sort order.',
+                    parameter=self.cursor_query_param,
+                )
+            fields.append((field, item.startswith('-')))
+        if not any(field.primary_key for field, descending in fields):
+            fields.append((model._meta.pk, fields[-1][1] if fields else False))
+        return fields
+
+    def get_keyset_condition(self, field, value, descending):
+        """
+        Returns a Q matching rows strictly past ``value`` for ``field``, or None if there
+        are none. Postgres sorts NULLs as larger than any other value.
+        """
+        if descending:
+            if value is None:
+                return Q(**{field.name + '__isnull': False})
+            return Q(**{field.name + '__lt': value})
+        if value is None:
+            return None
+        after = Q(**{field.name + '__gt': value})
+        if field.null:
+            after |= Q(**{field.name + '__isnull': True})
+        return after
+
+    def encode_cursor(self, fields, obj, reverse):
+        position = [
+            None if field.value_from_object(obj) is None else field.value_to_string(obj)
+            for field, descending in fields
+        ]
+        return base64.urlsafe_b64encode(json.dumps({'p': position, 'r': reverse}))
+
+    def decode_cursor(self, fields, cursor):
+        """
+        Returns ``(values, reverse)`` for ``cursor``, or ``(None, False)`` for the first page.
+        """
+        if not cursor:
+            return None, False
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            position = decoded['p']
+            if len(position) != len(fields):
+                raise ValueError
+            values = [
+                None if value is None else field.to_python(value)
+                for (field, descending), value in zip(fields, position)
+            ]
+            return values, bool(decoded['r'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise InvalidQueryStringError(detail='Invalid cursor.', parameter=self.cursor_query_param)
+
+    def paginate_queryset_by_cursor(self, queryset, request):
+        page_size = self.get_page_size(request)
+        fields = self.get_cursor_ordering(queryset)
+        values, reverse = self.decode_cursor(fields, request.query_params[self.cursor_query_param])
+
+        self.total_mode = request.query_params.get(self.total_query_param, 'estimate')
+        if self.total_mode not in self.total_modes:
+            raise InvalidQueryStringError(
+                detail='page[total] must be one of: {}.'.format(', '.join(self.total_modes)),
+                parameter=self.total_query_param,
+            )
+        if self.total_mode == 'exact':
+            self.cursor_count = queryset.count()
+        elif self.total_mode == 'estimate':
+            self.cursor_count = estimate_count(queryset)
+        else:
+            self.cursor_count = None
+
+        # Rows after (or, going backwards, before) the cursor position:
+        # (a > x) OR (a = x AND b > y) OR ...
+        if values is not None:
+            keyset, equal = Q(), Q()
+            for (field, descending), value in zip(fields, values):
+                after = self.get_keyset_condition(field, value, descending != reverse)
+                if after is not None:
+                    keyset |= equal & after
+                equal &= Q(**{field.name + '__isnull': True}) if value is None else Q(**{field.name: value})
+            queryset = queryset.filter(keyset)
+        queryset = queryset.order_by(*[
+            '{}{}'.format('-' if descending != reverse else '', field.name)
+            for field, descending in fields
+        ])
+
+        items = list(queryset[:page_size + 1])
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if reverse:
+            items.reverse()
+
+        has_next, has_previous = (values is not None, has_more) if reverse else (has_more, values is not None)
+        self.next_cursor = self.encode_cursor(fields, items[-1], False) if items and has_next else None
+        self.previous_cursor = self.encode_cursor(fields, items[0], True) if items and has_previous else None
+        self.cursor_page_size = page_size
+        self.cursor_mode = True
+        self.request = request
+        return items
+
 
 class MaxSizePagination(JSONAPIPagination):
     page_size = 1000
@@ -204,10 +396,15 @@ class NodeContributorPagination(JSONAPIPagination):
         """ Add number of bibliographic contributors to links.meta"""
         response = super(NodeContributorPagination, self).get_paginated_response(data)
         response_dict = response.data
-        kwargs = self.request.parser_context['kwargs'].copy()
-        node_id = kwargs.get('node_id', None)
-        node = AbstractNode.load(node_id)
-        total_bibliographic = node.visible_contributors.count()
+        page = getattr(self, 'page', None)
+        if page is not None and isinstance(page.paginator.object_list, list):
+            # Embedded contributors loaded in a batch; every contributor of the node is in memory
+            total_bibliographic = len([each for each in page.paginator.object_list if each.visible])
+        else:
+            kwargs = self.request.parser_context['kwargs'].copy()
+            node_id = kwargs.get('node_id', None)
+            node = AbstractNode.load(node_id)
+            total_bibliographic = node.visible_contributors.count()
         if self.request.version < '2.1':
             response_dict['links']['meta']['total_bibliographic'] = total_bibliographic
         else:
@@ -21,6 +21,7 @@ from api.base.settings import BULK_SETTINGS
 from api.base.utils import absolute_reverse, extend_querystring_params, get_user_auth, extend_querystring_if_key_exists
 from framework.auth import core as auth_core
 from osf.models import AbstractNode, MaintenanceState
+from osf.utils.permission_resolver import prefetch_permissions
 from website import settings
 from website import util as website_utils
 from website.util.sanitize import strip_html
@@ -981,6 +982,18 @@ class JSONAPIListSerializer(ser.ListSerializer):
         if isinstance(data, collections.Mapping):
             errors = data.get('errors', None)
             data = data.get('data', None)
+
+        # Load the requesting user's permissions for every node on the page at once
+        nodes = [item for item in data or [] if isinstance(item, AbstractNode)]
+        if nodes:
+            prefetch_permissions(self.context['request'].user, nodes)
+
+        # Let embedded list views load their objects for the whole page at once
+        if data and not enable_esi:
+            for embed in self.context.get('embed', {}).values():
+                if hasattr(embed, 'prefetch'):
+                    embed.prefetch(data)
+
         if enable_esi:
             ret = [
                 self.child.to_esi_representation(item, envelope=None) for item in data
@@ -1084,6 +1097,60 @@ class BaseAPISerializer(ser.Serializer, SparseFieldsetMixin):
                                   for name, field in self.fields.iteritems()]
 
 
+class FieldPlan(object):
+    """Everything JSONAPISerializer.to_representation needs to know about a serializer's
+    fields for one response: which fields survive sparse fieldsets and anonymization,
+    where each one goes in the resource object, and whether it is embedded.
+    """
+    RELATIONSHIP, ID, LINKS, ATTRIBUTE = range(4)
+
+    def __init__(self, serializer):
+        meta = getattr(serializer, 'Meta', None)
+        self.type_ = getattr(meta, 'type_', None)
+        assert self.type_ is not None, 'Must define Meta.type_'
+
+        self.context = serializer.context
+        self.embeds = self.context.get('embed', {})
+        self.enable_esi = self.context.get('enable_esi', False)
+        self.is_anonymous = is_anonymized(self.context['request'])
+
+        to_be_removed = set()
+        if self.is_anonymous and hasattr(serializer, 'non_anonymized_fields'):
+            # Drop any fields that are not specified in the `non_anonymized_fields` variable.
+            allowed = set(serializer.non_anonymized_fields)
+            existing = set(serializer.fields.keys())
+            to_be_removed = existing - allowed
+
+        fields = [field for field in serializer.fields.values() if
+                  not field.write_only and field.field_name not in to_be_removed]
+
+        invalid_embeds = serializer.invalid_embeds(fields, self.embeds)
+        invalid_embeds = invalid_embeds - to_be_removed
+        if invalid_embeds:
+            raise InvalidQueryStringError(parameter='embed',
+                                          detail='The following fields are not embeddable: {}'.format(
+                                              ', '.join(invalid_embeds)))
+
+        # (field, field_name, kind, embed, hidden) for each field, in order
+        self.fields = []
+        for field in fields:
+            nested_field = getattr(field, 'field', None)
+            embed = hidden = False
+            if getattr(field, 'json_api_link', False) or getattr(nested_field, 'json_api_link', False):
+                kind = self.RELATIONSHIP
+                embed = bool(self.embeds) and (field.field_name in self.embeds or bool(getattr(field, 'always_embed', None)))
+                # Don't serialize relationships that use views_to_hide_if_anonymous when viewing thru an anonymous VOL
+                hidden = (self.is_anonymous and hasattr(field, 'view_name') and
+                          field.view_name in serializer.views_to_hide_if_anonymous)
+            elif field.field_name == 'id':
+                kind = self.ID
+            elif field.field_name == 'links':
+                kind = self.LINKS
+            else:
+                kind = self.ATTRIBUTE
+            self.fields.append((field, field.field_name, kind, embed, hidden))
+
+
 class JSONAPISerializer(BaseAPISerializer):
     """Base serializer. Requires that a `type_` option is set on `class Meta`. Also
     allows for enveloping of both single resources and collections.  Looks to nest fields
@@ -1124,6 +1191,16 @@ class JSONAPISerializer(BaseAPISerializer):
         # failsafe, let python do it if something bad happened in the ESI construction
         return super(JSONAPISerializer, self).to_representation(data)
 
+    def get_field_plan(self):
+        """Return the FieldPlan for the current context, compiling it on first use. List
+        serializers reuse their child for every object, so a page is planned only once.
+        """
+        plan = getattr(self, '_field_plan', None)
+        if plan is None or plan.context is not self.context:
+            self.parse_sparse_fields(allow_unsafe=True, context=self.context)
+            plan = self._field_plan = FieldPlan(self)
+        return plan
+
     # overrides Serializer
     def to_representation(self, obj, envelope='data'):
         """Serialize to final representation.
@@ -1132,54 +1209,31 @@ class JSONAPISerializer(BaseAPISerializer):
         :param envelope: Key for resource object.
         """
         ret = {}
-        meta = getattr(self, 'Meta', None)
-        type_ = getattr(meta, 'type_', None)
-        assert type_ is not None, 'Must define Meta.type_'
-        self.parse_sparse_fields(allow_unsafe=True, context=self.context)
+        plan = self.get_field_plan()
 
         data = {
             'id': '',
-            'type': type_,
+            'type': plan.type_,
             'attributes': {},
             'relationships': {},
             'embeds': {},
             'links': {},
         }
 
-        embeds = self.context.get('embed', {})
         context_envelope = self.context.get('envelope', envelope)
         if context_envelope == 'None':
             context_envelope = None
-        enable_esi = self.context.get('enable_esi', False)
-        is_anonymous = is_anonymized(self.context['request'])
-        to_be_removed = set()
-        if is_anonymous and hasattr(self, 'non_anonymized_fields'):
-            # Drop any fields that are not specified in the `non_anonymized_fields` variable.
-            allowed = set(self.non_anonymized_fields)
-            existing = set(self.fields.keys())
-            to_be_removed = existing - allowed
 
-        fields = [field for field in self.fields.values() if
-                  not field.write_only and field.field_name not in to_be_removed]
-
-        invalid_embeds = self.invalid_embeds(fields, embeds)
-        invalid_embeds = invalid_embeds - to_be_removed
-        if invalid_embeds:
-            raise InvalidQueryStringError(parameter='embed',
-                                          detail='The following fields are not embeddable: {}'.format(
-                                              ', '.join(invalid_embeds)))
-
-        for field in fields:
+        for field, field_name, kind, embed, hidden in plan.fields:
             try:
                 attribute = field.get_attribute(obj)
             except SkipField:
                 continue
 
-            nested_field = getattr(field, 'field', None)
             if attribute is None:
                 # We skip `to_representation` for `None` values so that
                 # fields do not have to explicitly deal with that case.
-                data['attributes'][field.field_name] = None
+                data['attributes'][field_name] = None
             else:
                 try:
                     if hasattr(attribute, 'all'):
@@ -1188,11 +1242,11 @@ class JSONAPISerializer(BaseAPISerializer):
                         representation = field.to_representation(attribute)
                 except SkipField:
                     continue
-                if getattr(field, 'json_api_link', False) or getattr(nested_field, 'json_api_link', False):
+                if kind == plan.RELATIONSHIP:
                     # If embed=field_name is appended to the query string or 'always_embed' flag is True, directly embed the
                     # results in addition to adding a relationship link
-                    if embeds and (field.field_name in embeds or getattr(field, 'always_embed', None)):
-                        if enable_esi:
+                    if embed:
+                        if plan.enable_esi:
                             try:
                                 result = field.to_esi_representation(attribute, envelope=envelope)
                             except SkipField:
@@ -1200,27 +1254,22 @@ class JSONAPISerializer(BaseAPISerializer):
                         else:
                             try:
                                 # If a field has an empty representation, it should not be embedded.
-                                result = self.context['embed'][field.field_name](obj)
+                                result = plan.embeds[field_name](obj)
                             except SkipField:
                                 result = None
 
                         if result:
-                            data['embeds'][field.field_name] = result
+                            data['embeds'][field_name] = result
                         else:
-                            data['embeds'][field.field_name] = {'error': 'This field is not embeddable.'}
-                    try:
-                        if not (is_anonymous and
-                                    hasattr(field, 'view_name') and
-                                        field.view_name in self.views_to_hide_if_anonymous):
-                            data['relationships'][field.field_name] = representation
-                    except SkipField:
-                        continue
-                elif field.field_name == 'id':
+                            data['embeds'][field_name] = {'error': 'This field is not embeddable.'}
+                    if not hidden:
+                        data['relationships'][field_name] = representation
+                elif kind == plan.ID:
                     data['id'] = representation
-                elif field.field_name == 'links':
+                elif kind == plan.LINKS:
                     data['links'] = representation
                 else:
-                    data['attributes'][field.field_name] = representation
+                    data['attributes'][field_name] = representation
 
         if not data['relationships']:
             del data['relationships']
@@ -1230,7 +1279,7 @@ class JSONAPISerializer(BaseAPISerializer):
 
         if context_envelope:
             ret[context_envelope] = data
-            if is_anonymous:
+            if plan.is_anonymous:
                 ret['meta'] = {'anonymous': True}
         else:
             ret = data
@@ -32,6 +32,14 @@ DATABASES = {
 }
 
 DATABASE_ROUTERS = ['osf.db.router.PostgreSQLFailoverRouter', ]
+
+# Used for short-lived coordination between requests and tasks (e.g. coalescing search reindexes).
+# Override in local.py with a shared backend (e.g. memcached) to coordinate across processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
 CELERY_IMPORTS = [
     'osf.management.commands.migratedata',
     'osf.management.commands.migraterelations',
@@ -253,6 +261,9 @@ ENABLE_ESI = osf_settings.ENABLE_ESI
 VARNISH_SERVERS = osf_settings.VARNISH_SERVERS
 ESI_MEDIA_TYPES = osf_settings.ESI_MEDIA_TYPES
 
+# Seconds to keep embedded representations rendered for anonymous requests in CACHES; 0 disables
+EMBED_CACHE_TIMEOUT = 0
+
 ADDONS_FOLDER_CONFIGURABLE = ['box', 'dropbox', 's3', 'googledrive', 'figshare', 'owncloud']
 ADDONS_OAUTH = ADDONS_FOLDER_CONFIGURABLE + ['dataverse', 'github', 'bitbucket', 'mendeley', 'zotero', 'forward']
 
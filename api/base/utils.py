@@ -13,7 +13,7 @@ from api.base.exceptions import Gone, UserGone
 from framework.auth import Auth
 from framework.auth.cas import CasResponse
 from framework.auth.oauth_scopes import ComposedScopes, normalize_scopes
-from osf.models import OSFUser, Node, Registration
+from osf.models import Comment, OSFUser, Node, Registration
 from osf.models.base import GuidMixin
 from osf.modm_compat import to_django_query
 from osf.utils.requests import check_select_for_update
@@ -153,6 +153,31 @@ def waterbutler_url_for(request_type, provider, path, node_id, token, obj_args=N
     url.args.update(query)
     return url.url
 
+def get_unread_comments_count(serializer, obj, get_target):
+    """Return the number of comments on ``obj`` that the requesting user has not seen.
+
+    ``get_target(obj)`` returns the ``(node, page, root_id)`` of ``obj`` for
+    ``Comment.find_n_unread_bulk``. When ``obj`` is part of a list, the counts of the
+    whole list are fetched together the first time one of them is needed.
+    """
+    user = serializer.context['request'].user
+    if user.is_anonymous:
+        return 0
+    counts = serializer.context.setdefault('unread_comments_counts', {})
+    key = (type(obj), obj.pk)
+    if key not in counts:
+        siblings = getattr(serializer.parent, 'instance', None)
+        if not isinstance(siblings, list) or obj not in siblings:
+            siblings = [obj]
+        targets = {
+            (type(each), each.pk): get_target(each)
+            for each in siblings
+            if (type(each), each.pk) not in counts
+        }
+        found = Comment.find_n_unread_bulk(user, targets.values())
+        counts.update({each: found[target] for each, target in targets.items()})
+    return counts[key]
+
 def default_node_list_queryset():
     return Node.objects.filter(is_deleted=False)
 
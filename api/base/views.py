@@ -1,4 +1,5 @@
 from django.conf import settings as django_settings
+from django.core.urlresolvers import reverse as django_reverse
 from django.db import transaction
 from django.http import JsonResponse
 from rest_framework import generics
@@ -17,19 +18,21 @@ from api.base.parsers import JSONAPIRelationshipParser
 from api.base.parsers import JSONAPIRelationshipParserForRegularJSON
 from api.base.requests import EmbeddedRequest
 from api.base.serializers import (
+    is_anonymized,
     MaintenanceStateSerializer,
     LinkedNodesRelationshipSerializer,
     LinkedRegistrationsRelationshipSerializer
 )
 from api.base.throttling import RootAnonThrottle, UserRateThrottle
 from api.base.utils import is_bulk_request, get_user_auth
+from api.caching import embeds as embed_cache
 from api.nodes.utils import get_file_object
 from api.nodes.permissions import ContributorOrPublic
 from api.nodes.permissions import ContributorOrPublicForRelationshipPointers
 from api.nodes.permissions import ReadOnlyIfRegistration
 from api.users.serializers import UserSerializer
 from framework.auth.oauth_scopes import CoreScopes
-from osf.models import Contributor, MaintenanceState, BaseFileNode
+from osf.models import AbstractNode, Contributor, MaintenanceState, BaseFileNode
 
 
 class JSONAPIBaseView(generics.GenericAPIView):
@@ -40,10 +43,37 @@ class JSONAPIBaseView(generics.GenericAPIView):
         self.view_fqn = ':'.join([self.view_category, self.view_name])
         super(JSONAPIBaseView, self).__init__(**kwargs)
 
+    def _get_embed_cache(self):
+        # Stored on the underlying HttpRequest so that nested embeds share it
+        request = self.request
+        while hasattr(request, '_request'):
+            request = request._request
+        if not hasattr(request, '_embed_cache'):
+            request._embed_cache = {}
+        return request._embed_cache
+
+    def _get_shared_embed_cache_key(self, request, match, args, kwargs, serializer_class):
+        """Key for the shared embed cache, or None if the embed may not be shared
+        between requests (only anonymous, non view-only representations are).
+        """
+        if not embed_cache.is_enabled() or not request.user.is_anonymous or is_anonymized(request):
+            return None
+        params = [(key, value) for key, value in request.query_params.lists() if not key.startswith('page')]
+        return embed_cache.get_cache_key(
+            django_reverse(match.view_name, args=args, kwargs=kwargs),
+            host=request.get_host(),
+            version=request.version,
+            params=sorted(params),
+            serializer='{}.{}'.format(serializer_class.__module__, serializer_class.__name__),
+        )
+
     def _get_embed_partial(self, field_name, field):
         """Create a partial function to fetch the values of an embedded field. A basic
         example is to include a Node's children in a single response.
 
+        The partial has a ``prefetch`` attribute, which list serializers call with a page
+        of items so that the embedded view can load related objects for all of them at once.
+
         :param str field_name: Name of field of the view's serializer_class to load
         results for
         :return function object -> dict:
@@ -51,6 +81,24 @@ class JSONAPIBaseView(generics.GenericAPIView):
         if getattr(field, 'field', None):
             field = field.field
 
+        def prefetch(items):
+            """Load the embedded list for every item in one query, if the embedded view
+            supports it (see ``get_embed_batch``).
+            """
+            items = [item for item in items if getattr(item, 'pk', None)]
+            if not items:
+                return
+            try:
+                v, view_args, view_kwargs = field.resolve(items[0], field_name, self.request)
+            except Exception:
+                # The partial reports resolution errors per item
+                return
+            get_embed_batch = getattr(getattr(v, 'cls', None), 'get_embed_batch', None)
+            if get_embed_batch is None:
+                return
+            batch = self._get_embed_cache().setdefault((v.cls, field_name, 'batch'), {})
+            batch.update(get_embed_batch([item for item in items if item not in batch]))
+
         def partial(item):
             # resolve must be implemented on the field
             v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
@@ -62,12 +110,11 @@ class JSONAPIBaseView(generics.GenericAPIView):
             else:
                 request = EmbeddedRequest(self.request)
 
-            if not hasattr(request._request._request, '_embed_cache'):
-                request._request._request._embed_cache = {}
-            cache = request._request._request._embed_cache
+            cache = self._get_embed_cache()
 
             request.parents.setdefault(type(item), {})[item._id] = item
 
+            embed_url_kwargs = view_kwargs.copy()
             view_kwargs.update({
                 'request': request,
                 'is_embedded': True,
@@ -103,20 +150,33 @@ class JSONAPIBaseView(generics.GenericAPIView):
 
             try:
                 ser._context = view.get_serializer_context()
+                shared_key = self._get_shared_embed_cache_key(
+                    request, v, view_args, embed_url_kwargs, view.get_serializer_class()
+                )
 
                 if not isinstance(view, ListModelMixin):
-                    ret = ser.to_representation(item)
+                    ret = embed_cache.load(shared_key)
+                    if ret is None:
+                        ret = ser.to_representation(item)
+                        embed_cache.store(shared_key, ret)
                 else:
+                    # Building the queryset checks permissions on the parent, so do it even on a cache hit
                     queryset = view.filter_queryset(view.get_queryset())
-                    page = view.paginate_queryset(getattr(queryset, '_results_cache', None) or queryset)
-
-                    ret = ser.to_representation(page or queryset)
-
-                    if page is not None:
-                        request.parser_context['view'] = view
-                        request.parser_context['kwargs'].pop('request')
-                        view.paginator.request = request
-                        ret = view.paginator.get_paginated_response(ret).data
+                    ret = embed_cache.load(shared_key)
+                    if ret is None:
+                        batch = cache.get((v.cls, field_name, 'batch'), {})
+                        if item in batch:
+                            queryset = batch[item]
+                        page = view.paginate_queryset(getattr(queryset, '_results_cache', None) or queryset)
+
+                        ret = ser.to_representation(page or queryset)
+
+                        if page is not None:
+                            request.parser_context['view'] = view
+                            request.parser_context['kwargs'].pop('request')
+                            view.paginator.request = request
+                            ret = view.paginator.get_paginated_response(ret).data
+                        embed_cache.store(shared_key, ret)
             except Exception as e:
                 with transaction.atomic():
                     ret = view.handle_exception(e).data
@@ -129,6 +189,7 @@ class JSONAPIBaseView(generics.GenericAPIView):
 
             return ret
 
+        partial.prefetch = prefetch
         return partial
 
     def get_serializer_context(self):
@@ -810,6 +871,18 @@ class BaseContributorList(JSONAPIBaseView, generics.ListAPIView, ListFilterMixin
 
         return node.contributor_set.all().include('user__guids')
 
+    @classmethod
+    def get_embed_batch(cls, nodes):
+        """Contributors of each of ``nodes``, loaded in one query when embedding
+        contributors in a list of nodes. Returns a dict of node -> contributors.
+        """
+        nodes = {node.pk: node for node in nodes if isinstance(node, AbstractNode)}
+        batch = {node: [] for node in nodes.values()}
+        for contributor in Contributor.objects.filter(node_id__in=nodes.keys()).include('user__guids').order_by('node_id', '_order'):
+            contributor.node = nodes[contributor.node_id]
+            batch[contributor.node].append(contributor)
+        return batch
+
     def get_queryset(self):
         queryset = self.get_queryset_from_request()
         # If bulk request, queryset only contains contributors in request
@@ -0,0 +1,62 @@
+"""Short-lived shared cache for embedded API representations.
+
+Embeds are rendered once per parent object, so ``?embed=contributors`` on a page
+of public nodes re-renders the same contributor lists on every request. When
+``EMBED_CACHE_TIMEOUT`` is set, JSONAPIBaseView stores the representations of
+embeds rendered for anonymous requests in the Django cache for that many seconds.
+
+Entries are invalidated alongside the varnish bans in ``api.caching.tasks``:
+banning a path bumps a version stamp for it, and every entry's key includes the
+stamps of all the path prefixes of its embedded URL. This gives the same
+``<path>.*`` semantics as a varnish ban. Set ``CACHES`` to a shared backend
+(e.g. memcached) for entries to be shared between processes.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'api:embed:'
+VERSION_PREFIX = 'api:embed-version:'
+
+
+def is_enabled():
+    return bool(getattr(settings, 'EMBED_CACHE_TIMEOUT', 0))
+
+
+def path_prefixes(path):
+    """'/v2/nodes/abc12/contributors/' -> ['/v2/', '/v2/nodes/', '/v2/nodes/abc12/', '/v2/nodes/abc12/contributors/']"""
+    segments = [segment for segment in path.split('/') if segment]
+    return ['/{}/'.format('/'.join(segments[:i + 1])) for i in range(len(segments))]
+
+
+def get_cache_key(path, **extra):
+    """Return the cache key for the embedded representation of ``path``. ``extra``
+    holds anything else the representation depends on (query params, serializer).
+    """
+    prefixes = path_prefixes(path)
+    versions = cache.get_many([VERSION_PREFIX + prefix for prefix in prefixes])
+    parts = [path, sorted(extra.items()), [versions.get(VERSION_PREFIX + prefix) for prefix in prefixes]]
+    return KEY_PREFIX + hashlib.md5(json.dumps(parts, default=str)).hexdigest()
+
+
+def load(key):
+    return cache.get(key) if key else None
+
+
+def store(key, value):
+    if key:
+        cache.set(key, value, settings.EMBED_CACHE_TIMEOUT)
+
+
+def invalidate(paths):
+    """Invalidate every entry for ``paths`` and the URLs below them."""
+    if not is_enabled() or not paths:
+        return
+    # Stamps must outlive the entries created before them, or those would become visible again
+    cache.set_many(
+        {VERSION_PREFIX + path: uuid.uuid4().hex for path in paths},
+        settings.EMBED_CACHE_TIMEOUT * 2
+    )
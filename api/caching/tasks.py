@@ -1,85 +1,187 @@
+import collections
+import logging
+import threading
 import urlparse
 
 import requests
-import logging
+from gevent.pool import Pool
+from requests.adapters import HTTPAdapter
 
+from api.caching import embeds
+from framework.postcommit_tasks.handlers import enqueue_postcommit_task
 from website import settings
 
 logger = logging.getLogger(__name__)
 
+_local = threading.local()
+_session = None
+
+# Process-wide ban counters, e.g. {'objects': 120, 'patterns': 3, 'requests': 6, 'failures': 0}
+ban_stats = collections.Counter()
+
 
 def get_varnish_servers():
     #  TODO: this should get the varnish servers from HAProxy or a setting
     return settings.VARNISH_SERVERS
 
 
-def get_bannable_urls(instance):
+def get_session():
+    """Shared requests session, so bans reuse keep-alive connections to each varnish server."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(len(get_varnish_servers()), 1), pool_maxsize=10)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def get_bannable_paths(instance):
+    """Return the API paths to ban for ``instance`` and the API hostname they belong to."""
     from osf.models import Comment
-    bannable_urls = []
-    parsed_absolute_url = {}
 
     if not hasattr(instance, 'absolute_api_v2_url'):
         logger.warning('Tried to ban {}:{} but it didn\'t have a absolute_api_v2_url method'.format(instance.__class__, instance))
         return [], ''
 
+    parsed_absolute_url = urlparse.urlparse(instance.absolute_api_v2_url)
+    paths = [parsed_absolute_url.path]
+    if isinstance(instance, Comment):
+        try:
+            paths.append(urlparse.urlparse(instance.target.referent.absolute_api_v2_url).path)
+        except AttributeError:
+            # some referents don't have an absolute_api_v2_url
+            # I'm looking at you NodeWikiPage
+            pass
+        try:
+            paths.append(urlparse.urlparse(instance.root_target.referent.absolute_api_v2_url).path)
+        except AttributeError:
+            # some root_targets don't have an absolute_api_v2_url
+            pass
+    return paths, parsed_absolute_url.hostname
+
+
+def get_bannable_urls(instance):
+    paths, hostname = get_bannable_paths(instance)
+    bannable_urls = []
     for host in get_varnish_servers():
-        # add instance url
         varnish_parsed_url = urlparse.urlparse(host)
-        parsed_absolute_url = urlparse.urlparse(instance.absolute_api_v2_url)
-        url_string = '{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
-                                                          netloc=varnish_parsed_url.netloc,
-                                                          path=parsed_absolute_url.path)
-        bannable_urls.append(url_string)
-        if isinstance(instance, Comment):
-            try:
-                parsed_target_url = urlparse.urlparse(instance.target.referent.absolute_api_v2_url)
-            except AttributeError:
-                # some referents don't have an absolute_api_v2_url
-                # I'm looking at you NodeWikiPage
-                pass
-            else:
-                url_string = '{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
-                                                                  netloc=varnish_parsed_url.netloc,
-                                                                  path=parsed_target_url.path)
-                bannable_urls.append(url_string)
-
-            try:
-                parsed_root_target_url = urlparse.urlparse(instance.root_target.referent.absolute_api_v2_url)
-            except AttributeError:
-                # some root_targets don't have an absolute_api_v2_url
-                pass
-            else:
-                url_string = '{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
-                                                              netloc=varnish_parsed_url.netloc,
-                                                              path=parsed_root_target_url.path)
-                bannable_urls.append(url_string)
-
-    return bannable_urls, parsed_absolute_url.hostname
+        for path in paths:
+            bannable_urls.append('{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
+                                                                      netloc=varnish_parsed_url.netloc,
+                                                                      path=path))
+    return bannable_urls, hostname
+
+
+def build_ban_patterns(paths):
+    """Merge ``paths`` into as few ban regexes as possible, each no longer than
+    ``VARNISH_BAN_MAX_PATTERN_LENGTH``. A single path yields the same ``<path>.*``
+    pattern as an individual ban. The leading ``/`` of merged paths is kept outside
+    the group, so the pattern can follow the netloc of a varnish server's URL.
+    """
+    patterns = []
+    chunk = []
+    length = 0
+    for path in sorted(set(paths)):
+        if chunk and length + len(path) + 1 > settings.VARNISH_BAN_MAX_PATTERN_LENGTH:
+            patterns.append(chunk)
+            chunk, length = [], 0
+        chunk.append(path)
+        length += len(path) + 1
+    if chunk:
+        patterns.append(chunk)
+    return [
+        '{}.*'.format(chunk[0]) if len(chunk) == 1 else '/({}).*'.format('|'.join(path.lstrip('/') for path in chunk))
+        for chunk in patterns
+    ]
+
+
+def _send_ban(server, pattern, hostname):
+    varnish_parsed_url = urlparse.urlparse(server)
+    url_to_ban = '{scheme}://{netloc}{pattern}'.format(scheme=varnish_parsed_url.scheme,
+                                                       netloc=varnish_parsed_url.netloc,
+                                                       pattern=pattern)
+    session = get_session()
+    prepared = session.prepare_request(requests.Request('BAN', url_to_ban, headers=dict(Host=hostname)))
+    # Varnish uses the raw request url as the ban regex; don't let requests percent-encode it
+    prepared.url = url_to_ban
+    ban_stats['requests'] += 1
+    try:
+        response = session.send(prepared, timeout=settings.VARNISH_BAN_TIMEOUT)
+    except Exception as ex:
+        ban_stats['failures'] += 1
+        logger.error('Banning {} failed: {}'.format(url_to_ban, ex))
+    else:
+        if not response.ok:
+            ban_stats['failures'] += 1
+            logger.error('Banning {} failed: {}'.format(url_to_ban, response.text))
+        else:
+            logger.info('Banning {} succeeded'.format(url_to_ban))
+
+
+def send_bans(paths, hostname):
+    """Ban ``paths`` on every varnish server, one merged regex at a time per
+    server, with the servers contacted in parallel.
+    """
+    servers = get_varnish_servers()
+    patterns = build_ban_patterns(paths)
+    if not servers or not patterns:
+        return
+    ban_stats['patterns'] += len(patterns)
+    pool = Pool(len(servers))
+    for server in servers:
+        pool.spawn(lambda server: [_send_ban(server, pattern, hostname) for pattern in patterns], server)
+    pool.join()
+
+
+class BanBatch(object):
+    """Objects saved during one request whose API representations must be banned."""
+
+    def __init__(self):
+        self.instances = collections.OrderedDict()
+        self.sent = False
+
+    def add(self, instance):
+        self.instances[(instance.__class__, instance.pk)] = instance
+
+
+def get_ban_batch():
+    batch = getattr(_local, 'ban_batch', None)
+    if batch is None or batch.sent:
+        batch = _local.ban_batch = BanBatch()
+    return batch
+
+
+def send_ban_batch(batch):
+    batch.sent = True
+    paths_by_hostname = collections.defaultdict(set)
+    for instance in batch.instances.values():
+        paths, hostname = get_bannable_paths(instance)
+        paths_by_hostname[hostname].update(paths)
+    ban_stats['objects'] += len(batch.instances)
+    for hostname, paths in paths_by_hostname.items():
+        embeds.invalidate(paths)
+        if settings.ENABLE_VARNISH:
+            send_bans(paths, hostname)
+
+
+def enqueue_ban(instance):
+    """Ban ``instance`` from the cache after the current request. All objects
+    queued during a request are banned together, with one merged regex per server.
+    Cached embeds of the objects are invalidated at the same time.
+    """
+    if not settings.ENABLE_VARNISH and not embeds.is_enabled():
+        return
+    batch = get_ban_batch()
+    batch.add(instance)
+    enqueue_postcommit_task(send_ban_batch, (batch, ), {}, celery=False, once_per_request=True)
 
 
 def ban_url(instance):
-    # TODO: Refactor; Pull url generation into postcommit_task handling so we only ban urls once per request
-    timeout = 0.3  # 300ms timeout for bans
-    if settings.ENABLE_VARNISH:
-        bannable_urls, hostname = get_bannable_urls(instance)
-
-        for url_to_ban in set(bannable_urls):
-            try:
-                response = requests.request('BAN', url_to_ban, timeout=timeout, headers=dict(
-                    Host=hostname
-                ))
-            except Exception as ex:
-                logger.error('Banning {} failed: {}'.format(
-                    url_to_ban,
-                    ex.message
-                ))
-            else:
-                if not response.ok:
-                    logger.error('Banning {} failed: {}'.format(
-                        url_to_ban,
-                        response.text
-                    ))
-                else:
-                    logger.info('Banning {} succeeded'.format(
-                        url_to_ban
-                    ))
+    """Ban ``instance`` from the cache immediately."""
+    if settings.ENABLE_VARNISH or embeds.is_enabled():
+        paths, hostname = get_bannable_paths(instance)
+        embeds.invalidate(paths)
+        if settings.ENABLE_VARNISH:
+            ban_stats['objects'] += 1
+            send_bans(paths, hostname)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import urlparse
+
+import mock
+import pytest
+
+from api.caching import tasks
+from framework.postcommit_tasks.handlers import postcommit_before_request, postcommit_queue
+from osf_tests.factories import ProjectFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.yield_fixture()
+def varnish_settings():
+    with mock.patch.object(tasks.settings, 'ENABLE_VARNISH', True), \
+            mock.patch.object(tasks.settings, 'VARNISH_SERVERS', ['http://varnish1:8080', 'http://varnish2:8080']), \
+            mock.patch.object(tasks.settings, 'VARNISH_BAN_MAX_PATTERN_LENGTH', 40):
+        yield
+
+
+class TestBuildBanPatterns:
+
+    def test_single_path_matches_individual_ban(self, varnish_settings):
+        assert tasks.build_ban_patterns(['/v2/nodes/abcde/']) == ['/v2/nodes/abcde/.*']
+
+    def test_paths_are_merged_and_deduplicated(self, varnish_settings):
+        patterns = tasks.build_ban_patterns(['/v2/users/a/', '/v2/nodes/b/', '/v2/users/a/'])
+        assert patterns == ['/(v2/nodes/b/|v2/users/a/).*']
+
+    def test_patterns_are_split_at_max_length(self, varnish_settings):
+        paths = ['/v2/nodes/{}/'.format(i) for i in range(10)]
+        patterns = tasks.build_ban_patterns(paths)
+        assert len(patterns) > 1
+        assert all(len(pattern) <= 40 + len('/().*') for pattern in patterns)
+        assert all(pattern.startswith('/') for pattern in patterns)
+
+
+class TestBanBatch:
+
+    def test_saves_in_a_request_are_banned_together(self, varnish_settings):
+        postcommit_before_request()
+        project = ProjectFactory()
+        component = ProjectFactory(parent=project)
+        tasks.enqueue_ban(project)
+        tasks.enqueue_ban(component)
+        tasks.enqueue_ban(project)
+        assert len([task for task in postcommit_queue().values() if task.func == tasks.send_ban_batch]) == 1
+
+        with mock.patch.object(tasks, '_send_ban') as mock_send_ban:
+            for task in postcommit_queue().values():
+                task()
+        patterns = {call[0][1] for call in mock_send_ban.call_args_list}
+        servers = {call[0][0] for call in mock_send_ban.call_args_list}
+        assert servers == {'http://varnish1:8080', 'http://varnish2:8080'}
+        assert len(mock_send_ban.call_args_list) == 2 * len(patterns)
+        assert any(project._id in pattern and component._id in pattern for pattern in patterns)
+
+    def test_new_batch_after_send(self, varnish_settings):
+        batch = tasks.get_ban_batch()
+        assert tasks.get_ban_batch() is batch
+        with mock.patch.object(tasks, 'send_bans'):
+            tasks.send_ban_batch(batch)
+        assert tasks.get_ban_batch() is not batch
+
+    def test_disabled_varnish_queues_nothing(self):
+        postcommit_before_request()
+        with mock.patch.object(tasks.settings, 'ENABLE_VARNISH', False):
+            tasks.enqueue_ban(ProjectFactory())
+        assert not [task for task in postcommit_queue().values() if getattr(task, 'func', None) == tasks.send_ban_batch]
+
+
+class TestSendBan:
+
+    def test_failures_are_counted(self, varnish_settings):
+        failures = tasks.ban_stats['failures']
+        with mock.patch.object(tasks.get_session(), 'send', side_effect=Exception('timeout')):
+            tasks.send_bans(['/v2/nodes/abcde/'], 'api.osf.io')
+        assert tasks.ban_stats['failures'] == failures + 2
+
+    def test_pattern_is_not_percent_encoded(self, varnish_settings):
+        with mock.patch.object(tasks.get_session(), 'send') as mock_send:
+            tasks.send_bans(['/v2/nodes/a/', '/v2/nodes/b/'], 'api.osf.io')
+        urls = sorted(call[0][0].url for call in mock_send.call_args_list)
+        assert len(urls) == 2
+        for url, host in zip(urls, ['varnish1', 'varnish2']):
+            parsed = urlparse.urlsplit(url)
+            assert parsed.hostname == host
+            assert parsed.port == 8080
+            assert parsed.path == '/(v2/nodes/a/|v2/nodes/b/).*'
+        assert mock_send.call_args[0][0].headers['Host'] == 'api.osf.io'
@@ -1,14 +1,27 @@
+import collections
+import hashlib
+import json
 import os
 import re
+import threading
 
 from citeproc import CitationStylesStyle, CitationStylesBibliography
 from citeproc import Citation, CitationItem
 from citeproc import formatter
 from citeproc.source.json import CiteProcJSON
 
+from django.core.cache import cache
+
 from osf.models import PreprintService
+from website import settings
 from website.settings import CITATION_STYLES_PATH, BASE_PATH, CUSTOM_CITATIONS
 
+CITATION_CACHE_KEY = 'osf:citation:{style}:{id}:{version}'
+
+# style path -> (style file mtime, parsed style), least recently used first
+_styles = collections.OrderedDict()
+_styles_lock = threading.Lock()
+
 
 def clean_up_common_errors(cit):
     cit = re.sub(r"\.+", '.', cit)
@@ -37,20 +50,47 @@ def preprint_csl(preprint, node):
 
     return csl
 
-def render_citation(node, style='apa'):
-    """Given a node, return a citation"""
-    csl = None
-    if isinstance(node, PreprintService):
-        csl = preprint_csl(node, node.node)
-        data = [csl, ]
-    else:
-        data = [node.csl, ]
-
-    bib_source = CiteProcJSON(data)
-
+def get_style(style):
+    """Return the parsed CSL style ``style``, from this process's LRU of
+    ``CITATION_STYLE_CACHE_SIZE`` styles unless its file has changed since it was parsed.
+    Raises ValueError if there is no such style.
+    """
     custom = CUSTOM_CITATIONS.get(style, False)
     path = os.path.join(BASE_PATH, 'static', custom) if custom else os.path.join(CITATION_STYLES_PATH, style)
+    try:
+        # citeproc looks for <path>.csl if there is no file at path
+        mtime = os.path.getmtime(path if os.path.exists(path) else path + '.csl')
+    except OSError:
+        mtime = None
+
+    with _styles_lock:
+        entry = _styles.pop(path, None)
+        if entry is not None and entry[0] == mtime:
+            _styles[path] = entry
+            return entry[1]
+
     bib_style = CitationStylesStyle(path, validate=False)
+    if mtime is not None and settings.CITATION_STYLE_CACHE_SIZE:
+        with _styles_lock:
+            _styles[path] = (mtime, bib_style)
+            while len(_styles) > settings.CITATION_STYLE_CACHE_SIZE:
+                _styles.popitem(last=False)
+    return bib_style
+
+def get_csl(node):
+    if isinstance(node, PreprintService):
+        return preprint_csl(node, node.node)
+    return node.csl
+
+def citation_cache_key(node, style, csl):
+    """The rendered citation's cache key, which changes with any of the CSL data
+    (title, contributors, dates, DOI, ...) the citation is rendered from.
+    """
+    version = hashlib.sha1(json.dumps(csl, sort_keys=True)).hexdigest()
+    return CITATION_CACHE_KEY.format(style=style, id=node._id, version=version)
+
+def _render(node, bib_style, csl):
+    bib_source = CiteProcJSON([csl, ])
 
     bibliography = CitationStylesBibliography(bib_style, bib_source, formatter.plain)
 
@@ -61,7 +101,7 @@ def render_citation(node, style='apa'):
     bib = bibliography.bibliography()
     cit = unicode(bib[0] if len(bib) else '')
 
-    title = csl['title'] if csl else node.csl['title']
+    title = csl['title']
     if cit.count(title) == 1:
         i = cit.index(title)
         prefix = clean_up_common_errors(cit[0:i])
@@ -71,3 +111,32 @@ def render_citation(node, style='apa'):
         cit = clean_up_common_errors(cit)
 
     return cit
+
+def render_citations(nodes, style='apa'):
+    """Given nodes or preprints, return a dict of their citations in one style, by _id.
+    Citations are cached for ``CITATION_CACHE_TIMEOUT`` seconds.
+    """
+    csls = collections.OrderedDict((node._id, (node, get_csl(node))) for node in nodes)
+    keys = {
+        _id: citation_cache_key(node, style, csl)
+        for _id, (node, csl) in csls.items()
+    }
+    timeout = settings.CITATION_CACHE_TIMEOUT
+    cached = cache.get_many(keys.values()) if timeout else {}
+
+    citations = collections.OrderedDict()
+    rendered = {}
+    bib_style = None
+    for _id, (node, csl) in csls.items():
+        if keys[_id] in cached:
+            citations[_id] = cached[keys[_id]]
+            continue
+        bib_style = bib_style or get_style(style)
+        citations[_id] = rendered[keys[_id]] = _render(node, bib_style, csl)
+    if rendered and timeout:
+        cache.set_many(rendered, timeout)
+    return citations
+
+def render_citation(node, style='apa'):
+    """Given a node, return a citation"""
+    return render_citations([node], style=style)[node._id]
@@ -28,6 +28,7 @@ from api.base.serializers import (
 from api.base.exceptions import Conflict
 from api.base.utils import absolute_reverse
 from api.base.utils import get_user_auth
+from api.base.utils import get_unread_comments_count
 
 class CheckoutField(ser.HyperlinkedRelatedField):
 
@@ -252,10 +253,9 @@ class BaseFileSerializer(JSONAPISerializer):
         return obj.node.can_comment(auth)
 
     def get_unread_comments_count(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return 0
-        return Comment.find_n_unread(user=user, node=obj.node, page='files', root_id=obj.get_guid()._id)
+        return get_unread_comments_count(
+            self, obj, lambda file_node: (file_node.node, Comment.FILES, file_node.get_guid()._id)
+        )
 
     def user_id(self, obj):
         # NOTE: obj is the user here, the meta field for
@@ -12,7 +12,7 @@ from api.base.serializers import (DateByVersion, HideIfRegistration, IDField,
                                   WaterbutlerLink, relationship_diff, BaseAPISerializer)
 from api.base.settings import ADDONS_FOLDER_CONFIGURABLE
 from api.base.utils import (absolute_reverse, get_object_or_error,
-                            get_user_auth, is_truthy)
+                            get_unread_comments_count, get_user_auth, is_truthy)
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -408,8 +408,7 @@ class NodeSerializer(JSONAPISerializer):
         return count
 
     def get_unread_comments_count(self, obj):
-        user = get_user_auth(self.context['request']).user
-        node_comments = Comment.find_n_unread(user=user, node=obj, page='node')
+        node_comments = get_unread_comments_count(self, obj, lambda node: (node, Comment.OVERVIEW, None))
 
         return {
             'node': node_comments
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import pytest
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from api.base.settings.defaults import API_BASE
+from api.caching import embeds, tasks
+from osf.models import Contributor
+from osf_tests.factories import AuthUserFactory, ProjectFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.yield_fixture()
+def embed_cache():
+    cache.clear()
+    with override_settings(EMBED_CACHE_TIMEOUT=60):
+        yield
+    cache.clear()
+
+
+def test_path_prefixes():
+    assert embeds.path_prefixes('/v2/nodes/abc12/contributors/') == [
+        '/v2/', '/v2/nodes/', '/v2/nodes/abc12/', '/v2/nodes/abc12/contributors/'
+    ]
+
+
+class TestInvalidation:
+
+    def test_invalidating_a_path_changes_keys_below_it(self, embed_cache):
+        contributors = embeds.get_cache_key('/v2/nodes/abc12/contributors/', version='2.0')
+        other = embeds.get_cache_key('/v2/nodes/xyz34/contributors/', version='2.0')
+
+        embeds.invalidate(['/v2/nodes/abc12/'])
+
+        assert embeds.get_cache_key('/v2/nodes/abc12/contributors/', version='2.0') != contributors
+        assert embeds.get_cache_key('/v2/nodes/xyz34/contributors/', version='2.0') == other
+
+    def test_disabled_by_default(self):
+        assert not embeds.is_enabled()
+
+
+class TestSharedEmbedCache:
+
+    @pytest.fixture()
+    def node(self):
+        return ProjectFactory(is_public=True)
+
+    def get_bibliographic(self, app, node, **kwargs):
+        url = '/{}nodes/{}/?embed=contributors'.format(API_BASE, node._id)
+        res = app.get(url, **kwargs)
+        return [each['attributes']['bibliographic'] for each in res.json['data']['embeds']['contributors']['data']]
+
+    def test_anonymous_embeds_are_cached_until_banned(self, app, node, embed_cache):
+        assert self.get_bibliographic(app, node) == [True]
+
+        # Bypasses save(), so nothing is banned
+        Contributor.objects.filter(node=node).update(visible=False)
+        assert self.get_bibliographic(app, node) == [True]
+
+        tasks.ban_url(node)
+        assert self.get_bibliographic(app, node) == [False]
+
+    def test_authenticated_embeds_are_not_cached(self, app, node, embed_cache):
+        user = AuthUserFactory()
+        assert self.get_bibliographic(app, node, auth=user.auth) == [True]
+
+        Contributor.objects.filter(node=node).update(visible=False)
+        assert self.get_bibliographic(app, node, auth=user.auth) == [False]
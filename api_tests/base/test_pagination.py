@@ -53,3 +53,61 @@ class TestJSONAPIPagination(ApiTestCase):
         assert_not_in('meta', links)
         assert_in('total', meta)
         assert_in('per_page', meta)
+
+
+class TestCursorPagination(ApiTestCase):
+
+    def setUp(self):
+        super(TestCursorPagination, self).setUp()
+        self.user = factories.AuthUserFactory()
+        for i in range(0, 11):
+            factories.ProjectFactory(creator=self.user)
+        self.url = '/{}nodes/?version=2.1&page[size]=5'.format(settings.API_BASE)
+
+    def get_ids(self, url):
+        res = self.app.get(url, auth=self.user.auth)
+        return [each['id'] for each in res.json['data']]
+
+    def test_walks_every_node_in_page_number_order(self):
+        expected = self.get_ids(self.url) + self.get_ids(self.url + '&page=2') + self.get_ids(self.url + '&page=3')
+
+        seen = []
+        res = self.app.get(self.url + '&page[cursor]=', auth=self.user.auth)
+        assert_is_none(res.json['links']['prev'])
+        assert_is_none(res.json['links']['last'])
+        while True:
+            seen.extend(each['id'] for each in res.json['data'])
+            if not res.json['links']['next']:
+                break
+            res = self.app.get(res.json['links']['next'], auth=self.user.auth)
+        assert_equal(seen, expected)
+
+    def test_prev_link_returns_previous_page(self):
+        first = self.app.get(self.url + '&page[cursor]=', auth=self.user.auth)
+        second = self.app.get(first.json['links']['next'], auth=self.user.auth)
+        back = self.app.get(second.json['links']['prev'], auth=self.user.auth)
+        assert_equal(
+            [each['id'] for each in back.json['data']],
+            [each['id'] for each in first.json['data']]
+        )
+        assert_is_none(back.json['links']['prev'])
+        assert_equal(back.json['links']['next'], first.json['links']['next'])
+
+    def test_total_modes(self):
+        res = self.app.get(self.url + '&page[cursor]=&page[total]=exact', auth=self.user.auth)
+        assert_equal(res.json['meta']['total'], 11)
+        assert_not_in('total_is_estimate', res.json['meta'])
+
+        res = self.app.get(self.url + '&page[cursor]=&page[total]=none', auth=self.user.auth)
+        assert_is_none(res.json['meta']['total'])
+
+        res = self.app.get(self.url + '&page[cursor]=', auth=self.user.auth)
+        assert_true(res.json['meta']['total_is_estimate'])
+
+        res = self.app.get(self.url + '&page[cursor]=&page[total]=lots', auth=self.user.auth, expect_errors=True)
+        assert_equal(res.status_code, 400)
+
+    def test_invalid_cursor(self):
+        res = self.app.get(self.url + '&page[cursor]=notacursor', auth=self.user.auth, expect_errors=True)
+        assert_equal(res.status_code, 400)
+        assert_equal(res.json['errors'][0]['source']['parameter'], 'page[cursor]')
@@ -3,6 +3,7 @@ import httplib as http
 import importlib
 import pkgutil
 
+import mock
 import pytest
 from pytz import utc
 from datetime import datetime
@@ -143,6 +144,31 @@ class TestNullLinks(ApiTestCase):
         assert_in('valued_link_field', rep['relationships'])
 
 
+class TestFieldPlan(ApiTestCase):
+
+    def test_plan_is_compiled_once_per_list(self):
+        req = make_drf_request_with_version(version='2.0')
+        with mock.patch('api.base.serializers.FieldPlan', wraps=base_serializers.FieldPlan) as mock_plan:
+            data = FakeSerializer([FakeModel] * 3, many=True, context={'request': req}).data
+        assert_equal(len(data), 3)
+        assert_equal(mock_plan.call_count, 1)
+
+    def test_plan_is_recompiled_for_a_new_context(self):
+        serializer = FakeSerializer(context={'request': make_drf_request_with_version(version='2.0')})
+        plan = serializer.get_field_plan()
+        assert_is(serializer.get_field_plan(), plan)
+
+        serializer._context = {'request': make_drf_request_with_version(version='2.0')}
+        assert_is_not(serializer.get_field_plan(), plan)
+
+    def test_field_kinds(self):
+        serializer = FakeSerializer(context={'request': make_drf_request_with_version(version='2.0')})
+        kinds = {name: kind for field, name, kind, embed, hidden in serializer.get_field_plan().fields}
+        assert_equal(kinds['links'], base_serializers.FieldPlan.LINKS)
+        assert_equal(kinds['null_link_field'], base_serializers.FieldPlan.RELATIONSHIP)
+        assert_equal(kinds['valued_link_field'], base_serializers.FieldPlan.RELATIONSHIP)
+
+
 class TestApiBaseSerializers(ApiTestCase):
 
     def setUp(self):
@@ -1,7 +1,10 @@
 import functools
+import mock
 import pytest
 
 from api.base.settings.defaults import API_BASE
+from api.base.views import BaseContributorList
+from api.nodes.views import NodeContributorsList
 from framework.auth.core import Auth
 from osf_tests.factories import (
     ProjectFactory,
@@ -128,3 +131,36 @@ class TestNodeEmbeds:
         res = app.get(url, auth=write_contrib_one.auth)
         assert res.status_code == 200
         assert res.json['data']['embeds']['contributors']['meta']['total_bibliographic'] == 3
+
+
+@pytest.mark.django_db
+class TestNodeListContributorEmbeds:
+
+    @pytest.fixture()
+    def contrib(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def nodes(self, user, contrib):
+        nodes = [ProjectFactory(creator=user, is_public=True) for i in range(3)]
+        nodes[0].add_contributor(contrib, ['read', 'write'], auth=Auth(user), save=True)
+        nodes[1].add_contributor(contrib, ['read'], auth=Auth(user), visible=False, save=True)
+        return nodes
+
+    def test_contributors_are_loaded_for_the_page_at_once(self, app, user, contrib, nodes):
+        url = '/{}nodes/?version=2.1&embed=contributors&filter[id]={}'.format(
+            API_BASE, ','.join(node._id for node in nodes))
+
+        with mock.patch.object(NodeContributorsList, 'get_embed_batch', side_effect=BaseContributorList.get_embed_batch) as mock_batch:
+            res = app.get(url, auth=user.auth)
+        assert res.status_code == 200
+        assert mock_batch.call_count == 1
+
+        embeds = {each['id']: each['embeds']['contributors'] for each in res.json['data']}
+        assert [each['id'] for each in embeds[nodes[0]._id]['data']] == [
+            '{}-{}'.format(nodes[0]._id, user._id),
+            '{}-{}'.format(nodes[0]._id, contrib._id),
+        ]
+        assert embeds[nodes[0]._id]['meta']['total_bibliographic'] == 2
+        assert embeds[nodes[1]._id]['meta']['total_bibliographic'] == 1
+        assert [each['id'] for each in embeds[nodes[2]._id]['data']] == ['{}-{}'.format(nodes[2]._id, user._id)]
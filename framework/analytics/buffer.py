@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Write buffer for PageCounter and UserActivityCounter increments.
+
+Every page view, download and logged action used to lock its counter row with
+``select_for_update`` and rewrite the counter's ever-growing JSON ``date`` blob.
+Popular files serialized all of their downloads on that one row.
+
+Increments are now added up in a per-process ``CounterBuffer``. Once
+``ANALYTICS_FLUSH_MAX_KEYS`` counters are pending, or on the first increment
+``ANALYTICS_FLUSH_INTERVAL`` seconds after the last flush, the buffer writes the
+summed deltas with one upsert per table. Per-day counts go to ``DailyPageCount``
+and ``DailyUserActivityCount``. During a request the flush runs as a postcommit
+task, so the response does not wait for it. A daemon thread also flushes every
+``ANALYTICS_FLUSH_INTERVAL`` seconds, so the increments of a process that goes
+idle are written too, and they are flushed when the process exits normally. A
+process that is killed (or leaves through ``os._exit``) loses the increments of
+up to its last ``ANALYTICS_FLUSH_INTERVAL`` seconds.
+
+Reads through ``get_basic_counters``, ``get_total_activity_count`` and
+``pending_page_totals`` add this process's pending increments. Other processes
+see them within ``ANALYTICS_FLUSH_INTERVAL`` seconds. Set
+``ANALYTICS_FLUSH_INTERVAL = 0`` (as the test settings do) to write every
+increment immediately.
+"""
+import atexit
+import collections
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.db import connection, transaction
+
+from framework.postcommit_tasks.handlers import enqueue_postcommit_task
+from osf.utils.requests import dummy_request, get_current_request
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _in_request():
+    return get_current_request() is not dummy_request
+
+
+class CounterBuffer(object):
+    """Counter increments that still have to be written to the database."""
+
+    def __init__(self, interval, max_keys):
+        self.interval = interval
+        self.max_keys = max_keys
+        self._reset()
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        # page -> [total, unique]
+        self._pages = collections.defaultdict(lambda: [0, 0])
+        # (page, date) -> [total, unique]
+        self._page_days = collections.defaultdict(lambda: [0, 0])
+        # user id -> total
+        self._activity = collections.defaultdict(int)
+        # (user id, action, date) -> total
+        self._activity_days = collections.defaultdict(int)
+
+    def add_page_view(self, page, date, total=0, unique=0, day_total=0, day_unique=0):
+        with self._lock:
+            counts = self._pages[page]
+            counts[0] += total
+            counts[1] += unique
+            counts = self._page_days[(page, date)]
+            counts[0] += day_total
+            counts[1] += day_unique
+        self._flush_if_due()
+
+    def add_user_activity(self, user_id, action, date):
+        with self._lock:
+            self._activity[user_id] += 1
+            self._activity_days[(user_id, action, date)] += 1
+        self._flush_if_due()
+
+    def pending_page_counts(self, page):
+        """Return the pending ``(unique, total)`` of ``page``, or ``None``."""
+        with self._lock:
+            if page not in self._pages:
+                return None
+            total, unique = self._pages[page]
+            return unique, total
+
+    def pending_page_totals(self, prefix):
+        """Return the pending totals of the pages whose names start with ``prefix``."""
+        with self._lock:
+            return {
+                page: counts[0]
+                for page, counts in self._pages.items()
+                if page.startswith(prefix)
+            }
+
+    def pending_user_activity(self, user_id):
+        with self._lock:
+            return self._activity.get(user_id, 0)
+
+    def _flush_if_due(self):
+        with self._lock:
+            pending = len(self._page_days) + len(self._activity_days)
+            due = pending >= self.max_keys or time.time() - self._last_flush >= self.interval
+        if not due:
+            return
+        if self.interval and _in_request():
+            enqueue_postcommit_task(flush_counters, (), {}, celery=False, once_per_request=True)
+        else:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pages, page_days = self._pages, self._page_days
+            activity, activity_days = self._activity, self._activity_days
+            self._reset()
+            self._last_flush = time.time()
+
+        try:
+            # All or nothing, so that putting the increments back can't count any twice
+            with transaction.atomic():
+                if page_days:
+                    PageCounter = apps.get_model('osf.PageCounter')
+                    BaseFileNode = apps.get_model('osf.BaseFileNode')
+
+                    totals = PageCounter.add_counts(pages, page_days)
+                    # download:<node>:<file> counters are copied onto the file for folder listings
+                    BaseFileNode.set_download_counts({
+                        page.split(':')[2]: total
+                        for page, total in totals.items()
+                        if page.startswith('download:') and page.count(':') == 2
+                    })
+                if activity_days:
+                    UserActivityCounter = apps.get_model('osf.UserActivityCounter')
+                    UserActivityCounter.add_counts(activity, activity_days)
+        except Exception:
+            # Nothing was written; keep the increments for the next flush rather than losing them
+            with self._lock:
+                for page, (total, unique) in pages.items():
+                    self._pages[page][0] += total
+                    self._pages[page][1] += unique
+                for key, (total, unique) in page_days.items():
+                    self._page_days[key][0] += total
+                    self._page_days[key][1] += unique
+                for user_id, total in activity.items():
+                    self._activity[user_id] += total
+                for key, total in activity_days.items():
+                    self._activity_days[key] += total
+            raise
+
+
+def flush_counters():
+    get_counter_buffer().flush()
+
+
+def _flush_periodically(buffer):
+    while True:
+        time.sleep(buffer.interval)
+        try:
+            if time.time() - buffer._last_flush >= buffer.interval:
+                buffer.flush()
+        except Exception as err:
+            logger.exception(err)
+        finally:
+            # This thread's connection would otherwise stay open between flushes
+            connection.close()
+
+
+def _flush_at_exit():
+    try:
+        flush_counters()
+    except Exception as err:
+        logger.exception(err)
+
+
+_buffer = None
+_buffer_pid = None
+
+
+def get_counter_buffer():
+    global _buffer, _buffer_pid
+    # A forked worker starts with an empty buffer; the parent writes what it had
+    if _buffer is None or _buffer_pid != os.getpid():
+        _buffer = CounterBuffer(
+            interval=settings.ANALYTICS_FLUSH_INTERVAL,
+            max_keys=settings.ANALYTICS_FLUSH_MAX_KEYS,
+        )
+        if _buffer_pid is None:
+            atexit.register(_flush_at_exit)
+        _buffer_pid = os.getpid()
+        if _buffer.interval:
+            flusher = threading.Thread(target=_flush_periodically, args=(_buffer, ), name='analytics-flush')
+            flusher.daemon = True
+            flusher.start()
+    return _buffer
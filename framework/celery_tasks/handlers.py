@@ -42,21 +42,38 @@ def celery_teardown_request(error=None):
                 task.apply()
 
 
+def _in_request_context():
+    return context_stack.top is not None or getattr(api_globals, 'request', None) is not None
+
+
 def enqueue_task(signature):
     """If working in a request context, push task signature to thread-local
     queue to run after request is complete; else run signature immediately.
     :param signature: Celery task signature
     """
-    if (
-        context_stack.top is None and
-        getattr(api_globals, 'request', None) is None
-    ):  # Not in a request context
+    if not _in_request_context():
         signature()
     else:
         if signature not in queue():
             queue().append(signature)
 
 
+def enqueue_batched_task(task, item):
+    """Like ``enqueue_task``, for tasks taking a list of items as their only argument.
+    Items enqueued during one request are collected into a single queued task; outside
+    of a request context the task runs immediately with ``[item]``.
+    :param task: Celery task
+    :param item: JSON serializable item to add to the task's batch
+    """
+    if _in_request_context():
+        for signature in queue():
+            if signature.task == task.name:
+                # Arguments are not serialized until the task is sent, after the request
+                signature.args[0].append(item)
+                return
+    enqueue_task(task.s([item]))
+
+
 def queued_task(task):
     """Decorator that adds the wrapped task to the queue on ``g`` if Celery is
     enabled, else runs the task synchronously. Can only be applied to Celery
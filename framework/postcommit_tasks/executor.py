@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Process-wide executor for postcommit tasks.
+
+Tasks queued during a request with ``enqueue_postcommit_task`` used to run on a
+fresh gevent pool that the request joined before returning its response. The
+executor below keeps a single bounded queue and a fixed number of worker
+greenlets per process, so the response is returned as soon as the tasks are
+handed off.
+
+* Backpressure: when the queue is full, submitting blocks for up to
+  ``POSTCOMMIT_QUEUE_TIMEOUT`` seconds, then runs the task inline rather than
+  dropping it.
+* Each task is bounded by ``POSTCOMMIT_TASK_TIMEOUT`` seconds.
+* ``stats()`` reports queue depth, task latency and failure counts.
+
+Set ``POSTCOMMIT_ASYNC = False`` (as the test settings do) to run tasks
+synchronously in the submitting greenlet.
+"""
+import logging
+import threading
+import time
+
+import gevent
+from gevent.queue import Full, JoinableQueue
+from django.db import close_old_connections
+
+from framework.sentry import log_exception
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PostcommitExecutor(object):
+
+    def __init__(self, size, max_queue_size, task_timeout, queue_timeout, synchronous=False):
+        self.size = size
+        self.task_timeout = task_timeout
+        self.queue_timeout = queue_timeout
+        self.synchronous = synchronous
+        self._queue = JoinableQueue(maxsize=max_queue_size)
+        self._workers = []
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'overflowed': 0,
+            'total_latency': 0.0,
+            'max_latency': 0.0,
+        }
+
+    def stats(self):
+        """Return a snapshot of executor metrics. Latencies are in seconds
+        and measured from submission to task completion.
+        """
+        stats = dict(self._stats)
+        finished = stats['completed'] + stats['failed'] + stats['timed_out']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['workers'] = len(self._workers)
+        stats['mean_latency'] = stats['total_latency'] / finished if finished else 0.0
+        return stats
+
+    def _ensure_workers(self):
+        if len(self._workers) >= self.size:
+            return
+        with self._lock:
+            self._workers = [worker for worker in self._workers if not worker.dead]
+            while len(self._workers) < self.size:
+                self._workers.append(gevent.spawn(self._work))
+
+    def submit(self, func):
+        """Schedule ``func`` to run with no arguments."""
+        self._stats['submitted'] += 1
+        submitted = time.time()
+        if self.synchronous:
+            return self._run(func, submitted)
+        self._ensure_workers()
+        try:
+            self._queue.put((func, submitted), timeout=self.queue_timeout)
+        except Full:
+            self._stats['overflowed'] += 1
+            logger.warning('Postcommit queue is full ({} tasks); running task inline'.format(self._queue.qsize()))
+            self._run(func, submitted)
+
+    def join(self, timeout=None):
+        """Wait until all queued tasks have been processed. Mostly useful in tests and at shutdown."""
+        return self._queue.join(timeout=timeout)
+
+    def _work(self):
+        while True:
+            func, submitted = self._queue.get()
+            try:
+                self._run(func, submitted)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, func, submitted):
+        try:
+            with gevent.Timeout(self.task_timeout):
+                func()
+        except gevent.Timeout:
+            self._stats['timed_out'] += 1
+            logger.error('Postcommit task {!r} timed out after {} seconds'.format(func, self.task_timeout))
+        except Exception as err:
+            self._stats['failed'] += 1
+            logger.exception(err)
+            log_exception()
+            if self.synchronous:
+                raise
+        else:
+            self._stats['completed'] += 1
+        finally:
+            latency = time.time() - submitted
+            self._stats['total_latency'] += latency
+            self._stats['max_latency'] = max(self._stats['max_latency'], latency)
+            if not self.synchronous:
+                # Workers outlive requests; don't let them hold stale connections
+                close_old_connections()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = PostcommitExecutor(
+            size=settings.POSTCOMMIT_POOL_SIZE,
+            max_queue_size=settings.POSTCOMMIT_QUEUE_SIZE,
+            task_timeout=settings.POSTCOMMIT_TASK_TIMEOUT,
+            queue_timeout=settings.POSTCOMMIT_QUEUE_TIMEOUT,
+            synchronous=not settings.POSTCOMMIT_ASYNC,
+        )
+    return _executor
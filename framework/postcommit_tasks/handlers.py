@@ -11,8 +11,8 @@ import os
 from celery import chain
 from framework.celery_tasks import app
 from celery.local import PromiseProxy
-from gevent.pool import Pool
 
+from framework.postcommit_tasks.executor import get_executor
 from website import settings
 
 _local = threading.local()
@@ -45,11 +45,10 @@ def postcommit_after_request(response, base_status_error_code=500):
         return response
     try:
         if postcommit_queue():
-            number_of_threads = 30  # one db connection per greenlet, let's share
-            pool = Pool(number_of_threads)
+            # Hand off to the process-wide executor; the response does not wait for these
+            executor = get_executor()
             for func in postcommit_queue().values():
-                pool.spawn(func)
-            pool.join(timeout=5.0, raise_error=True)  # 5 second timeout and reraise exceptions
+                executor.submit(func)
 
         if postcommit_celery_queue():
             if settings.USE_CELERY:
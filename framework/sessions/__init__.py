@@ -1,12 +1,9 @@
 # -*- coding: utf-8 -*-
-import datetime as dt
 import httplib as http
 import urllib
 import urlparse
 
 from django.apps import apps
-from django.utils import timezone
-from django.db.models import Q
 import bson.objectid
 import itsdangerous
 from flask import request
@@ -15,6 +12,7 @@ from weakref import WeakKeyDictionary
 from werkzeug.local import LocalProxy
 
 from framework.flask import redirect
+from framework.sessions.store import get_session_store, record_last_login
 from framework.sessions.utils import remove_session
 from website import settings
 
@@ -93,7 +91,7 @@ def create_session(response, data=None):
     current_session = get_session()
     if current_session:
         current_session.data.update(data or {})
-        current_session.save()
+        get_session_store().save(current_session)
         cookie_value = itsdangerous.Signer(settings.SECRET_KEY).sign(current_session._id)
     else:
         session_id = str(bson.objectid.ObjectId())
@@ -160,19 +158,13 @@ def before_request():
     if cookie:
         try:
             session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie)
-            user_session = Session.load(session_id) or Session(_id=session_id)
+            user_session = get_session_store().load(session_id) or Session(_id=session_id)
         except itsdangerous.BadData:
             return
         if not util_time.throttle_period_expired(user_session.date_created, settings.OSF_SESSION_TIMEOUT):
             # Update date last login when making non-api requests
             if user_session.data.get('auth_user_id') and 'api' not in request.url:
-                OSFUser = apps.get_model('osf.OSFUser')
-                (
-                    OSFUser.objects
-                    .filter(guids___id__isnull=False, guids___id=user_session.data['auth_user_id'])
-                    # Throttle updates
-                    .filter(Q(date_last_login__isnull=True) | Q(date_last_login__lt=timezone.now() - dt.timedelta(seconds=settings.DATE_LAST_LOGIN_THROTTLE)))
-                ).update(date_last_login=timezone.now())
+                record_last_login(user_session.data['auth_user_id'])
             set_session(user_session)
         else:
             remove_session(user_session)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""Cache layer in front of the osf.Session table.
+
+Every authenticated request used to load its session from Postgres, and
+``before_request`` also issued an ``UPDATE`` of the user's ``date_last_login``.
+
+* ``SessionStore.load`` checks the optional per-process LRU first
+  (``SESSION_CACHE_SIZE`` entries for ``SESSION_CACHE_TIMEOUT`` seconds), then the
+  optional shared Django cache named by ``SESSION_CACHE_BACKEND``, then the database.
+* Saving or deleting a Session evicts it from this process's LRU and from the
+  shared cache (see the receivers in ``osf.models.session``). Other processes may
+  keep serving their LRU copy for up to ``SESSION_CACHE_TIMEOUT`` seconds, e.g. a
+  session that has just logged out, which is why the LRU is off by default.
+* With a shared cache and ``SESSION_WRITE_BEHIND``, ``SessionStore.save`` updates
+  the caches immediately and writes to the database once per request, after the
+  response has been sent.
+* ``record_last_login`` collects the users seen by ``before_request`` and updates
+  their ``date_last_login`` with one query every ``DATE_LAST_LOGIN_FLUSH_INTERVAL``
+  seconds, from a daemon thread if the process is idle, and when it exits.
+"""
+import atexit
+import collections
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from werkzeug.local import LocalProxy
+
+from framework.postcommit_tasks.handlers import enqueue_postcommit_task
+from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONEncoder, decode_datetime_objects
+from osf.utils.requests import dummy_request, get_current_request
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+CACHE_KEY_PREFIX = 'osf:session:'
+
+
+def _in_request():
+    return get_current_request() is not dummy_request
+
+
+class SessionBatch(object):
+    """Sessions saved during one request that still have to be written to the database."""
+
+    def __init__(self):
+        self.sessions = collections.OrderedDict()
+        self.sent = False
+
+    def add(self, session):
+        self.sessions[session.pk] = session
+
+
+def get_session_batch():
+    batch = getattr(_local, 'session_batch', None)
+    if batch is None or batch.sent:
+        batch = _local.session_batch = SessionBatch()
+    return batch
+
+
+class SessionStore(object):
+
+    def __init__(self, size, timeout, shared_cache=None, shared_timeout=None, write_behind=False):
+        self.size = size
+        self.timeout = timeout
+        self.shared_cache = shared_cache
+        self.shared_timeout = shared_timeout
+        self.write_behind = write_behind and shared_cache is not None
+        # session id -> (expiry time, snapshot), least recently used first
+        self._lru = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    @property
+    def model(self):
+        return apps.get_model('osf.Session')
+
+    def _snapshot(self, session):
+        snapshot = {field.attname: getattr(session, field.attname) for field in self.model._meta.concrete_fields}
+        # Round-trip data through JSON as the database does, so cached and loaded sessions look the same
+        snapshot['data'] = json.dumps(session.data, cls=DateTimeAwareJSONEncoder)
+        return snapshot
+
+    def _from_snapshot(self, snapshot):
+        values = dict(snapshot, data=decode_datetime_objects(json.loads(snapshot['data'])))
+        names = [field.attname for field in self.model._meta.concrete_fields]
+        return self.model.from_db('default', names, [values[name] for name in names])
+
+    def _get_local(self, session_id):
+        if not self.size:
+            return None
+        with self._lock:
+            entry = self._lru.pop(session_id, None)
+            if entry is None:
+                return None
+            expires, snapshot = entry
+            if expires < time.time():
+                return None
+            self._lru[session_id] = entry
+            return snapshot
+
+    def _set_local(self, session_id, snapshot):
+        if not self.size:
+            return
+        with self._lock:
+            self._lru.pop(session_id, None)
+            self._lru[session_id] = (time.time() + self.timeout, snapshot)
+            while len(self._lru) > self.size:
+                self._lru.popitem(last=False)
+
+    def cache(self, session):
+        """Store ``session`` in the in-process and shared caches."""
+        snapshot = self._snapshot(session)
+        self._set_local(session._id, snapshot)
+        if self.shared_cache is not None:
+            self.shared_cache.set(CACHE_KEY_PREFIX + session._id, snapshot, self.shared_timeout)
+
+    def evict(self, session_id):
+        with self._lock:
+            self._lru.pop(session_id, None)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(CACHE_KEY_PREFIX + session_id)
+
+    def load(self, session_id):
+        """Return the Session with ``session_id``, or None if there is none."""
+        snapshot = self._get_local(session_id)
+        if snapshot is not None:
+            self.stats['local_hits'] += 1
+            return self._from_snapshot(snapshot)
+
+        if self.shared_cache is not None:
+            snapshot = self.shared_cache.get(CACHE_KEY_PREFIX + session_id)
+            if snapshot is not None:
+                self.stats['shared_hits'] += 1
+                self._set_local(session_id, snapshot)
+                return self._from_snapshot(snapshot)
+
+        self.stats['misses'] += 1
+        session = self.model.objects.filter(_id=session_id).first()
+        if session is not None:
+            self.cache(session)
+        return session
+
+    def save(self, session):
+        """Save ``session``. With write-behind, only the caches are updated now and the
+        database is written after the current request; new sessions and saves made
+        outside of a request are always written immediately.
+        """
+        if isinstance(session, LocalProxy):
+            # The proxy can't be resolved once the request is over
+            session = session._get_current_object()
+        if not (self.write_behind and session.pk and _in_request()):
+            session.save()
+            return
+        self.cache(session)
+        batch = get_session_batch()
+        batch.add(session)
+        enqueue_postcommit_task(flush_sessions, (batch, ), {}, celery=False, once_per_request=True)
+
+    def flush(self, batch):
+        batch.sent = True
+        now = timezone.now()
+        for session in batch.sessions.values():
+            # update() skips the post_save receiver, which would evict the session we just cached
+            self.model.objects.filter(pk=session.pk).update(data=session.data, date_modified=now)
+            session.date_modified = now
+            self.cache(session)
+        self.stats['writes_behind'] += len(batch.sessions)
+
+
+def flush_sessions(batch):
+    get_session_store().flush(batch)
+
+
+class LastLoginBuffer(object):
+    """Users seen by ``before_request`` whose ``date_last_login`` needs updating."""
+
+    def __init__(self, interval, throttle):
+        self.interval = interval
+        self.throttle = throttle
+        self._pending = set()
+        # user id -> time it was last queued, so each process queues a user at most once per throttle period
+        self._recent = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, user_id):
+        now = time.time()
+        with self._lock:
+            if now - self._recent.get(user_id, 0) >= self.throttle:
+                self._recent[user_id] = now
+                self._pending.add(user_id)
+            due = bool(self._pending) and now - self._last_flush >= self.interval
+        if due:
+            if _in_request():
+                enqueue_postcommit_task(flush_last_logins, (), {}, celery=False, once_per_request=True)
+            else:
+                self.flush()
+
+    def flush(self):
+        now = time.time()
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._last_flush = now
+            self._recent = {
+                user_id: seen for user_id, seen in self._recent.items()
+                if now - seen < self.throttle
+            }
+        if not pending:
+            return 0
+        OSFUser = apps.get_model('osf.OSFUser')
+        try:
+            return (
+                OSFUser.objects
+                .filter(guids___id__isnull=False, guids___id__in=pending)
+                # Another process may have updated them already
+                .filter(Q(date_last_login__isnull=True) | Q(date_last_login__lt=timezone.now() - dt.timedelta(seconds=self.throttle)))
+            ).update(date_last_login=timezone.now())
+        except Exception:
+            # These users are in _recent and won't be queued again for a while; retry them next flush
+            with self._lock:
+                self._pending |= pending
+            raise
+
+
+def flush_last_logins():
+    get_last_login_buffer().flush()
+
+
+def _flush_last_logins_at_exit():
+    try:
+        flush_last_logins()
+    except Exception as err:
+        logger.exception(err)
+
+
+def _flush_last_logins_periodically(buffer):
+    while True:
+        time.sleep(buffer.interval)
+        try:
+            if time.time() - buffer._last_flush >= buffer.interval:
+                buffer.flush()
+        except Exception as err:
+            logger.exception(err)
+        finally:
+            # This thread's connection would otherwise stay open between flushes
+            connection.close()
+
+
+_store = None
+_last_login_buffer = None
+_last_login_buffer_pid = None
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        _store = SessionStore(
+            size=settings.SESSION_CACHE_SIZE,
+            timeout=settings.SESSION_CACHE_TIMEOUT,
+            shared_cache=caches[settings.SESSION_CACHE_BACKEND] if settings.SESSION_CACHE_BACKEND else None,
+            shared_timeout=settings.SESSION_SHARED_CACHE_TIMEOUT,
+            write_behind=settings.SESSION_WRITE_BEHIND,
+        )
+    return _store
+
+
+def get_last_login_buffer():
+    global _last_login_buffer, _last_login_buffer_pid
+    # A forked worker starts with an empty buffer; the parent writes what it had
+    if _last_login_buffer is None or _last_login_buffer_pid != os.getpid():
+        _last_login_buffer = LastLoginBuffer(
+            interval=settings.DATE_LAST_LOGIN_FLUSH_INTERVAL,
+            throttle=settings.DATE_LAST_LOGIN_THROTTLE,
+        )
+        if _last_login_buffer_pid is None:
+            atexit.register(_flush_last_logins_at_exit)
+        _last_login_buffer_pid = os.getpid()
+        if _last_login_buffer.interval:
+            flusher = threading.Thread(
+                target=_flush_last_logins_periodically, args=(_last_login_buffer, ), name='last-login-flush'
+            )
+            flusher.daemon = True
+            flusher.start()
+    return _last_login_buffer
+
+
+def record_last_login(user_id):
+    """Queue an update of ``date_last_login`` for the user with guid ``user_id``."""
+    get_last_login_buffer().add(user_id)
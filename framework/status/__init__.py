@@ -3,6 +3,7 @@
 from collections import namedtuple
 
 from framework.sessions import session
+from framework.sessions.store import get_session_store
 
 Status = namedtuple('Status', ['message', 'jumbotron', 'css_class', 'dismissible', 'trust'])  # trust=True displays msg as raw HTML
 
@@ -53,19 +54,19 @@ def push_status_message(message, kind='warning', dismissible=True, trust=True, j
                            dismissible=dismissible,
                            trust=trust))
     session.data['status'] = statuses
-    session.save()
+    get_session_store().save(session)
 
 def pop_status_messages(level=0):
     messages = session.data.get('status')
     session.status_prev = messages
     if 'status' in session.data:
         del session.data['status']
-        session.save()
+        get_session_store().save(session)
     return messages
 
 def pop_previous_status_messages(level=0):
     messages = session.data.get('status_prev')
     if 'status_prev' in session.data:
         del session.data['status_prev']
-        session.save()
+        get_session_store().save(session)
     return messages
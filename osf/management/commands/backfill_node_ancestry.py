@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Rebuild or verify the NodeAncestry closure table from NodeRelation."""
+from __future__ import unicode_literals
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from osf.models import NodeAncestry
+from scripts import utils as script_utils
+
+logger = logging.getLogger(__name__)
+
+
+def verify():
+    missing, extraneous = NodeAncestry.objects.find_inconsistencies()
+    if missing or extraneous:
+        logger.error('NodeAncestry is inconsistent: {} missing rows, {} extraneous rows.'.format(missing, extraneous))
+    else:
+        logger.info('NodeAncestry is consistent with NodeRelation.')
+    return missing, extraneous
+
+
+class Command(BaseCommand):
+    """
+    Backfill (or verify) the ancestor/descendant closure table used by
+    AbstractNode.get_root, parents, is_admin_parent and get_children.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Run backfill and roll back changes to db',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            dest='verify',
+            help='Only compare the closure table against NodeRelation, do not modify it',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if options.get('verify', False):
+            missing, extraneous = verify()
+            if missing or extraneous:
+                raise RuntimeError('NodeAncestry verification failed.')
+            return
+        if not dry_run:
+            script_utils.add_file_logger(logger, __file__)
+        with transaction.atomic():
+            inserted = NodeAncestry.objects.rebuild()
+            logger.info('Inserted {} NodeAncestry rows.'.format(inserted))
+            verify()
+            if dry_run:
+                raise RuntimeError('Dry run, transaction rolled back.')
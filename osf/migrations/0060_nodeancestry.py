@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-09-20 14:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0059_merge_20170914_1100'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeAncestry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='_descendant_paths', to='osf.AbstractNode')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='_ancestor_paths', to='osf.AbstractNode')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='nodeancestry',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='nodeancestry',
+            index_together=set([('descendant', 'depth'), ('ancestor', 'depth')]),
+        ),
+        # Populate from the component relations, as `manage.py backfill_node_ancestry` does.
+        # get_root, parents, is_admin_parent and get_children read the table from now on.
+        migrations.RunSQL(
+            """
+            WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+                SELECT parent_id, child_id, 1
+                FROM osf_noderelation
+                WHERE is_node_link IS FALSE
+            UNION ALL
+                SELECT R.parent_id, C.descendant_id, C.depth + 1
+                FROM closure AS C
+                    JOIN osf_noderelation AS R ON R.child_id = C.ancestor_id
+                WHERE R.is_node_link IS FALSE
+            )
+            INSERT INTO osf_nodeancestry (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM closure
+            GROUP BY ancestor_id, descendant_id;
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0060_nodeancestry'),
+    ]
+
+    operations = [
+        # OsfStorage used to store an empty materialized path and compute it on
+        # every read. Store it for every active file and folder.
+        migrations.RunSQL(
+            [
+                """
+                WITH RECURSIVE materialized_paths(id, gen_path) AS (
+                  SELECT
+                    T.id,
+                    T.name :: TEXT AS gen_path
+                  FROM osf_basefilenode AS T
+                  WHERE T.parent_id IS NULL
+                    AND T.provider = 'osfstorage'
+                  UNION ALL
+                  SELECT
+                    T.id,
+                    (R.gen_path || '/' || T.name) AS gen_path
+                  FROM materialized_paths AS R
+                    JOIN osf_basefilenode AS T ON T.parent_id = R.id
+                )
+                UPDATE osf_basefilenode AS F
+                SET _materialized_path = CASE
+                  WHEN F.type = 'osf.osfstoragefile' THEN P.gen_path
+                  ELSE P.gen_path || '/'
+                END
+                FROM materialized_paths AS P
+                WHERE F.id = P.id
+                  AND F.type IN ('osf.osfstoragefilenode', 'osf.osfstoragefile', 'osf.osfstoragefolder');
+                """
+            ], [
+                """
+                UPDATE osf_basefilenode SET _materialized_path = ''
+                WHERE type IN ('osf.osfstoragefilenode', 'osf.osfstoragefile', 'osf.osfstoragefolder');
+                """
+            ]
+        ),
+        migrations.RunSQL(
+            [
+                """
+                CREATE INDEX basefilenode_node_provider_materialized_path
+                ON osf_basefilenode (node_id, provider, _materialized_path text_pattern_ops);
+                """
+            ], [
+                """
+                DROP INDEX IF EXISTS basefilenode_node_provider_materialized_path RESTRICT;
+                """
+            ]
+        ),
+    ]
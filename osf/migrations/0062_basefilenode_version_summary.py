@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import osf.utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0061_basefilenode_materialized_path_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basefilenode',
+            name='latest_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='osf.FileVersion'),
+        ),
+        migrations.AddField(
+            model_name='basefilenode',
+            name='version_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basefilenode',
+            name='first_version_date',
+            field=osf.utils.fields.NonNaiveDateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='basefilenode',
+            name='download_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            [
+                """
+                UPDATE osf_basefilenode AS F
+                SET latest_version_id = S.latest_version_id
+                  , version_count = S.version_count
+                  , first_version_date = S.first_version_date
+                FROM (
+                  SELECT
+                    BV.basefilenode_id
+                    , COUNT(*) AS version_count
+                    , MIN(V.date_created) AS first_version_date
+                    , (array_agg(V.id ORDER BY V.date_created DESC))[1] AS latest_version_id
+                  FROM osf_basefilenode_versions AS BV
+                    JOIN osf_fileversion AS V ON V.id = BV.fileversion_id
+                  GROUP BY BV.basefilenode_id
+                ) AS S
+                WHERE F.id = S.basefilenode_id;
+                """,
+                """
+                UPDATE osf_basefilenode AS F
+                SET download_count = P.total
+                FROM osf_guid AS G, osf_pagecounter AS P
+                WHERE G.object_id = F.node_id
+                  AND G.content_type_id = (SELECT id FROM django_content_type WHERE app_label = 'osf' AND model = 'abstractnode')
+                  AND P._id = 'download:' || G._id || ':' || F._id
+                  AND F.provider = 'osfstorage';
+                """
+            ],
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0062_basefilenode_version_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPageCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('unique', models.PositiveIntegerField(default=0)),
+                ('counter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='osf.PageCounter')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyUserActivityCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('counter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='osf.UserActivityCounter')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailypagecount',
+            unique_together=set([('counter', 'date')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyuseractivitycount',
+            unique_together=set([('counter', 'action', 'date')]),
+        ),
+        # Copy the per-day counts out of the JSON blobs, which are no longer written.
+        # The blobs are left in place until this has been verified in production.
+        migrations.RunSQL(
+            [
+                """
+                INSERT INTO osf_dailypagecount (counter_id, date, total, "unique")
+                SELECT
+                  P.id
+                  , to_date(D.key, 'YYYY/MM/DD')
+                  , COALESCE((D.value ->> 'total') :: INTEGER, 0)
+                  , COALESCE((D.value ->> 'unique') :: INTEGER, 0)
+                FROM osf_pagecounter AS P, jsonb_each(P.date) AS D;
+                """,
+                """
+                INSERT INTO osf_dailyuseractivitycount (counter_id, action, date, total)
+                SELECT
+                  U.id
+                  , A.key
+                  , to_date(D.key, 'YYYY/MM/DD')
+                  , D.value :: TEXT :: INTEGER
+                FROM osf_useractivitycounter AS U, jsonb_each(U.action) AS A, jsonb_each(A.value -> 'date') AS D;
+                """,
+            ],
+            migrations.RunSQL.noop
+        ),
+    ]
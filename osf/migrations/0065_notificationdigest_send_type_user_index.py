@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0064_comment_unread_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='notificationdigest',
+            index_together=set([('send_type', 'user')]),
+        ),
+    ]
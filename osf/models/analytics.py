@@ -1,63 +1,102 @@
 import logging
 
 from dateutil import parser
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.utils import timezone
 
+from framework.analytics.buffer import get_counter_buffer
 from framework.sessions import session
+from framework.sessions.store import get_session_store
 from osf.models.base import BaseModel
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 
 logger = logging.getLogger(__name__)
 
 
+def upsert_counts(table, key_columns, count_columns, rows, extra_columns=None, returning=None):
+    """Insert ``rows`` of key values followed by counts into ``table``, adding the
+    counts to those of any existing row with the same key. Rows are written in key
+    order so that concurrent flushes lock them in the same order.
+    """
+    if not rows:
+        return []
+    extra_columns = extra_columns or {}
+    columns = list(key_columns) + list(count_columns) + list(extra_columns)
+    row_sql = '({})'.format(', '.join(['%s'] * (len(key_columns) + len(count_columns)) + list(extra_columns.values())))
+    sql = 'INSERT INTO {table} ({columns}) VALUES {rows} ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+        table=table,
+        columns=', '.join('"{}"'.format(column) for column in columns),
+        rows=', '.join([row_sql] * len(rows)),
+        keys=', '.join('"{}"'.format(column) for column in key_columns),
+        updates=', '.join('"{0}" = {1}."{0}" + EXCLUDED."{0}"'.format(column, table) for column in count_columns),
+    )
+    if returning:
+        sql += ' RETURNING {}'.format(', '.join('"{}"'.format(column) for column in returning))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in sorted(rows) for value in row])
+        if returning:
+            return cursor.fetchall()
+
+
 class UserActivityCounter(BaseModel):
     primary_identifier_name = '_id'
 
     _id = models.CharField(max_length=5, null=False, blank=False, db_index=True,
                            unique=True)  # 5 in prod
+    # No longer written; superseded by DailyUserActivityCount
     action = DateTimeAwareJSONField(default=dict)
     date = DateTimeAwareJSONField(default=dict)
     total = models.PositiveIntegerField(default=0)
 
     @classmethod
     def get_total_activity_count(cls, user_id):
+        pending = get_counter_buffer().pending_user_activity(user_id)
         try:
-            return cls.objects.get(_id=user_id).total
+            return cls.objects.get(_id=user_id).total + pending
         except cls.DoesNotExist:
-            return 0
+            return pending
 
     @classmethod
     def increment(cls, user_id, action, date_string):
-        date = parser.parse(date_string).strftime('%Y/%m/%d')
-        with transaction.atomic():
-            # select_for_update locks the row but only inside a transaction
-            uac, created = cls.objects.select_for_update().get_or_create(_id=user_id)
-            if uac.total > 0:
-                uac.total += 1
-            else:
-                uac.total = 1
-            if action in uac.action:
-                uac.action[action]['total'] += 1
-                if date in uac.action[action]['date']:
-                    uac.action[action]['date'][date] += 1
-                else:
-                    uac.action[action]['date'][date] = 1
-            else:
-                uac.action[action] = dict(total=1, date={date: 1})
-            if date in uac.date:
-                uac.date[date]['total'] += 1
-            else:
-                uac.date[date] = dict(total=1)
-            uac.save()
+        get_counter_buffer().add_user_activity(user_id, action, parser.parse(date_string).date())
         return True
 
+    @classmethod
+    def add_counts(cls, totals, days):
+        """Add buffered increments to the counters; see ``framework.analytics.buffer``.
+
+        :param dict totals: user id -> number of actions
+        :param dict days: (user id, action, date) -> number of actions
+        """
+        counter_ids = dict(upsert_counts(
+            cls._meta.db_table, ['_id'], ['total'],
+            [(user_id, total) for user_id, total in totals.items()],
+            extra_columns={'action': "'{}'::jsonb", 'date': "'{}'::jsonb"},
+            returning=['_id', 'id'],
+        ))
+        upsert_counts(
+            DailyUserActivityCount._meta.db_table, ['counter_id', 'action', 'date'], ['total'],
+            [(counter_ids[user_id], action, date, total) for (user_id, action, date), total in days.items()],
+        )
+
+
+class DailyUserActivityCount(BaseModel):
+    """Number of times a user performed an action on one day."""
+    counter = models.ForeignKey(UserActivityCounter, related_name='days', on_delete=models.CASCADE)
+    action = models.CharField(max_length=255)
+    date = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('counter', 'action', 'date')
+
 
 class PageCounter(BaseModel):
     primary_identifier_name = '_id'
 
     _id = models.CharField(max_length=300, null=False, blank=False, db_index=True,
                            unique=True)  # 272 in prod
+    # No longer written; superseded by DailyPageCount
     date = DateTimeAwareJSONField(default=dict)
 
     total = models.PositiveIntegerField(default=0)
@@ -78,75 +117,72 @@ class PageCounter(BaseModel):
         date_string = date.strftime('%Y/%m/%d')
         visited_by_date = session.data.get('visited_by_date', {'date': date_string, 'pages': []})
 
-        with transaction.atomic():
-            model_instance, created = cls.objects.select_for_update().get_or_create(_id=cleaned_page)
+        # if they haven't visited something today, start a new list of today's visits
+        if date_string != visited_by_date['date']:
+            visited_by_date['date'] = date_string
+            visited_by_date['pages'] = []
+        # if they haven't visited this page today, they are a new unique visitor for today
+        day_unique = int(cleaned_page not in visited_by_date['pages'])
 
-            # if they visited something today
-            if date_string == visited_by_date['date']:
-                # if they haven't visited this page today
-                if cleaned_page not in visited_by_date['pages']:
-                    # if the model_instance has today in it
-                    if date_string in model_instance.date.keys():
-                        # increment the number of unique visitors for today
-                        model_instance.date[date_string]['unique'] += 1
-                    else:
-                        # set the number of unique visitors for today to 1
-                        model_instance.date[date_string] = dict(unique=1)
-            # if they haven't visited something today
-            else:
-                # set their visited by date to blank
-                visited_by_date['date'] = date_string
-                visited_by_date['pages'] = []
-                # if the model_instance has today in it
-                if date_string in model_instance.date.keys():
-                    # increment the number of unique visitors for today
-                    model_instance.date[date_string]['unique'] += 1
-                else:
-                    # set the number of unique visitors to 1
-                    model_instance.date[date_string] = dict(unique=1)
-
-            # update their sessions
+        # update their sessions
+        if day_unique:
             visited_by_date['pages'].append(cleaned_page)
-            session.data['visited_by_date'] = visited_by_date
-
-            if date_string in model_instance.date.keys():
-                if 'total' not in model_instance.date[date_string].keys():
-                    model_instance.date[date_string].update(total=0)
-                model_instance.date[date_string]['total'] += 1
-            else:
-                model_instance.date[date_string] = dict(total=1)
-
-            # if a download counter is being updated, only perform the update
-            # if the user who is downloading isn't a contributor to the project
-            page_type = cleaned_page.split(':')[0]
-            if page_type == 'download' and node_info:
-                if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
-                    model_instance.save()
-                    return
-
-            if page_type == 'view' and node_info:
-                if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
-                    model_instance.save()
-                    return
-
+        session.data['visited_by_date'] = visited_by_date
+
+        total = unique = 0
+        # if a download or view counter is being updated, only count it
+        # if the user who is downloading isn't a contributor to the project
+        page_type = cleaned_page.split(':')[0]
+        is_contributor = page_type in ('download', 'view') and node_info and node_info['contributors'].filter(
+            guids___id__isnull=False, guids___id=session.data.get('auth_user_id')
+        ).exists()
+        if not is_contributor:
             visited = session.data.get('visited', [])
             if page not in visited:
-                model_instance.unique += 1
+                unique = 1
                 visited.append(page)
                 session.data['visited'] = visited
 
-            session.save()
-            model_instance.total += 1
+            get_session_store().save(session)
+            total = 1
 
-            model_instance.save()
+        get_counter_buffer().add_page_view(
+            cleaned_page, date.date(),
+            total=total, unique=unique, day_total=1, day_unique=day_unique,
+        )
+
+    @classmethod
+    def add_counts(cls, totals, days):
+        """Add buffered increments to the counters; see ``framework.analytics.buffer``.
+        Returns a dict of page -> new total.
+
+        :param dict totals: page -> [total, unique]
+        :param dict days: (page, date) -> [total, unique]
+        """
+        rows = upsert_counts(
+            cls._meta.db_table, ['_id'], ['total', 'unique'],
+            [(page, total, unique) for page, (total, unique) in totals.items()],
+            extra_columns={'date': "'{}'::jsonb"},
+            returning=['_id', 'id', 'total'],
+        )
+        counter_ids = {page: counter_id for page, counter_id, total in rows}
+        upsert_counts(
+            DailyPageCount._meta.db_table, ['counter_id', 'date'], ['total', 'unique'],
+            [(counter_ids[page], date, total, unique) for (page, date), (total, unique) in days.items()],
+        )
+        return {page: total for page, counter_id, total in rows}
 
     @classmethod
     def get_basic_counters(cls, page):
+        cleaned_page = cls.clean_page(page)
+        pending = get_counter_buffer().pending_page_counts(cleaned_page)
         try:
-            counter = cls.objects.get(_id=cls.clean_page(page))
-            return (counter.unique, counter.total)
+            counter = cls.objects.get(_id=cleaned_page)
         except cls.DoesNotExist:
-            return (None, None)
+            return pending or (None, None)
+        if pending:
+            return (counter.unique + pending[0], counter.total + pending[1])
+        return (counter.unique, counter.total)
 
     @classmethod
     def set_basic_counters(cls, page, count, date=None):
@@ -154,10 +190,20 @@ class PageCounter(BaseModel):
 
         if not date:
             date = timezone.now()
-        date_string = date.strftime('%Y/%m/%d')
 
         with transaction.atomic():
             model_instance, created = cls.objects.select_for_update().get_or_create(_id=cleaned_page)
-            model_instance.date[date_string] = dict(total=count)
             model_instance.total = count
             model_instance.save()
+            DailyPageCount.objects.update_or_create(counter=model_instance, date=date.date(), defaults={'total': count})
+
+
+class DailyPageCount(BaseModel):
+    """Visits to a page on one day."""
+    counter = models.ForeignKey(PageCounter, related_name='days', on_delete=models.CASCADE)
+    date = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+    unique = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('counter', 'date')
@@ -39,6 +39,19 @@ def generate_guid(length=5):
                 return guid_id
 
 
+def generate_guids(count, length=5):
+    """Return ``count`` distinct unused guids, checking each round of candidates
+    against the blacklist and the database in bulk rather than one at a time.
+    """
+    guids = set()
+    while len(guids) < count:
+        candidates = {''.join(random.sample(ALPHABET, length)) for _ in range(count - len(guids))} - guids
+        candidates -= set(BlackListGuid.objects.filter(guid__in=candidates).values_list('guid', flat=True))
+        candidates -= set(Guid.objects.filter(_id__in=candidates).values_list('_id', flat=True))
+        guids |= candidates
+    return list(guids)
+
+
 def generate_object_id():
     return str(bson.ObjectId())
 
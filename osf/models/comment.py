@@ -1,7 +1,10 @@
 
+import uuid
+
 import pytz
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from osf.models import Node
 from osf.models import NodeLog
@@ -17,6 +20,12 @@ from website.util import api_v2_url
 from website.project import signals as project_signals
 from website.project.model import get_valid_mentioned_users_guids
 
+UNREAD_CACHE_PREFIX = 'osf:unread-comments:'
+
+
+def _unread_stamp_key(kind, _id):
+    return '{}{}-version:{}'.format(UNREAD_CACHE_PREFIX, kind, _id)
+
 
 class Comment(GuidMixin, SpamMixin, CommentableMixin, BaseModel):
     __guid_min_length__ = 12
@@ -52,6 +61,12 @@ class Comment(GuidMixin, SpamMixin, CommentableMixin, BaseModel):
     # The mentioned users
     ever_mentioned = models.ManyToManyField(blank=True, related_name='mentioned_in', to='OSFUser')
 
+    class Meta:
+        # Unread counts select a page's comments modified after the user's last view
+        index_together = (
+            ('root_target', 'node', 'is_deleted', 'date_modified'),
+        )
+
     @property
     def url(self):
         return '/{}/'.format(self._id)
@@ -112,26 +127,113 @@ class Comment(GuidMixin, SpamMixin, CommentableMixin, BaseModel):
 
     @classmethod
     def find_n_unread(cls, user, node, page, root_id=None):
-        if node.is_contributor(user):
+        target = (node, page, root_id)
+        return cls.find_n_unread_bulk(user, [target])[target]
+
+    @classmethod
+    def find_n_unread_bulk(cls, user, targets):
+        """Count the comments ``user`` has not seen yet on many pages with one query.
+
+        :param OSFUser user: The viewing user
+        :param targets: ``(node, page, root_id)`` tuples; ``root_id`` is the guid of the
+            file or wiki page and is ignored for the node overview page
+        :returns: dict mapping each target to its unread count
+        """
+        from osf.models import Contributor
+
+        targets = list(targets)
+        counts = dict.fromkeys(targets, 0)
+        root_ids = {}
+        for node, page, root_id in targets:
             if page == Comment.OVERVIEW:
-                view_timestamp = user.get_node_comment_timestamps(target_id=node._id)
-                root_target = Guid.load(node._id)
+                root_ids[(node, page, root_id)] = node._id
             elif page == Comment.FILES or page == Comment.WIKI:
-                view_timestamp = user.get_node_comment_timestamps(target_id=root_id)
-                root_target = Guid.load(root_id)
+                root_ids[(node, page, root_id)] = root_id
             else:
                 raise ValueError('Invalid page')
-
+        if user is None or user.is_anonymous or not targets:
+            return counts
+
+        contributed = set(Contributor.objects.filter(
+            user=user, node_id__in={node.pk for node, _, _ in targets}
+        ).values_list('node_id', flat=True))
+        targets = [target for target in targets if target[0].pk in contributed]
+
+        cache_keys = cls._get_unread_cache_keys(user, {target: root_ids[target] for target in targets})
+        cached = cache.get_many(cache_keys.values()) if cache_keys else {}
+        for target, key in cache_keys.items():
+            if key in cached:
+                counts[target] = cached[key]
+        targets = [target for target in targets if cache_keys.get(target) not in cached]
+        if not targets:
+            return counts
+
+        guids = dict(Guid.objects.filter(
+            _id__in={root_ids[target] for target in targets}
+        ).values_list('_id', 'id'))
+        query = Q()
+        for target in targets:
+            view_timestamp = user.get_node_comment_timestamps(target_id=root_ids[target])
             if not view_timestamp.tzinfo:
                 view_timestamp = view_timestamp.replace(tzinfo=pytz.utc)
+            query |= (
+                Q(node_id=target[0].pk) & Q(root_target_id=guids.get(root_ids[target])) &
+                (Q(date_created__gt=view_timestamp) | Q(date_modified__gt=view_timestamp))
+            )
+
+        found = {
+            (row['node_id'], row['root_target_id']): row['n_unread']
+            for row in cls.objects.filter(
+                query & ~Q(user=user) & Q(is_deleted=False)
+            ).values('node_id', 'root_target_id').annotate(n_unread=Count('id')).order_by()
+        }
+        for target in targets:
+            counts[target] = found.get((target[0].pk, guids.get(root_ids[target])), 0)
+        if cache_keys:
+            cache.set_many(
+                {cache_keys[target]: counts[target] for target in targets},
+                settings.UNREAD_COMMENTS_CACHE_TIMEOUT
+            )
+        return counts
 
-            return cls.objects.filter(
-                Q(node=node) & ~Q(user=user) & Q(is_deleted=False) &
-                (Q(date_created__gt=view_timestamp) | Q(date_modified__gt=view_timestamp)) &
-                Q(root_target=root_target)
-            ).count()
+    @classmethod
+    def _get_unread_cache_keys(cls, user, root_ids):
+        """Cache keys of the unread counts of ``user`` on the targets in ``root_ids``.
+        Every key includes the version stamps of the user and of the root target, so
+        ``invalidate_unread_counts`` can invalidate them without knowing the keys.
+        """
+        if not settings.UNREAD_COMMENTS_CACHE_TIMEOUT or not root_ids:
+            return {}
+        stamp_keys = [_unread_stamp_key('user', user._id)] + [_unread_stamp_key('root', root_id) for root_id in set(root_ids.values())]
+        stamps = cache.get_many(stamp_keys)
+        return {
+            target: '{}{}:{}:{}:{}:{}'.format(
+                UNREAD_CACHE_PREFIX, user._id, target[0]._id, root_id,
+                stamps.get(_unread_stamp_key('user', user._id)),
+                stamps.get(_unread_stamp_key('root', root_id)),
+            )
+            for target, root_id in root_ids.items()
+        }
 
-        return 0
+    @classmethod
+    def invalidate_unread_counts(cls, user=None, root_ids=()):
+        """Invalidate the cached unread counts of ``user`` and those of every user on
+        the pages in ``root_ids``.
+        """
+        timeout = settings.UNREAD_COMMENTS_CACHE_TIMEOUT
+        if not timeout:
+            return
+        stamp_keys = [_unread_stamp_key('root', root_id) for root_id in root_ids]
+        if user is not None:
+            stamp_keys.append(_unread_stamp_key('user', user._id))
+        # Stamps must outlive the entries created before them, or those would become visible again
+        cache.set_many({key: uuid.uuid4().hex for key in stamp_keys}, timeout * 2)
+
+    def save(self, *args, **kwargs):
+        ret = super(Comment, self).save(*args, **kwargs)
+        if self.root_target_id and settings.UNREAD_COMMENTS_CACHE_TIMEOUT:
+            self.invalidate_unread_counts(root_ids=[self.root_target._id])
+        return ret
 
     @classmethod
     def create(cls, auth, **kwargs):
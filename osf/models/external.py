@@ -5,18 +5,22 @@ import httplib as http
 import logging
 
 from django.contrib.postgres.fields import ArrayField
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 from flask import request
 from oauthlib.oauth2 import (AccessDeniedError, InvalidGrantError,
     TokenExpiredError, MissingTokenError)
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError as RequestsHTTPError
 from requests_oauthlib import OAuth1Session, OAuth2Session
 
+from framework.celery_tasks.handlers import enqueue_task
 from framework.exceptions import HTTPError, PermissionsError
 from framework.sessions import session
 from osf.models import base
 from osf.utils.fields import EncryptedTextField, NonNaiveDateTimeField
+from website import settings
 from website.oauth.utils import PROVIDER_LOOKUP
 from website.security import random_string
 from website.util import web_url_for
@@ -28,6 +32,13 @@ OAUTH2 = 2
 
 generate_client_secret = functools.partial(random_string, length=40)
 
+# Set while a queued refresh of the account's oauth_key is pending
+REFRESH_AHEAD_LOCK_KEY = 'osf:oauth-refresh:{}'
+REFRESH_AHEAD_LOCK_TIMEOUT = 60
+
+# provider short name -> HTTPAdapter whose connections that provider's token refreshes share
+_refresh_adapters = {}
+
 class ExternalAccount(base.ObjectIDMixin, base.BaseModel):
     """An account on an external service.
 
@@ -365,7 +376,7 @@ class ExternalProvider(object):
         pass
 
     def refresh_oauth_key(self, force=False, extra={}, resp_auth_token_key='access_token',
-                          resp_refresh_token_key='refresh_token', resp_expiry_fn=None):
+                          resp_refresh_token_key='refresh_token', resp_expiry_fn=None, save=True):
         """Handles the refreshing of an oauth_key for account associated with this provider.
            Not all addons need to use this, as some do not have oauth_keys that expire.
 
@@ -380,6 +391,9 @@ class ExternalProvider(object):
         kwarg `resp_expiry_fn` allows subclasses to specify a function that will return the
         datetime-formatted oauth_key expiry key, given a successful refresh response from
         `auto_refresh_url`. A default using 'expires_at' as a key is provided.
+
+        With `save=False` the new tokens are set on the account but not saved, for callers
+        that save many accounts at once.
         """
         # Ensure this is an authenticated Provider that uses token refreshing
         if not (self.account and self.auto_refresh_url):
@@ -409,6 +423,7 @@ class ExternalProvider(object):
                 'expires_in': '-30',
             }
         )
+        client.mount('https://', self._refresh_adapter())
 
         extra.update({
             'client_id': self.client_id,
@@ -430,9 +445,44 @@ class ExternalProvider(object):
         self.account.refresh_token = token[resp_refresh_token_key]
         self.account.expires_at = resp_expiry_fn(token)
         self.account.date_last_refreshed = timezone.now()
-        self.account.save()
+        if save:
+            self.account.save()
         return True
 
+    def _refresh_adapter(self):
+        """The HTTPAdapter shared by the token refreshes of this provider, so that
+        they reuse connections to `auto_refresh_url` instead of opening one each.
+        """
+        adapter = _refresh_adapters.get(self.short_name)
+        if adapter is None:
+            adapter = _refresh_adapters.setdefault(
+                self.short_name,
+                HTTPAdapter(pool_maxsize=max(settings.OAUTH_REFRESH_CONCURRENCY, 1))
+            )
+        return adapter
+
+    def refresh_oauth_key_ahead(self):
+        """Keep the oauth_key fresh without making the caller wait on the provider
+        when the current key is still good, e.g. when serializing WaterButler credentials.
+
+        A key that needs a refresh but stays valid for another
+        `OAUTH_REFRESH_AHEAD_MIN_VALIDITY` seconds is left in place, and a task is
+        queued to refresh it. Only a key closer to expiry is refreshed right away.
+
+        :return bool: True if the key was refreshed right away
+        """
+        if not (self.account and self.auto_refresh_url and self._needs_refresh()):
+            return False
+        remaining = (self.account.expires_at - timezone.now()).total_seconds()
+        if remaining <= settings.OAUTH_REFRESH_AHEAD_MIN_VALIDITY:
+            return self.refresh_oauth_key()
+
+        # avoid circular imports
+        from website.oauth.tasks import refresh_external_account
+        if cache.add(REFRESH_AHEAD_LOCK_KEY.format(self.account._id), True, REFRESH_AHEAD_LOCK_TIMEOUT):
+            enqueue_task(refresh_external_account.s(self.account._id))
+        return False
+
     def _needs_refresh(self):
         """Determines whether or not an associated ExternalAccount needs
         a oauth_key.
@@ -5,9 +5,10 @@ import os
 
 import requests
 from dateutil.parser import parse as parse_date
-from django.db import models
+from django.db import connection, models
 from django.db.models import Manager
 from django.core.exceptions import ObjectDoesNotExist
+from django.dispatch import receiver
 from django.utils import timezone
 from typedmodels.models import TypedModel, TypedModelManager
 from include import IncludeManager
@@ -105,6 +106,14 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
     deleted_on = NonNaiveDateTimeField(blank=True, null=True)
     deleted_by = models.ForeignKey('osf.OSFUser', related_name='files_deleted_by', null=True, blank=True)
 
+    # Summary of ``versions`` and of the download counter, so that folder listings
+    # don't have to aggregate them per file. Only used by OsfStorage.
+    # Kept current by ``update_version_summary`` and ``set_download_counts``
+    latest_version = models.ForeignKey('FileVersion', blank=True, null=True, related_name='+', on_delete=models.SET_NULL)
+    version_count = models.PositiveIntegerField(default=0)
+    first_version_date = NonNaiveDateTimeField(blank=True, null=True)
+    download_count = models.PositiveIntegerField(default=0)
+
     objects = BaseFileNodeManager()
     active = ActiveFileNodeManager()
 
@@ -327,6 +336,39 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
 
         return count or 0
 
+    def update_version_summary(self):
+        """Recompute ``latest_version``, ``version_count`` and ``first_version_date``
+        from ``versions``. Called whenever ``versions`` changes.
+        """
+        summary = self.versions.aggregate(count=models.Count('id'), first=models.Min('date_created'))
+        self.latest_version = self.versions.order_by('-date_created').first()
+        self.version_count = summary['count']
+        self.first_version_date = summary['first']
+        BaseFileNode.objects.filter(pk=self.pk).update(
+            latest_version=self.latest_version,
+            version_count=self.version_count,
+            first_version_date=self.first_version_date,
+        )
+
+    @classmethod
+    def set_download_counts(cls, counts):
+        """Copy download counter totals onto the files' ``download_count``.
+
+        :param dict counts: file _id -> total downloads
+        """
+        if not counts:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE osf_basefilenode AS F
+                SET download_count = C.total
+                FROM (VALUES {}) AS C(_id, total)
+                WHERE F._id = C._id;
+                """.format(', '.join(['(%s, %s)'] * len(counts))),
+                [value for item in sorted(counts.items()) for value in item]
+            )
+
     def get_view_count(self, version=None):
 
         parts = ['view', self.node._id, self._id]
@@ -701,3 +743,15 @@ class FileVersion(ObjectIDMixin, BaseModel):
 
     class Meta:
         ordering = ('-date_created',)
+
+
+##### Signal listeners #####
+@receiver(models.signals.m2m_changed, sender=BaseFileNode.versions.through)
+def update_version_summaries(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.update_version_summary()
+    elif pk_set:
+        for file_node in BaseFileNode.objects.filter(id__in=pk_set):
+            file_node.update_version_summary()
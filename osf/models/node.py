@@ -12,17 +12,16 @@ from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.db import models, transaction, connection
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.functional import cached_property
 from keen import scoped_keys
-from psycopg2._psycopg import AsIs
 from typedmodels.models import TypedModel, TypedModelManager
 from include import IncludeManager
 
 from framework import status
-from framework.celery_tasks.handlers import enqueue_task
+from framework.celery_tasks.handlers import enqueue_batched_task, enqueue_task
 from framework.exceptions import PermissionsError
 from framework.sentry import log_exception
 from addons.wiki.utils import to_mongo_key
@@ -33,7 +32,7 @@ from osf.models.identifiers import Identifier, IdentifierMixin
 from osf.models.licenses import NodeLicenseRecord
 from osf.models.mixins import (AddonModelMixin, CommentableMixin, Loggable,
                                NodeLinkMixin, Taggable)
-from osf.models.node_relation import NodeRelation
+from osf.models.node_relation import NodeAncestry, NodeRelation
 from osf.models.nodelog import NodeLog
 from osf.models.sanctions import RegistrationApproval
 from osf.models.private_link import PrivateLink
@@ -44,6 +43,9 @@ from osf.models.validators import validate_doi, validate_title
 from osf.utils.auth import Auth, get_user
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
+from osf.utils.forks import NodeForker
+from osf.utils.permission_resolver import clear_permission_resolvers, get_permission_resolver
+from osf.utils.registrations import NodeRegistrar
 from osf.utils.requests import DummyRequest, get_request_and_user_id
 from website import language, settings
 from website.citations.utils import datetime_to_csl
@@ -74,47 +76,17 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
 
     def get_children(self, root, active=False):
         # If `root` is a root node, we can use the 'descendants' related name
-        # rather than doing a recursive query
+        # rather than joining against the ancestry closure table
         if root.id == root.root_id:
             query = root.descendants.exclude(id=root.id)
             if active:
                 query = query.filter(is_deleted=False)
             return query
         else:
-            sql = """
-                WITH RECURSIVE descendants AS (
-                SELECT
-                    parent_id,
-                    child_id,
-                    1 AS LEVEL
-                FROM %s
-                %s
-                WHERE is_node_link IS FALSE %s
-                UNION ALL
-                SELECT
-                    s.parent_id,
-                    d.child_id,
-                    d.level + 1
-                FROM descendants AS d
-                    JOIN %s AS s
-                    ON d.parent_id = s.child_id
-                WHERE s.is_node_link IS FALSE
-                ) SELECT array_agg(DISTINCT child_id)
-                FROM descendants
-                WHERE parent_id = %s;
-            """
-            with connection.cursor() as cursor:
-                node_relation_table = AsIs(NodeRelation._meta.db_table)
-                cursor.execute(sql, [
-                    node_relation_table,
-                    AsIs('LEFT JOIN osf_abstractnode ON {}.child_id = osf_abstractnode.id'.format(node_relation_table) if active else ''),
-                    AsIs('AND osf_abstractnode.is_deleted IS FALSE' if active else ''),
-                    node_relation_table,
-                    root.pk])
-                row = cursor.fetchone()[0]
-                if not row:
-                    return AbstractNode.objects.none()
-                return AbstractNode.objects.filter(id__in=row)
+            query = AbstractNode.objects.filter(_ancestor_paths__ancestor=root)
+            if active:
+                query = query.filter(is_deleted=False)
+            return query
 
     def can_view(self, user=None, private_link=None):
         qs = self.filter(is_public=True)
@@ -220,6 +192,14 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         'preprint_file',
     }
 
+    # Node fields that appear in the search documents of the node's files
+    FILE_SEARCH_UPDATE_FIELDS = {
+        'title',
+        'is_public',
+        'is_deleted',
+        'retraction',
+    }
+
     # Node fields that trigger a check to the spam filter on save
     SPAM_CHECK_FIELDS = {
         'title',
@@ -666,11 +646,11 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             logger.exception(e)
             log_exception()
 
-    def update_search(self):
+    def update_search(self, saved_fields=None):
         from website import search
 
         try:
-            search.search.update_node(self, bulk=False, async=True)
+            search.search.update_node(self, bulk=False, async=True, saved_fields=saved_fields)
         except search.exceptions.SearchUnavailableError as e:
             logger.exception(e)
             log_exception()
@@ -790,6 +770,9 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return self.absolute_api_v2_url
 
     def get_permissions(self, user):
+        resolver = get_permission_resolver(user)
+        if resolver:
+            return resolver.get_permissions(self)
         if hasattr(self.contributor_set.all(), '_result_cache'):
             for contrib in self.contributor_set.all():
                 if contrib.user_id == user.id:
@@ -816,6 +799,9 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         """
         if not user:
             return False
+        resolver = get_permission_resolver(user)
+        if resolver:
+            return resolver.has_permission(self, permission, check_parent=check_parent)
         query = {'node': self, permission: True}
         has_permission = user.contributor_set.filter(**query).exists()
         if not has_permission and permission == 'read' and check_parent:
@@ -834,12 +820,15 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return False
 
     def is_admin_parent(self, user):
-        if self.has_permission(user, 'admin', check_parent=False):
-            return True
-        parent = self.parent_node
-        if parent:
-            return parent.is_admin_parent(user)
-        return False
+        if not user:
+            return False
+        resolver = get_permission_resolver(user)
+        if resolver:
+            return resolver.is_admin_parent(self)
+        return user.contributor_set.filter(
+            Q(node=self) | Q(node__in=NodeAncestry.objects.filter(descendant=self).values('ancestor_id')),
+            admin=True
+        ).exists()
 
     def find_readable_descendants(self, auth):
         """ Returns a generator of first descendant node(s) readable by <user>
@@ -858,9 +847,11 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
 
     @property
     def parents(self):
-        if self.parent_node:
-            return [self.parent_node] + self.parent_node.parents
-        return []
+        """List of ancestors, nearest first."""
+        return list(
+            AbstractNode.objects.filter(_descendant_paths__descendant=self)
+            .order_by('_descendant_paths__depth')
+        )
 
     @property
     def admin_contributor_ids(self):
@@ -1546,36 +1537,10 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return self.private_links.filter(is_deleted=True).values_list('key', flat=True)
 
     def get_root(self):
-        sql = """
-            WITH RECURSIVE ascendants AS (
-              SELECT
-                parent_id,
-                child_id,
-                1 AS LEVEL
-              FROM %s
-              WHERE is_node_link IS FALSE
-              UNION ALL
-              SELECT
-                S.parent_id,
-                D.child_id,
-                D.level + 1
-              FROM ascendants AS D
-                JOIN %s AS S
-                  ON D.parent_id = S.child_id
-              WHERE S.is_node_link IS FALSE
-            ) SELECT parent_id
-              FROM ascendants
-              WHERE child_id = %s
-              ORDER BY level DESC
-              LIMIT 1;
-        """
-        with connection.cursor() as cursor:
-            node_relation_table = AsIs(NodeRelation._meta.db_table)
-            cursor.execute(sql, [node_relation_table, node_relation_table, self.pk])
-            res = cursor.fetchone()
-            if res:
-                return AbstractNode.objects.get(pk=res[0])
-            return self
+        root = (AbstractNode.objects.filter(_descendant_paths__descendant=self)
+                .order_by('-_descendant_paths__depth')
+                .first())
+        return root or self
 
     def find_readable_antecedent(self, auth):
         """ Returns first antecendant node readable by <user>.
@@ -1596,100 +1561,14 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         Contributor.objects.bulk_create(contribs)
 
     def register_node(self, schema, auth, data, parent=None):
-        """Make a frozen copy of a node.
+        """Make a frozen copy of a node and all of its components.
 
         :param schema: Schema object
         :param auth: All the auth information including user, API key.
-        :param template: Template name
         :param data: Form data
-        :param parent Node: parent registration of registration to be created
+        :param parent: Ignored; components are registered along with their parent
         """
-        # TODO(lyndsysimon): "template" param is not necessary - use schema.name?
-        # NOTE: Admins can register child nodes even if they don't have write access them
-        if not self.can_edit(auth=auth) and not self.is_admin_parent(user=auth.user):
-            raise PermissionsError(
-                'User {} does not have permission '
-                'to register this node'.format(auth.user._id)
-            )
-        if self.is_collection:
-            raise NodeStateError('Folders may not be registered')
-        original = self
-
-        # Note: Cloning a node will clone each node wiki page version and add it to
-        # `registered.wiki_pages_current` and `registered.wiki_pages_versions`.
-        if original.is_deleted:
-            raise NodeStateError('Cannot register deleted node.')
-
-        registered = original.clone()
-        registered.recast('osf.registration')
-
-        registered.registered_date = timezone.now()
-        registered.registered_user = auth.user
-        registered.registered_from = original
-        if not registered.registered_meta:
-            registered.registered_meta = {}
-        registered.registered_meta[schema._id] = data
-
-        registered.forked_from = self.forked_from
-        registered.creator = self.creator
-        registered.node_license = original.license.copy() if original.license else None
-        registered.wiki_private_uuids = {}
-
-        # Need to save here in order to set many-to-many fields
-        registered.save()
-
-        registered.registered_schema.add(schema)
-        registered.copy_contributors_from(self)
-        registered.tags.add(*self.all_tags.values_list('pk', flat=True))
-        registered.affiliated_institutions.add(*self.affiliated_institutions.values_list('pk', flat=True))
-
-        # Clone each log from the original node for this registration.
-        logs = original.logs.all()
-        for log in logs:
-            log.clone_node_log(registered._id)
-
-        registered.is_public = False
-        for node in registered.get_descendants_recursive():
-            node.is_public = False
-            node.save()
-
-        if parent:
-            node_relation = NodeRelation.objects.get(parent=parent.registered_from, child=original)
-            NodeRelation.objects.get_or_create(_order=node_relation._order, parent=parent, child=registered)
-
-        # After register callback
-        for addon in original.get_addons():
-            _, message = addon.after_register(original, registered, auth.user)
-            if message:
-                status.push_status_message(message, kind='info', trust=False)
-
-        for node_relation in original.node_relations.filter(child__is_deleted=False):
-            node_contained = node_relation.child
-            # Register child nodes
-            if not node_relation.is_node_link:
-                registered_child = node_contained.register_node(  # noqa
-                    schema=schema,
-                    auth=auth,
-                    data=data,
-                    parent=registered,
-                )
-            else:
-                # Copy linked nodes
-                NodeRelation.objects.get_or_create(
-                    is_node_link=True,
-                    parent=registered,
-                    child=node_contained
-                )
-
-        registered.root = None  # Recompute root on save
-
-        registered.save()
-
-        if settings.ENABLE_ARCHIVER:
-            registered.refresh_from_db()
-            project_signals.after_create_registration.send(self, dst=registered, user=auth.user)
-
-        return registered
+        return NodeRegistrar(self, schema, auth, data).register()
 
     def path_above(self, auth):
         parents = self.parents
@@ -1789,122 +1668,14 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
                 return True
         return False
 
-    # TODO: Optimize me (e.g. use bulk create)
     def fork_node(self, auth, title=None):
-        """Recursively fork a node.
+        """Fork a node and the components of it that the user can read.
 
         :param Auth auth: Consolidated authorization
         :param str title: Optional text to prepend to forked title
         :return: Forked node
         """
-        Registration = apps.get_model('osf.Registration')
-        PREFIX = 'Fork of '
-        user = auth.user
-
-        # Non-contributors can't fork private nodes
-        if not (self.is_public or self.has_permission(user, 'read')):
-            raise PermissionsError('{0!r} does not have permission to fork node {1!r}'.format(user, self._id))
-
-        when = timezone.now()
-
-        original = self
-
-        if original.is_deleted:
-            raise NodeStateError('Cannot fork deleted node.')
-
-        # Note: Cloning a node will clone each node wiki page version and add it to
-        # `registered.wiki_pages_current` and `registered.wiki_pages_versions`.
-        forked = original.clone()
-        if isinstance(forked, Registration):
-            forked.recast('osf.node')
-
-        forked.is_fork = True
-        forked.forked_date = when
-        forked.forked_from = original
-        forked.creator = user
-        forked.node_license = original.license.copy() if original.license else None
-        forked.wiki_private_uuids = {}
-
-        # Forks default to private status
-        forked.is_public = False
-
-        # Need to save here in order to access m2m fields
-        forked.save()
-
-        forked.tags.add(*self.all_tags.values_list('pk', flat=True))
-        for node_relation in original.node_relations.filter(child__is_deleted=False):
-            node_contained = node_relation.child
-            # Fork child nodes
-            if not node_relation.is_node_link:
-                try:  # Catch the potential PermissionsError above
-                    forked_node = node_contained.fork_node(auth=auth, title='')
-                except PermissionsError:
-                    pass  # If this exception is thrown omit the node from the result set
-                    forked_node = None
-                if forked_node is not None:
-                    NodeRelation.objects.get_or_create(
-                        is_node_link=False,
-                        parent=forked,
-                        child=forked_node
-                    )
-                    forked_node.root = None
-                    forked_node.save()  # Recompute root on save()
-            else:
-                # Copy linked nodes
-                NodeRelation.objects.get_or_create(
-                    is_node_link=True,
-                    parent=forked,
-                    child=node_contained
-                )
-
-        if title is None:
-            forked.title = PREFIX + original.title
-        elif title == '':
-            forked.title = original.title
-        else:
-            forked.title = title
-
-        if len(forked.title) > 200:
-            forked.title = forked.title[:200]
-
-        forked.add_contributor(
-            contributor=user,
-            permissions=CREATOR_PERMISSIONS,
-            log=False,
-            save=False
-        )
-
-        forked.root = None  # Recompute root on save
-
-        forked.save()
-
-        # Need to call this after save for the notifications to be created with the _primary_key
-        project_signals.contributor_added.send(forked, contributor=user, auth=auth, email_template='false')
-
-        forked.add_log(
-            action=NodeLog.NODE_FORKED,
-            params={
-                'parent_node': original.parent_id,
-                'node': original._primary_key,
-                'registration': forked._primary_key,  # TODO: Remove this in favor of 'fork'
-                'fork': forked._primary_key,
-            },
-            auth=auth,
-            log_date=when,
-            save=False,
-        )
-
-        # Clone each log from the original node for this fork.
-        for log in original.logs.all():
-            log.clone_node_log(forked._id)
-
-        forked.refresh_from_db()
-
-        # After fork callback
-        for addon in original.get_addons():
-            addon.after_fork(original, forked, user)
-
-        return forked
+        return NodeForker(self, auth, title=title).fork()
 
     def use_as_template(self, auth, changes=None, top_level=True):
         """Create a new project, using an existing project as a template.
@@ -2251,7 +2022,6 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return ret
 
     def on_update(self, first_save, saved_fields):
-        User = apps.get_model('osf.OSFUser')
         request, user_id = get_request_and_user_id()
         request_headers = {}
         if not isinstance(request, DummyRequest):
@@ -2270,8 +2040,26 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             for preprint in PreprintService.objects.filter(node_id=self.id, is_published=True):
                 enqueue_task(on_preprint_updated.s(preprint._id))
 
-        user = User.load(user_id)
-        if user and self.check_spam(user, saved_fields, request_headers):
+        if user_id and self.should_check_spam(saved_fields):
+            # Checked after the request by node_tasks.check_nodes_spam, so Akismet never slows down the save
+            spam_fields = sorted(set(saved_fields) & (self.SPAM_CHECK_FIELDS | {'is_public'}))
+            enqueue_batched_task(node_tasks.check_nodes_spam, [self._id, user_id, spam_fields, request_headers])
+
+    def should_check_spam(self, saved_fields):
+        """Whether saving ``saved_fields`` could get the node flagged by ``check_spam``,
+        judged without any queries so that it can be decided during the save.
+        """
+        if not settings.SPAM_CHECK_ENABLED:
+            return False
+        if settings.SPAM_CHECK_PUBLIC_ONLY and not self.is_public:
+            return False
+        return bool(self.SPAM_CHECK_FIELDS.intersection(saved_fields) or (self.is_public and 'is_public' in saved_fields))
+
+    def apply_spam_check(self, user, saved_fields, request_headers):
+        """Run ``check_spam`` and store its result. Safe to repeat: flagged nodes are not
+        sent to Akismet again, and nodes confirmed as ham are left alone.
+        """
+        if self.check_spam(user, saved_fields, request_headers):
             # Specifically call the super class save method to avoid recursion into model save method.
             super(AbstractNode, self).save()
 
@@ -2950,6 +2738,15 @@ def add_default_node_addons(sender, instance, created, **kwargs):
                 instance.add_addon(addon.short_name, auth=None, log=False)
 
 
+@receiver(post_save, sender=Contributor)
+@receiver(post_delete, sender=Contributor)
+@receiver(post_save, sender=NodeRelation)
+@receiver(post_delete, sender=NodeRelation)
+def invalidate_permission_resolvers(sender, instance, **kwargs):
+    # Prefetched permissions are stale once contributors or the node tree change
+    clear_permission_resolvers()
+
+
 @receiver(post_save, sender=Collection)
 @receiver(post_save, sender=Node)
 @receiver(post_save, sender='osf.Registration')
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from .base import BaseModel, ObjectIDMixin
 
@@ -25,3 +27,133 @@ class NodeRelation(ObjectIDMixin, BaseModel):
         index_together = (
             ('is_node_link', 'child', 'parent'),
         )
+
+
+class NodeAncestryManager(models.Manager):
+
+    LINK_SQL = """
+        INSERT INTO "{table}" (ancestor_id, descendant_id, depth)
+        SELECT A.ancestor_id, D.descendant_id, A.depth + D.depth + 1
+        FROM (
+            SELECT ancestor_id, depth FROM "{table}" WHERE descendant_id = %(parent)s
+            UNION ALL SELECT %(parent)s, 0
+        ) AS A CROSS JOIN (
+            SELECT descendant_id, depth FROM "{table}" WHERE ancestor_id = %(child)s
+            UNION ALL SELECT %(child)s, 0
+        ) AS D
+        ON CONFLICT (ancestor_id, descendant_id) DO NOTHING;
+    """
+
+    UNLINK_SQL = """
+        DELETE FROM "{table}"
+        WHERE ancestor_id IN (
+            SELECT ancestor_id FROM "{table}" WHERE descendant_id = %(parent)s
+            UNION ALL SELECT %(parent)s
+        ) AND descendant_id IN (
+            SELECT descendant_id FROM "{table}" WHERE ancestor_id = %(child)s
+            UNION ALL SELECT %(child)s
+        );
+    """
+
+    CLOSURE_SQL = """
+        WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+            SELECT parent_id, child_id, 1
+            FROM "{noderelation}"
+            WHERE is_node_link IS FALSE
+        UNION ALL
+            SELECT R.parent_id, C.descendant_id, C.depth + 1
+            FROM closure AS C
+                JOIN "{noderelation}" AS R ON R.child_id = C.ancestor_id
+            WHERE R.is_node_link IS FALSE
+        )
+    """
+
+    def _execute(self, sql, params=None, **fmt):
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(table=self.model._meta.db_table, **fmt), params)
+            return cursor.rowcount
+
+    def link(self, parent_id, child_id):
+        """Add the closure rows implied by making ``child_id`` a component of ``parent_id``.
+        Every ancestor of the parent (and the parent itself) becomes an ancestor of
+        the child's subtree (and the child itself).
+        """
+        return self._execute(self.LINK_SQL, {'parent': parent_id, 'child': child_id})
+
+    def unlink(self, parent_id, child_id):
+        """Remove the closure rows implied by ``child_id`` being a component of ``parent_id``."""
+        return self._execute(self.UNLINK_SQL, {'parent': parent_id, 'child': child_id})
+
+    def rebuild(self):
+        """Truncate and recompute the whole closure table from ``NodeRelation``.
+        Returns the number of rows inserted.
+        """
+        self._execute('DELETE FROM "{table}";')
+        return self._execute(
+            self.CLOSURE_SQL + """
+            INSERT INTO "{table}" (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM closure
+            GROUP BY ancestor_id, descendant_id;
+            """,
+            noderelation=NodeRelation._meta.db_table,
+        )
+
+    def find_inconsistencies(self):
+        """Return a tuple of (missing, extraneous) counts, comparing the
+        stored closure against one freshly computed from ``NodeRelation``.
+        """
+        sql = self.CLOSURE_SQL + """
+            , expected AS (
+                SELECT ancestor_id, descendant_id, MIN(depth) AS depth FROM closure
+                GROUP BY ancestor_id, descendant_id
+            ) SELECT
+                (SELECT COUNT(*) FROM (
+                    SELECT ancestor_id, descendant_id, depth FROM expected
+                    EXCEPT SELECT ancestor_id, descendant_id, depth FROM "{table}"
+                ) AS M),
+                (SELECT COUNT(*) FROM (
+                    SELECT ancestor_id, descendant_id, depth FROM "{table}"
+                    EXCEPT SELECT ancestor_id, descendant_id, depth FROM expected
+                ) AS E);
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(table=self.model._meta.db_table, noderelation=NodeRelation._meta.db_table))
+            return cursor.fetchone()
+
+
+class NodeAncestry(BaseModel):
+    """Closure table over the component (non-node-link) ``NodeRelation`` graph.
+
+    There is one row for every (ancestor, descendant) pair, where ``depth`` is the
+    number of edges between them (1 for a direct parent). Rows are maintained
+    incrementally by the ``NodeRelation`` signal handlers below; run
+    ``python manage.py backfill_node_ancestry`` to rebuild or verify the table.
+    """
+    ancestor = models.ForeignKey('AbstractNode', related_name='_descendant_paths', on_delete=models.CASCADE)
+    descendant = models.ForeignKey('AbstractNode', related_name='_ancestor_paths', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    objects = NodeAncestryManager()
+
+    def __unicode__(self):
+        return 'ancestor={}, descendant={}, depth={}'.format(self.ancestor_id, self.descendant_id, self.depth)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        index_together = (
+            ('descendant', 'depth'),
+            ('ancestor', 'depth'),
+        )
+
+
+##### Signal listeners #####
+@receiver(post_save, sender=NodeRelation)
+def add_node_ancestry(sender, instance, created, **kwargs):
+    if created and not instance.is_node_link and not kwargs.get('raw'):
+        NodeAncestry.objects.link(instance.parent_id, instance.child_id)
+
+
+@receiver(post_delete, sender=NodeRelation)
+def remove_node_ancestry(sender, instance, **kwargs):
+    if not instance.is_node_link:
+        NodeAncestry.objects.unlink(instance.parent_id, instance.child_id)
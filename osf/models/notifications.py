@@ -89,3 +89,9 @@ class NotificationDigest(ObjectIDMixin, BaseModel):
     message = models.CharField(max_length=2048)
     # TODO: Could this be a m2m with or without an order field?
     node_lineage = ArrayField(models.CharField(max_length=5))
+
+    class Meta:
+        # Digests are sent in chunks of users per send type
+        index_together = (
+            ('send_type', 'user'),
+        )
@@ -1,3 +1,7 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
@@ -15,3 +19,14 @@ class Session(ObjectIDMixin, BaseModel):
     @property
     def is_external_first_login(self):
         return 'auth_user_external_first_login' in self.data
+
+
+##### Signal listeners #####
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+def evict_cached_session(sender, instance, **kwargs):
+    from framework.sessions.store import get_session_store
+    store = get_session_store()
+    store.evict(instance._id)
+    # Another request may cache the old row before this transaction commits
+    transaction.on_commit(lambda: store.evict(instance._id))
@@ -14,12 +14,22 @@ from website.util.akismet import AkismetClientError
 logger = logging.getLogger(__name__)
 
 
+_clients = {}
+
+
 def _get_client():
-    return akismet.AkismetClient(
-        apikey=settings.AKISMET_APIKEY,
-        website=settings.DOMAIN,
-        verify=True
-    )
+    """Return this process's AkismetClient, which verifies its key once and then
+    reuses its connections for every check.
+    """
+    key = (settings.AKISMET_APIKEY, settings.DOMAIN)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = akismet.AkismetClient(
+            apikey=settings.AKISMET_APIKEY,
+            website=settings.DOMAIN,
+            verify=True
+        )
+    return client
 
 
 def _validate_reports(value, *args, **kwargs):
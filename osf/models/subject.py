@@ -10,9 +10,19 @@ from website.util import api_v2_url
 
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.models.validators import validate_subject_hierarchy_length, validate_subject_provider_mapping, validate_subject_highlighted_count
+from osf.utils.taxonomy import get_taxonomy_tree, invalidate_taxonomy_tree
 
 class SubjectQuerySet(IncludeQuerySet):
     def include_children(self):
+        ids = set()
+        for subject_id, provider_id in self.values_list('id', 'provider_id'):
+            tree = get_taxonomy_tree(provider_id)
+            if tree is None or subject_id not in tree:
+                break
+            ids.add(subject_id)
+            ids.update(tree.descendant_ids(subject_id))
+        else:
+            return Subject.objects.filter(id__in=ids)
         # It would be more efficient to OR self with the latter two Q's,
         # but this breaks for certain querysets when relabeling aliases.
         return Subject.objects.filter(Q(id__in=self.values_list('id', flat=True)) | Q(parent__in=self) | Q(parent__parent__in=self))
@@ -45,6 +55,9 @@ class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
     @property
     def child_count(self):
         """For v1 compat."""
+        tree = get_taxonomy_tree(self.provider_id)
+        if tree is not None and self.id in tree:
+            return tree.child_count(self.id)
         return self.children.count()
 
     def get_absolute_url(self):
@@ -62,15 +75,17 @@ class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
 
     @cached_property
     def hierarchy(self):
-        if self.parent:
-            return self.parent.hierarchy + [self._id]
-        return [self._id]
+        return [subject._id for subject in self.object_hierarchy]
 
     @cached_property
     def object_hierarchy(self):
-        if self.parent:
+        if not self.parent_id:
+            return [self]
+        tree = get_taxonomy_tree(self.provider_id)
+        ancestors = tree.object_hierarchy(self.parent_id) if tree is not None else None
+        if ancestors is None:
             return self.parent.object_hierarchy + [self]
-        return [self]
+        return ancestors + [self]
 
     def save(self, *args, **kwargs):
         saved_fields = self.get_dirty_fields() or []
@@ -78,9 +93,16 @@ class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
         validate_subject_highlighted_count(self.provider, bool('highlighted' in saved_fields and self.highlighted))
         if 'text' in saved_fields and self.pk and self.preprint_services.exists():
             raise ValidationError('Cannot edit a used Subject')
-        return super(Subject, self).save()
+        old_provider_id = self.get_dirty_fields(check_relationship=True).get('provider')
+        ret = super(Subject, self).save()
+        invalidate_taxonomy_tree(self.provider_id)
+        if old_provider_id not in (None, self.provider_id):
+            invalidate_taxonomy_tree(old_provider_id)
+        return ret
 
     def delete(self, *args, **kwargs):
         if self.preprint_services.exists():
             raise ValidationError('Cannot delete a used Subject')
-        return super(Subject, self).delete()
+        ret = super(Subject, self).delete()
+        invalidate_taxonomy_tree(self.provider_id)
+        return ret
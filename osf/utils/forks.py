@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Set-based node forking; see ``osf.utils.node_copy``."""
+from __future__ import unicode_literals
+
+from django.apps import apps
+
+from framework.analytics import increment_user_activity_counters
+from framework.exceptions import PermissionsError
+from osf.utils.node_copy import NodeTreeCopier
+from website.exceptions import NodeStateError
+from website.project import signals as project_signals
+from website.util.permissions import READ
+
+TITLE_PREFIX = 'Fork of '
+MAX_TITLE_LENGTH = 200
+
+
+class NodeForker(NodeTreeCopier):
+    """Forks ``node`` together with every component of it that ``auth.user`` can read.
+    Components the user can't read are skipped along with everything below them.
+
+    :param AbstractNode node: Node to fork
+    :param Auth auth: Consolidated authorization
+    :param str title: Title of the fork. ``None`` prepends "Fork of " to the
+        original title and ``''`` keeps it unchanged.
+    """
+
+    def __init__(self, node, auth, title=None):
+        super(NodeForker, self).__init__(node, auth)
+        self.title = title
+
+    def fork(self):
+        return self.run()
+
+    def can_read(self, node):
+        return node.is_public or (self.resolver is not None and self.resolver.has_permission(node, READ))
+
+    def check(self, node):
+        if node.is_quickfiles:
+            raise NodeStateError('A QuickFilesNode may not be forked, used as a template, or registered.')
+        # Non-contributors can't fork private nodes
+        if not self.user or not self.can_read(node):
+            raise PermissionsError('{0!r} does not have permission to fork node {1!r}'.format(self.user, node._id))
+        if node.is_deleted:
+            raise NodeStateError('Cannot fork deleted node.')
+
+    def include(self, node):
+        return self.can_read(node)
+
+    def build(self, original, values):
+        Node = apps.get_model('osf.Node')
+
+        model = Node if original.is_registration else original.__class__
+        if original.pk != self.node.pk or self.title == '':
+            title = original.title
+        elif self.title is None:
+            title = TITLE_PREFIX + original.title
+        else:
+            title = self.title
+        values.update(
+            type=model._typedmodels_type,
+            title=title[:MAX_TITLE_LENGTH],
+            is_fork=True,
+            forked_date=self.when,
+            forked_from_id=original.pk,
+            creator_id=self.user.pk,
+        )
+        return model(**values)
+
+    def get_contributors(self, copy_ids):
+        Contributor = apps.get_model('osf.Contributor')
+
+        # The forking user is the only contributor to a fork
+        return [
+            Contributor(user=self.user, node_id=fork_id, visible=True, read=True, write=True, admin=True, _order=0)
+            for fork_id in copy_ids.values()
+        ]
+
+    def get_new_logs(self, copy_ids, guids):
+        NodeLog = apps.get_model('osf.NodeLog')
+
+        originals = {original.pk: original for original in self.originals}
+        logs = []
+        for original, guid in zip(self.originals, guids):
+            if original.pk in self.parents:
+                parent_guid = originals[self.parents[original.pk]]._id
+            else:
+                parent_guid = original.parent_id
+            logs.append(NodeLog(
+                action=NodeLog.NODE_FORKED,
+                params={
+                    'parent_node': parent_guid,
+                    'node': original._id,
+                    'registration': guid,  # TODO: Remove this in favor of 'fork'
+                    'fork': guid,
+                },
+                user=self.user,
+                node_id=copy_ids[original.pk],
+                original_node_id=original.pk,
+                date=self.when,
+            ))
+        return logs
+
+    def run_hooks(self):
+        """Send ``contributor_added`` and run the addon ``after_fork`` hooks for each
+        fork, children before their parents.
+        """
+        NodeLog = apps.get_model('osf.NodeLog')
+
+        for original in reversed(self.originals):
+            fork = self.copies[original.pk]
+            project_signals.contributor_added.send(fork, contributor=self.user, auth=self.auth, email_template='false')
+            if not fork.is_collection:
+                increment_user_activity_counters(self.user._primary_key, NodeLog.NODE_FORKED, self.when.isoformat())
+            for addon in original.get_addons():
+                addon.after_fork(original, fork, self.user)
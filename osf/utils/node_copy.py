@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""Bulk copies of node trees, shared by forks and registrations.
+
+Forking or registering a project used to copy it one node at a time. Every copy
+was saved several times and every log and wiki version was cloned with its own
+queries. Every save also triggered its own spam check, search update and celery
+task.
+
+``NodeTreeCopier`` copies the whole primary subtree of a node in one
+transaction instead. The copies, their guids, licenses, component relations and
+node links, ancestry rows, contributors, tags, wiki versions and logs are each
+written with a bulk insert. Logs are written in chunks of ``LOG_BATCH_SIZE``.
+The number of queries does not depend on the size of the tree. The search and
+SHARE updates for all the copies are enqueued as a single task. Addon hooks and
+signals still run once per copy, after the copy is complete.
+
+Subclasses decide which nodes are copied and what the copies look like; see
+``osf.utils.forks`` and ``osf.utils.registrations``.
+"""
+from __future__ import unicode_literals
+
+import collections
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from framework.celery_tasks.handlers import enqueue_task
+from osf.models.base import generate_guids
+from osf.utils.permission_resolver import PermissionResolver, clear_permission_resolvers
+from osf.utils.requests import DummyRequest, get_request_and_user_id
+from website.project import tasks as node_tasks
+from website.util import get_headers_from_request
+
+LOG_BATCH_SIZE = 1000
+
+
+class NodeTreeCopier(object):
+    """Copies ``node`` and the components of it picked by ``include``.
+
+    :param AbstractNode node: Node to copy
+    :param Auth auth: Consolidated authorization
+    """
+
+    def __init__(self, node, auth):
+        self.node = node
+        self.auth = auth
+        self.user = auth.user
+        self.when = timezone.now()
+        self.resolver = None
+        # Filled in by collect()
+        self.originals = []  # nodes to copy, parents before their children
+        self.parents = {}  # original id -> original parent id
+        self.relations = collections.defaultdict(list)  # original id -> [(child id, is_node_link)]
+        # Filled in by copy(), original id -> copy
+        self.copies = {}
+
+    def run(self):
+        self.collect()
+        with transaction.atomic():
+            self.copy()
+        self.enqueue_updates()
+        self.run_hooks()
+        return self.copies[self.node.pk]
+
+    def check(self, node):
+        """Raise if ``node`` can't be copied at all."""
+        raise NotImplementedError
+
+    def include(self, node):
+        """Whether to copy the component ``node`` and the components below it."""
+        raise NotImplementedError
+
+    def build(self, original, values):
+        """Return the unsaved copy of ``original``, given the field ``values`` shared by all copies."""
+        raise NotImplementedError
+
+    def get_contributors(self, copy_ids):
+        """Return the unsaved Contributor rows of the copies."""
+        raise NotImplementedError
+
+    def get_new_logs(self, copy_ids, guids):
+        """Return unsaved logs to add to the copies, besides those copied from the originals."""
+        return []
+
+    def copy_related(self, copy_ids):
+        """Copy any other relations of the originals."""
+        pass
+
+    def run_hooks(self):
+        """Run the per-copy addon hooks and signals."""
+        pass
+
+    def collect(self):
+        """Load the subtree below ``node`` and pick the nodes to copy. Deleted
+        components are never copied. Node links are kept and still point at the
+        original nodes.
+        """
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        NodeAncestry = apps.get_model('osf.NodeAncestry')
+        NodeRelation = apps.get_model('osf.NodeRelation')
+
+        children = collections.defaultdict(list)
+        for parent_id, child_id, is_node_link in NodeRelation.objects.filter(
+            Q(parent=self.node) | Q(parent__in=NodeAncestry.objects.filter(ancestor=self.node).values('descendant_id')),
+            child__is_deleted=False,
+        ).order_by('parent_id', '_order').values_list('parent_id', 'child_id', 'is_node_link'):
+            children[parent_id].append((child_id, is_node_link))
+
+        nodes = AbstractNode.objects.in_bulk({
+            child_id
+            for relations in children.values()
+            for child_id, is_node_link in relations
+            if not is_node_link
+        })
+        nodes[self.node.pk] = self.node
+
+        if self.user:
+            self.resolver = PermissionResolver(self.user.pk)
+            self.resolver.prefetch(nodes.keys())
+
+        self.check(self.node)
+
+        queue = collections.deque([self.node])
+        while queue:
+            original = queue.popleft()
+            self.originals.append(original)
+            for child_id, is_node_link in children[original.pk]:
+                if is_node_link:
+                    self.relations[original.pk].append((child_id, True))
+                elif self.include(nodes[child_id]):
+                    self.relations[original.pk].append((child_id, False))
+                    self.parents[child_id] = original.pk
+                    queue.append(nodes[child_id])
+
+    def copy(self):
+        """Create the copies and everything attached to them."""
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        Contributor = apps.get_model('osf.Contributor')
+        Guid = apps.get_model('osf.Guid')
+        NodeAncestry = apps.get_model('osf.NodeAncestry')
+        NodeRelation = apps.get_model('osf.NodeRelation')
+
+        # Copy the same fields clone() does: everything but the primary key and foreign keys.
+        # Read them from the database, as clone() did, rather than from possibly stale instances.
+        names = [field.name for field in AbstractNode._meta.concrete_fields if not field.is_relation and not field.primary_key]
+        rows = {
+            row.pop('id'): row
+            for row in AbstractNode.objects.filter(pk__in=[original.pk for original in self.originals]).include(None).values('id', *names)
+        }
+        licenses = self._copy_licenses()
+        wikis = self._plan_wikis(rows)
+        guids = generate_guids(len(self.originals), length=AbstractNode.__guid_min_length__)
+        copies = [
+            self.build(original, self._get_values(rows[original.pk], licenses.get(original.pk), wikis.get(original.pk, [])))
+            for original in self.originals
+        ]
+        AbstractNode.objects.bulk_create(copies)
+        copy_ids = {original.pk: copy.pk for original, copy in zip(self.originals, copies)}
+        AbstractNode.objects.filter(pk__in=copy_ids.values()).update(root_id=copy_ids[self.node.pk])
+
+        content_type = ContentType.objects.get_for_model(AbstractNode)
+        Guid.objects.bulk_create(
+            [Guid(_id=guid, object_id=copy.pk, content_type=content_type) for guid, copy in zip(guids, copies)] +
+            self._copy_wikis(wikis, copy_ids)
+        )
+
+        # bulk_create skips the NodeRelation receivers, so add the ancestry rows too.
+        # The copy is a new root, so all of them are within the new tree.
+        relations = []
+        ancestries = []
+        ancestors = {self.node.pk: []}
+        for original in self.originals:
+            for order, (child_id, is_node_link) in enumerate(self.relations[original.pk]):
+                relations.append(NodeRelation(
+                    parent_id=copy_ids[original.pk],
+                    child_id=child_id if is_node_link else copy_ids[child_id],
+                    is_node_link=is_node_link,
+                    _order=order,
+                ))
+                if not is_node_link:
+                    ancestors[child_id] = [(original.pk, 1)] + [(ancestor_id, depth + 1) for ancestor_id, depth in ancestors[original.pk]]
+                    ancestries.extend(
+                        NodeAncestry(ancestor_id=copy_ids[ancestor_id], descendant_id=copy_ids[child_id], depth=depth)
+                        for ancestor_id, depth in ancestors[child_id]
+                    )
+        NodeRelation.objects.bulk_create(relations)
+        NodeAncestry.objects.bulk_create(ancestries)
+
+        Contributor.objects.bulk_create(self.get_contributors(copy_ids))
+        clear_permission_resolvers()
+
+        Tagged = AbstractNode.tags.through
+        Tagged.objects.bulk_create([
+            Tagged(abstractnode_id=copy_ids[node_id], tag_id=tag_id)
+            for node_id, tag_id in Tagged.objects.filter(
+                abstractnode_id__in=copy_ids.keys()
+            ).order_by('id').values_list('abstractnode_id', 'tag_id')
+        ])
+
+        self.copy_related(copy_ids)
+        self._copy_logs(copy_ids, self.get_new_logs(copy_ids, guids))
+
+        copies = AbstractNode.objects.in_bulk(copy_ids.values())
+        self.copies = {original_id: copies[copy_id] for original_id, copy_id in copy_ids.items()}
+
+    def enqueue_updates(self):
+        """Enqueue the search and SHARE updates of all the copies as one task."""
+        AbstractNode = apps.get_model('osf.AbstractNode')
+
+        request, user_id = get_request_and_user_id()
+        request_headers = {}
+        if not isinstance(request, DummyRequest):
+            request_headers = {
+                k: v
+                for k, v in get_headers_from_request(request).items()
+                if isinstance(v, basestring)
+            }
+        saved_fields = [field.name for field in AbstractNode._meta.concrete_fields]
+        copy_ids = [self.copies[original.pk]._id for original in self.originals]
+        enqueue_task(node_tasks.on_nodes_updated.s(copy_ids, user_id, True, saved_fields, request_headers))
+
+    def _get_values(self, row, license_id, wikis):
+        AbstractNode = apps.get_model('osf.AbstractNode')
+
+        values = {
+            field.attname: None
+            for field in AbstractNode._meta.concrete_fields
+            if field.is_relation
+        }
+        values.update(row)
+        versions = {key: [] for key in row['wiki_pages_versions']}
+        current = {}
+        for key, page, guid in wikis:
+            versions[key].append(guid)
+            if row['wiki_pages_current'].get(key) == page._id:
+                current[key] = guid
+        values.update(
+            node_license_id=license_id,
+            wiki_pages_versions=versions,
+            wiki_pages_current=current,
+            wiki_private_uuids={},
+            # Copies start out private
+            is_public=False,
+        )
+        return values
+
+    def _copy_licenses(self):
+        """Copy the license of every original, whether its own or inherited from
+        an ancestor. Returns a dict of original id -> id of the copied record.
+        """
+        NodeLicenseRecord = apps.get_model('osf.NodeLicenseRecord')
+
+        license_ids = {}
+        for original in self.originals:
+            if original.node_license_id:
+                license_ids[original.pk] = original.node_license_id
+            elif original.pk in self.parents:
+                license_ids[original.pk] = license_ids[self.parents[original.pk]]
+            else:
+                license = original.license
+                license_ids[original.pk] = license.pk if license else None
+
+        records = NodeLicenseRecord.objects.in_bulk({license_id for license_id in license_ids.values() if license_id})
+        copies = {
+            original_id: NodeLicenseRecord(
+                node_license_id=records[license_id].node_license_id,
+                year=records[license_id].year,
+                copyright_holders=records[license_id].copyright_holders,
+            )
+            for original_id, license_id in license_ids.items()
+            if license_id
+        }
+        NodeLicenseRecord.objects.bulk_create(copies.values())
+        return {original_id: record.pk for original_id, record in copies.items()}
+
+    def _plan_wikis(self, rows):
+        """Load every wiki version of the originals and pick guids for their copies,
+        so the copies' ``wiki_pages_versions`` and ``wiki_pages_current`` can be
+        written along with them. Returns a dict of original id -> [(key, page, guid)].
+        """
+        NodeWikiPage = apps.get_model('addons_wiki.NodeWikiPage')
+
+        page_ids = {
+            page_id
+            for row in rows.values()
+            for versions in row['wiki_pages_versions'].values()
+            for page_id in versions
+        }
+        if not page_ids:
+            return {}
+        pages = {page._id: page for page in NodeWikiPage.objects.filter(guids___id__in=page_ids)}
+        wanted = [
+            (original.pk, key, pages[page_id])
+            for original in self.originals
+            for key, versions in rows[original.pk]['wiki_pages_versions'].items()
+            for page_id in versions
+            if page_id in pages
+        ]
+        guids = generate_guids(len(wanted), length=NodeWikiPage.__guid_min_length__)
+        plan = collections.defaultdict(list)
+        for (original_id, key, page), guid in zip(wanted, guids):
+            plan[original_id].append((key, page, guid))
+        return plan
+
+    def _copy_wikis(self, wikis, copy_ids):
+        """Insert the wiki versions planned by ``_plan_wikis`` and return their unsaved Guids."""
+        Guid = apps.get_model('osf.Guid')
+        NodeWikiPage = apps.get_model('addons_wiki.NodeWikiPage')
+
+        fields = [field.attname for field in NodeWikiPage._meta.concrete_fields if not field.primary_key and field.attname != 'node_id']
+        pages = []
+        guids = []
+        for original_id, planned in wikis.items():
+            for key, page, guid in planned:
+                pages.append(NodeWikiPage(node_id=copy_ids[original_id], **{attname: getattr(page, attname) for attname in fields}))
+                guids.append(guid)
+        if not pages:
+            return []
+        NodeWikiPage.objects.bulk_create(pages)
+        content_type = ContentType.objects.get_for_model(NodeWikiPage)
+        return [Guid(_id=guid, object_id=page.pk, content_type=content_type) for guid, page in zip(guids, pages)]
+
+    def _copy_logs(self, copy_ids, batch):
+        """Copy the logs of the originals to their copies, along with the new logs in ``batch``."""
+        NodeLog = apps.get_model('osf.NodeLog')
+
+        fields = [field.attname for field in NodeLog._meta.concrete_fields if field.attname not in ('id', '_id', 'node_id')]
+        for log in NodeLog.objects.filter(node_id__in=copy_ids.keys()).order_by('id').iterator():
+            values = {attname: getattr(log, attname) for attname in fields}
+            batch.append(NodeLog(node_id=copy_ids[log.node_id], **values))
+            if len(batch) >= LOG_BATCH_SIZE:
+                NodeLog.objects.bulk_create(batch)
+                batch = []
+        NodeLog.objects.bulk_create(batch)
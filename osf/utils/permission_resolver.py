@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Request-scoped permission lookups for nodes.
+
+``AbstractNode.has_permission`` and friends normally issue one contributor
+query per call, plus one per ancestor when checking implicit admin access.
+Code that is about to check permissions on many nodes (a page of API results,
+a rubeus file tree) can call ``prefetch_permissions`` first; the contributor
+rows and admin-ancestor grants for those nodes are then loaded in two queries
+and the node permission methods are answered from memory for the rest of the
+request.
+
+Resolvers are only stored on real (Flask or Django) requests, never on the
+process-global dummy request used by scripts and celery tasks.
+"""
+from __future__ import unicode_literals
+
+from django.apps import apps
+
+from osf.utils.requests import dummy_request, get_current_request
+from website.util.permissions import ADMIN, READ, WRITE
+
+PERMISSIONS = (READ, WRITE, ADMIN)
+
+
+class PermissionResolver(object):
+    """Caches one user's contributor permissions for a set of nodes."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        # node id -> list of explicit permissions (possibly empty)
+        self._permissions = {}
+        # node id -> whether user is an admin of the node or any of its ancestors
+        self._admin_parent = {}
+
+    def __contains__(self, node_id):
+        return node_id in self._permissions
+
+    def prefetch(self, node_ids):
+        """Load permissions for every id in ``node_ids`` that is not already cached."""
+        Contributor = apps.get_model('osf.Contributor')
+        NodeAncestry = apps.get_model('osf.NodeAncestry')
+
+        node_ids = set(node_ids) - set(self._permissions)
+        if not node_ids:
+            return
+
+        ancestors = {node_id: set() for node_id in node_ids}
+        for descendant_id, ancestor_id in NodeAncestry.objects.filter(
+                descendant_id__in=node_ids).values_list('descendant_id', 'ancestor_id'):
+            ancestors[descendant_id].add(ancestor_id)
+
+        all_ids = node_ids.union(*ancestors.values())
+        rows = {
+            node_id: [perm for perm, granted in zip(PERMISSIONS, (read, write, admin)) if granted]
+            for node_id, read, write, admin in Contributor.objects.filter(
+                user_id=self.user_id, node_id__in=all_ids
+            ).values_list('node_id', 'read', 'write', 'admin')
+        }
+
+        for node_id in node_ids:
+            self._permissions[node_id] = rows.get(node_id, [])
+            self._admin_parent[node_id] = any(
+                ADMIN in rows.get(each, [])
+                for each in ancestors[node_id] | {node_id}
+            )
+
+    def get_permissions(self, node):
+        if node.pk not in self._permissions:
+            self.prefetch([node.pk])
+        return list(self._permissions[node.pk])
+
+    def has_permission(self, node, permission, check_parent=True):
+        has_permission = permission in self.get_permissions(node)
+        if not has_permission and permission == READ and check_parent:
+            return self.is_admin_parent(node)
+        return has_permission
+
+    def is_admin_parent(self, node):
+        if node.pk not in self._admin_parent:
+            self.prefetch([node.pk])
+        return self._admin_parent[node.pk]
+
+
+def _get_request():
+    req = get_current_request()
+    if req is dummy_request:
+        return None
+    return req
+
+
+def get_permission_resolver(user):
+    """Return the resolver for ``user`` on the current request, or None if
+    permissions have not been prefetched for that user.
+    """
+    if not user or not getattr(user, 'pk', None):
+        return None
+    req = _get_request()
+    if req is None:
+        return None
+    return getattr(req, '_permission_resolvers', {}).get(user.pk)
+
+
+def prefetch_permissions(user, nodes):
+    """Load ``user``'s permissions for ``nodes`` (node instances or ids) into
+    the current request's resolver, creating it if necessary.
+    Returns the resolver, or None if there is no user or no request.
+    """
+    if not user or not getattr(user, 'pk', None):
+        return None
+    req = _get_request()
+    if req is None:
+        return None
+    resolvers = getattr(req, '_permission_resolvers', None)
+    if resolvers is None:
+        resolvers = req._permission_resolvers = {}
+    resolver = resolvers.get(user.pk)
+    if resolver is None:
+        resolver = resolvers[user.pk] = PermissionResolver(user.pk)
+    resolver.prefetch([getattr(node, 'pk', node) for node in nodes])
+    return resolver
+
+
+def clear_permission_resolvers():
+    """Discard all resolvers on the current request, e.g. after contributors change."""
+    req = _get_request()
+    if req is not None and getattr(req, '_permission_resolvers', None):
+        req._permission_resolvers = {}
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Set-based registration snapshots; see ``osf.utils.node_copy``."""
+from __future__ import unicode_literals
+
+from django.apps import apps
+
+from framework import status
+from framework.exceptions import PermissionsError
+from osf.utils.node_copy import NodeTreeCopier
+from website import settings
+from website.exceptions import NodeStateError
+from website.project import signals as project_signals
+from website.util.permissions import WRITE
+
+
+class NodeRegistrar(NodeTreeCopier):
+    """Registers ``node`` and all of its components against ``schema``.
+
+    :param AbstractNode node: Node to register
+    :param MetaSchema schema: Schema of the registration
+    :param Auth auth: Consolidated authorization
+    :param dict data: Form data
+    """
+
+    def __init__(self, node, schema, auth, data):
+        super(NodeRegistrar, self).__init__(node, auth)
+        self.schema = schema
+        self.data = data
+
+    def register(self):
+        return self.run()
+
+    def can_register(self, node):
+        # NOTE: Admins can register child nodes even if they don't have write access them
+        if self.auth.api_node == node:
+            return True
+        return self.resolver is not None and (
+            self.resolver.has_permission(node, WRITE) or self.resolver.is_admin_parent(node)
+        )
+
+    def check(self, node):
+        if node.is_quickfiles:
+            raise NodeStateError('A QuickFilesNode may not be forked, used as a template, or registered.')
+        self.include(node)
+        if node.is_collection:
+            raise NodeStateError('Folders may not be registered')
+        if node.is_deleted:
+            raise NodeStateError('Cannot register deleted node.')
+
+    def include(self, node):
+        if not self.can_register(node):
+            raise PermissionsError(
+                'User {} does not have permission '
+                'to register this node'.format(getattr(self.user, '_id', None))
+            )
+        return True
+
+    def build(self, original, values):
+        Registration = apps.get_model('osf.Registration')
+
+        registered_meta = dict(values.get('registered_meta') or {})
+        registered_meta[self.schema._id] = self.data
+        values.update(
+            type=Registration._typedmodels_type,
+            registered_date=self.when,
+            registered_user_id=self.user.pk,
+            registered_from_id=original.pk,
+            registered_meta=registered_meta,
+            forked_from_id=original.forked_from_id,
+            creator_id=original.creator_id,
+        )
+        return Registration(**values)
+
+    def get_contributors(self, copy_ids):
+        Contributor = apps.get_model('osf.Contributor')
+
+        return [
+            Contributor(node_id=copy_ids[values.pop('node_id')], **values)
+            for values in Contributor.objects.filter(
+                node_id__in=copy_ids.keys()
+            ).values('node_id', 'user_id', 'read', 'write', 'admin', 'visible', '_order')
+        ]
+
+    def copy_related(self, copy_ids):
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        Registration = apps.get_model('osf.Registration')
+
+        Schemas = Registration.registered_schema.through
+        Schemas.objects.bulk_create([
+            Schemas(abstractnode_id=registration_id, metaschema_id=self.schema.pk)
+            for registration_id in copy_ids.values()
+        ])
+
+        Affiliations = AbstractNode.affiliated_institutions.through
+        Affiliations.objects.bulk_create([
+            Affiliations(abstractnode_id=copy_ids[node_id], institution_id=institution_id)
+            for node_id, institution_id in Affiliations.objects.filter(
+                abstractnode_id__in=copy_ids.keys()
+            ).order_by('id').values_list('abstractnode_id', 'institution_id')
+        ])
+
+    def run_hooks(self):
+        """Run the addon ``after_register`` hooks for each registration, parents
+        before their children, then start archiving, children before their parents.
+        """
+        for original in self.originals:
+            registered = self.copies[original.pk]
+            for addon in original.get_addons():
+                _, message = addon.after_register(original, registered, self.user)
+                if message:
+                    status.push_status_message(message, kind='info', trust=False)
+
+        if settings.ENABLE_ARCHIVER:
+            for original in reversed(self.originals):
+                project_signals.after_create_registration.send(original, dst=self.copies[original.pk], user=self.user)
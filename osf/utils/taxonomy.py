@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""In-process cache of each preprint provider's subject taxonomy.
+
+``Subject.hierarchy``, ``object_hierarchy``, ``path`` and ``child_count`` used
+to follow parent and child links with one query per level, for every subject of
+every preprint serialized. Taxonomies change rarely, so each process now loads a
+provider's whole taxonomy with one query and answers those lookups from memory.
+
+Every tree carries a version stamp that is kept in the Django cache.
+``Subject.save`` and ``Subject.delete`` replace the stamp once their transaction
+commits, and trees whose stamp no longer matches are reloaded on their next use.
+Until then the transaction that changed a taxonomy reads it from the database,
+so uncommitted subjects never end up in a cached tree. Set ``CACHES`` to a shared
+backend (e.g. memcached) for the stamps to reach every process; otherwise trees
+are kept for at most ``UNSHARED_CACHE_TIMEOUT`` seconds.
+
+Cached subjects are shared between requests and must be treated as read-only.
+"""
+import collections
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+from website import settings
+
+VERSION_KEY = 'osf:taxonomy-version:{}'
+# Longest a tree is kept when the version stamps only live in this process
+UNSHARED_CACHE_TIMEOUT = 60
+
+_trees = {}
+_lock = threading.Lock()
+# Providers whose taxonomy the current thread's open transaction has changed
+_local = threading.local()
+
+
+def _pending():
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    return _local.pending
+
+
+class TaxonomyTree(object):
+    """The subjects of one provider, indexed by id, with the ids of their children."""
+
+    def __init__(self, subjects, version):
+        self.version = version
+        self.loaded = time.time()
+        self.subjects = {subject.id: subject for subject in subjects}
+        self.children = collections.defaultdict(list)
+        for subject in subjects:
+            if subject.parent_id:
+                self.children[subject.parent_id].append(subject.id)
+
+    def __contains__(self, subject_id):
+        return subject_id in self.subjects
+
+    def object_hierarchy(self, subject_id):
+        """Return the subjects from the root down to ``subject_id``, or ``None``
+        if any of them is not part of this taxonomy.
+        """
+        hierarchy = []
+        while subject_id:
+            subject = self.subjects.get(subject_id)
+            if subject is None:
+                return None
+            hierarchy.append(subject)
+            subject_id = subject.parent_id
+        hierarchy.reverse()
+        return hierarchy
+
+    def child_count(self, subject_id):
+        return len(self.children.get(subject_id, ()))
+
+    def descendant_ids(self, subject_id):
+        """Ids of all the subjects below ``subject_id``."""
+        ids = []
+        to_visit = list(self.children.get(subject_id, ()))
+        while to_visit:
+            child_id = to_visit.pop()
+            ids.append(child_id)
+            to_visit.extend(self.children.get(child_id, ()))
+        return ids
+
+
+def get_taxonomy_tree(provider_id):
+    """Return the cached ``TaxonomyTree`` of ``provider_id``, loading it if it is
+    missing, expired or out of date. Returns ``None`` when the cache is disabled.
+    """
+    timeout = settings.SUBJECT_TAXONOMY_CACHE_TIMEOUT
+    if not timeout or provider_id is None:
+        return None
+    pending = _pending()
+    if provider_id in pending:
+        if connection.in_atomic_block:
+            return None
+        # The transaction was rolled back
+        pending.discard(provider_id)
+    if isinstance(caches['default'], (LocMemCache, DummyCache)):
+        timeout = min(timeout, UNSHARED_CACHE_TIMEOUT)
+    version = cache.get(VERSION_KEY.format(provider_id))
+    tree = _trees.get(provider_id)
+    if tree is not None and tree.version == version and time.time() - tree.loaded < timeout:
+        return tree
+
+    Subject = apps.get_model('osf.Subject')
+    with _lock:
+        if version is None:
+            version = uuid.uuid4().hex
+            # Another process may have set the stamp first; use theirs
+            if not cache.add(VERSION_KEY.format(provider_id), version, None):
+                version = cache.get(VERSION_KEY.format(provider_id), version)
+        tree = TaxonomyTree(list(Subject.objects.filter(provider_id=provider_id)), version)
+        _trees[provider_id] = tree
+    return tree
+
+
+def _replace_version(provider_id):
+    _pending().discard(provider_id)
+    _trees.pop(provider_id, None)
+    cache.set(VERSION_KEY.format(provider_id), uuid.uuid4().hex, None)
+
+
+def invalidate_taxonomy_tree(provider_id):
+    """Make every process reload the taxonomy of ``provider_id`` on its next use
+    after the current transaction commits.
+    """
+    _trees.pop(provider_id, None)
+    _pending().add(provider_id)
+    transaction.on_commit(lambda: _replace_version(provider_id))
@@ -745,6 +745,23 @@ def make_node_lineage():
     return [node1._id, node2._id, node3._id, node4._id]
 
 
+def make_node_tree(creator, depth, breadth=1, logs=0, **kwargs):
+    """Create a project with ``depth`` levels of components below it, ``breadth``
+    components per node and ``logs`` extra logs on every node. Returns the project.
+    """
+    root = ProjectFactory(creator=creator, **kwargs)
+    level = [root]
+    for _ in range(depth):
+        level = [NodeFactory(creator=creator, parent=parent, **kwargs) for parent in level for _ in range(breadth)]
+    if logs:
+        nodes = [root] + list(models.AbstractNode.objects.filter(_ancestor_paths__ancestor=root))
+        models.NodeLog.objects.bulk_create([
+            models.NodeLog(action='file_added', params={'path': '/'}, user=creator, node=node, original_node=node)
+            for node in nodes for _ in range(logs)
+        ])
+    return root
+
+
 class NotificationDigestFactory(DjangoModelFactory):
     timestamp = FuzzyDateTime(datetime.datetime(1970, 1, 1, tzinfo=pytz.UTC))
     node_lineage = FuzzyAttribute(fuzzer=make_node_lineage)
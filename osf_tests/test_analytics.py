@@ -5,6 +5,7 @@ Unit tests for analytics logic in framework/analytics/__init__.py
 
 import unittest
 
+import mock
 import pytest
 from django.utils import timezone
 from nose.tools import *  # flake8: noqa  (PEP8 asserts)
@@ -13,8 +14,9 @@ from flask import Flask
 from datetime import datetime
 
 from framework import analytics, sessions
+from framework.analytics.buffer import CounterBuffer, _flush_periodically
 from framework.sessions import session
-from osf.models import PageCounter, Session
+from osf.models import DailyPageCount, PageCounter, Session, UserActivityCounter
 
 from tests.base import OsfTestCase
 from osf_tests.factories import UserFactory, ProjectFactory
@@ -199,3 +201,101 @@ class TestUpdateCounters(UpdateCountersTestCase):
         assert_equal(count, (1, 2))
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, fid2))
         assert_equal(count, (1, 1))
+
+
+class TestCounterBuffer:
+
+    @pytest.fixture()
+    def buffer(self):
+        buffer = CounterBuffer(interval=60, max_keys=100)
+        with mock.patch('osf.models.analytics.get_counter_buffer', return_value=buffer):
+            yield buffer
+
+    def test_increments_are_written_on_flush(self, buffer):
+        today = timezone.now().date()
+        buffer.add_page_view('node:abcde', today, total=1, unique=1, day_total=1, day_unique=1)
+        buffer.add_page_view('node:abcde', today, total=1, day_total=1)
+        assert not PageCounter.objects.filter(_id='node:abcde').exists()
+
+        buffer.flush()
+        counter = PageCounter.objects.get(_id='node:abcde')
+        assert (counter.unique, counter.total) == (1, 2)
+        day = counter.days.get()
+        assert (day.date, day.unique, day.total) == (today, 1, 2)
+
+    def test_flush_adds_to_existing_counts(self, buffer):
+        today = timezone.now().date()
+        counter = PageCounter.objects.create(_id='node:abcde', total=5, unique=3)
+        DailyPageCount.objects.create(counter=counter, date=today, total=4, unique=2)
+
+        buffer.add_page_view('node:abcde', today, total=1, unique=1, day_total=1, day_unique=1)
+        buffer.flush()
+
+        counter.refresh_from_db()
+        assert (counter.unique, counter.total) == (4, 6)
+        day = counter.days.get()
+        assert (day.unique, day.total) == (3, 5)
+
+    def test_get_basic_counters_includes_pending_increments(self, buffer):
+        today = timezone.now().date()
+        assert analytics.get_basic_counters('node:abcde') == (None, None)
+
+        buffer.add_page_view('node:abcde', today, total=1, unique=1, day_total=1, day_unique=1)
+        assert analytics.get_basic_counters('node:abcde') == (1, 1)
+
+        PageCounter.objects.create(_id='node:abcde', total=5, unique=3)
+        assert analytics.get_basic_counters('node:abcde') == (4, 6)
+
+    def test_flushes_when_too_many_counters_are_pending(self, buffer):
+        today = timezone.now().date()
+        buffer.max_keys = 2
+        buffer.add_page_view('node:abcde', today, total=1, day_total=1)
+        assert not PageCounter.objects.exists()
+
+        buffer.add_page_view('node:fghij', today, total=1, day_total=1)
+        assert PageCounter.objects.count() == 2
+
+    def test_user_activity(self, buffer):
+        user = UserFactory()
+        today = timezone.now().date()
+        buffer.add_user_activity(user._id, 'project_created', today)
+        buffer.add_user_activity(user._id, 'project_created', today)
+        buffer.add_user_activity(user._id, 'wiki_updated', today)
+        assert user.get_activity_points() == 3
+
+        buffer.flush()
+        assert UserActivityCounter.objects.get(_id=user._id).total == 3
+        assert user.get_activity_points() == 3
+        days = UserActivityCounter.objects.get(_id=user._id).days
+        assert days.get(action='project_created').total == 2
+        assert days.get(action='wiki_updated').total == 1
+
+    def test_download_counts_are_copied_to_files(self, buffer):
+        project = ProjectFactory()
+        file_node = project.get_addon('osfstorage').get_root().append_file('file.txt')
+        today = timezone.now().date()
+        page = 'download:{}:{}'.format(project._id, file_node._id)
+        buffer.add_page_view(page, today, total=1, unique=1, day_total=1, day_unique=1)
+        buffer.add_page_view(page + ':0', today, total=1, unique=1, day_total=1, day_unique=1)
+        buffer.flush()
+
+        file_node.refresh_from_db()
+        assert file_node.download_count == 1
+
+    def test_idle_buffer_is_flushed_periodically(self, buffer):
+        today = timezone.now().date()
+        buffer.add_page_view('node:abcde', today, total=1, day_total=1)
+        buffer._last_flush -= buffer.interval
+
+        with mock.patch('framework.analytics.buffer.time.sleep', side_effect=[None, SystemExit]), \
+                mock.patch('framework.analytics.buffer.connection') as mock_connection:
+            with pytest.raises(SystemExit):
+                _flush_periodically(buffer)
+        assert PageCounter.objects.get(_id='node:abcde').total == 1
+        assert mock_connection.close.called
+
+    def test_pending_page_totals(self, buffer):
+        today = timezone.now().date()
+        buffer.add_page_view('download:abcde:fghij:0', today, total=2, day_total=2)
+        buffer.add_page_view('download:abcde:klmno:0', today, total=1, day_total=1)
+        assert buffer.pending_page_totals('download:abcde:fghij:') == {'download:abcde:fghij:0': 2}
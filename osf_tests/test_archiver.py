@@ -6,6 +6,7 @@ import json
 import logging
 import random
 import re
+import time
 from contextlib import nested
 
 import celery
@@ -44,11 +45,14 @@ from website.util import waterbutler_url_for
 from website.util.sanitize import strip_html
 from osf.models import MetaSchema
 from addons.base.models import BaseStorageAddon
+from addons.base.crawler import TokenBucket
+from framework.exceptions import HTTPError
 
 from osf_tests import factories
 from tests.base import OsfTestCase, fake
 from tests import utils as test_utils
 from tests.utils import unique as _unique
+from osf_tests.utils import FakeWaterButler
 
 SILENT_LOGGERS = (
     'framework.celery_tasks.utils',
@@ -409,6 +413,64 @@ class TestStorageAddonBase(ArchiverTestCase):
         for addon in [a for a in settings.ADDONS_ARCHIVABLE if a not in ['wiki', 'forward']]:
             self._test_addon(addon)
 
+class TestFileTreeCrawler(ArchiverTestCase):
+
+    def setUp(self):
+        super(TestFileTreeCrawler, self).setUp()
+        self.addon = self.src.get_addon('osfstorage')
+
+    def get_file_tree(self):
+        return self.addon._get_file_tree({'path': '/', 'kind': 'folder'}, self.user)
+
+    def test_get_file_tree(self):
+        file_tree = file_tree_factory(4, 3, 3)
+        with FakeWaterButler(file_tree) as waterbutler:
+            assert_equal(self.get_file_tree(), file_tree)
+        assert_equal(len(waterbutler.requests), 5)
+
+    @mock.patch('website.settings.ARCHIVER_CRAWL_CONCURRENCY', 3)
+    def test_folders_are_listed_concurrently(self):
+        file_tree = {
+            'path': '/',
+            'kind': 'folder',
+            'children': [folder_factory(0, 0, 0, '/{}'.format(i)) for i in range(6)],
+        }
+        with FakeWaterButler(file_tree, latency=0.1) as waterbutler:
+            assert_equal(self.get_file_tree(), file_tree)
+        assert_equal(len(waterbutler.requests), 7)
+        assert_equal(waterbutler.max_in_flight, 3)
+
+    @mock.patch('website.settings.ARCHIVER_CRAWL_RETRY_BACKOFF', 0)
+    def test_throttled_and_failed_listings_are_retried(self):
+        file_tree = file_tree_factory(1, 1, 1)
+        folder_path = file_tree['children'][-1]['path']
+        with FakeWaterButler(file_tree, errors={'/': [429], folder_path: [502, 503]}) as waterbutler:
+            assert_equal(self.get_file_tree(), file_tree)
+        assert_equal(waterbutler.requests, ['/', '/', folder_path, folder_path, folder_path])
+
+    @mock.patch('website.settings.ARCHIVER_CRAWL_RETRY_BACKOFF', 0)
+    @mock.patch('website.settings.ARCHIVER_CRAWL_MAX_RETRIES', 2)
+    def test_listing_fails_after_retries(self):
+        with FakeWaterButler(file_tree_factory(2, 1, 1), errors={'/': [503] * 3}) as waterbutler:
+            with assert_raises(HTTPError) as e:
+                self.get_file_tree()
+        assert_equal(e.exception.code, 503)
+        assert_equal(len(waterbutler.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        with FakeWaterButler(file_tree_factory(2, 1, 1), errors={'/': [403]}) as waterbutler:
+            with assert_raises(HTTPError) as e:
+                self.get_file_tree()
+        assert_equal(e.exception.code, 403)
+        assert_equal(len(waterbutler.requests), 1)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.time()
+        for _ in range(3):
+            bucket.acquire()
+        assert_greater_equal(time.time() - start, 0.09)
+
 class TestArchiverTasks(ArchiverTestCase):
 
     @mock.patch('framework.celery_tasks.handlers.enqueue_task')
@@ -1,7 +1,10 @@
+import mock
 import pytest
 from collections import OrderedDict
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 from addons.box.models import BoxFile
 from addons.dropbox.models import DropboxFile
@@ -385,6 +388,80 @@ class TestCommentModel:
         assert n_unread == 0
 
 
+class TestFindUnreadBulk:
+
+    @pytest.fixture()
+    def user(self):
+        return UserFactory()
+
+    @pytest.fixture()
+    def projects(self, user):
+        projects = [ProjectFactory(), ProjectFactory(), ProjectFactory()]
+        for project in projects[:2]:
+            project.add_contributor(user, save=True)
+        return projects
+
+    @pytest.fixture()
+    def cache_timeout(self):
+        cache.clear()
+        with mock.patch.object(settings, 'UNREAD_COMMENTS_CACHE_TIMEOUT', 60):
+            yield
+        cache.clear()
+
+    def test_counts_many_pages_in_one_query(self, user, projects, django_assert_num_queries):
+        first, second, not_contributed = projects
+        CommentFactory(node=first, user=first.creator)
+        CommentFactory(node=first, user=first.creator)
+        CommentFactory(node=second, user=user)
+        CommentFactory(node=not_contributed, user=not_contributed.creator)
+        targets = [(project, Comment.OVERVIEW, None) for project in projects]
+
+        # Contributors, root target guids, and the grouped count
+        with django_assert_num_queries(3):
+            counts = Comment.find_n_unread_bulk(user, targets)
+        assert counts == {targets[0]: 2, targets[1]: 0, targets[2]: 0}
+
+    def test_counts_comments_after_last_view(self, user, projects):
+        project = projects[0]
+        CommentFactory(node=project, user=project.creator)
+        user.comments_viewed_timestamp[project._id] = timezone.now()
+        CommentFactory(node=project, user=project.creator)
+        target = (project, Comment.OVERVIEW, None)
+        assert Comment.find_n_unread_bulk(user, [target]) == {target: 1}
+
+    def test_invalid_page(self, user, projects):
+        with pytest.raises(ValueError):
+            Comment.find_n_unread_bulk(user, [(projects[0], 'invalid', None)])
+
+    def test_cached_counts(self, user, projects, cache_timeout, django_assert_num_queries):
+        project = projects[0]
+        CommentFactory(node=project, user=project.creator)
+        target = (project, Comment.OVERVIEW, None)
+        assert Comment.find_n_unread_bulk(user, [target]) == {target: 1}
+
+        # Only the contributor check
+        with django_assert_num_queries(1):
+            assert Comment.find_n_unread_bulk(user, [target]) == {target: 1}
+
+    def test_cache_is_invalidated_by_new_comments(self, user, projects, cache_timeout):
+        project = projects[0]
+        target = (project, Comment.OVERVIEW, None)
+        assert Comment.find_n_unread_bulk(user, [target]) == {target: 0}
+
+        CommentFactory(node=project, user=project.creator)
+        assert Comment.find_n_unread_bulk(user, [target]) == {target: 1}
+
+    def test_cache_is_invalidated_by_views(self, user, projects, cache_timeout):
+        project = projects[0]
+        CommentFactory(node=project, user=project.creator)
+        target = (project, Comment.OVERVIEW, None)
+        assert Comment.find_n_unread_bulk(user, [target]) == {target: 1}
+
+        user.comments_viewed_timestamp[project._id] = timezone.now()
+        Comment.invalidate_unread_counts(user=user)
+        assert Comment.find_n_unread_bulk(user, [target]) == {target: 0}
+
+
 # copied from tests/test_comments.py
 class FileCommentMoveRenameTestMixin(object):
     id_based_providers = ['osfstorage']
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import shutil
+import tempfile
 import time
 import unittest
 import logging
@@ -15,6 +17,7 @@ from website import settings
 import website.search.search as search
 from website.search import elastic_search
 from website.search.util import build_query
+from website.search_migration import migrate as search_migration
 from website.search_migration.migrate import migrate
 from osf.models import Retraction, NodeLicense, Tag, QuickFilesNode
 from addons.osfstorage.models import OsfStorageFile
@@ -803,6 +806,59 @@ class TestSearchExceptions(OsfTestCase):
         self.project.save()
 
 
+class TestParallelSearchMigration(OsfTestCase):
+
+    def setUp(self):
+        super(TestParallelSearchMigration, self).setUp()
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.projects = [factories.ProjectFactory(is_public=True) for _ in range(5)]
+
+    def tearDown(self):
+        super(TestParallelSearchMigration, self).tearDown()
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def test_shard_ranges_cover_id_space(self):
+        queryset = search_migration._node_query()
+        ids = set(queryset.values_list('id', flat=True))
+        ranges = search_migration.shard_ranges(queryset, 3)
+        assert_true(len(ranges) <= 3)
+        covered = set(i for i in ids for start, end in ranges if start <= i < end)
+        assert_equal(covered, ids)
+
+    def test_checkpoints_round_trip(self):
+        checkpoints = search_migration.Checkpoints(self.checkpoint_dir, 'test')
+        assert_is_none(checkpoints.get_last_id('nodes', 0))
+        checkpoints.set_last_id('nodes', 0, 42)
+        assert_equal(checkpoints.get_last_id('nodes', 0), 42)
+        checkpoints.clear()
+        assert_is_none(checkpoints.get_last_id('nodes', 0))
+
+    @mock.patch('website.search_migration.migrate.connections')
+    def test_reindex_shard_resumes_from_checkpoint(self, mock_connections):
+        mock_index_nodes = mock.Mock(side_effect=lambda nodes, index: len(nodes))
+        get_queryset, _, include = search_migration.PARALLEL_KINDS['nodes']
+        ids = sorted(search_migration._node_query().values_list('id', flat=True))
+        search_migration.Checkpoints(self.checkpoint_dir, 'test').set_last_id('nodes', 0, ids[1])
+
+        with mock.patch.dict(search_migration.PARALLEL_KINDS, {'nodes': (get_queryset, mock_index_nodes, include)}):
+            kind, shard, indexed, _ = search_migration.reindex_shard(
+                'nodes', 0, ids[0], ids[-1] + 1, 'test', self.checkpoint_dir, chunk_size=2
+            )
+        assert_equal(indexed, len(ids) - 2)
+        indexed_ids = [node.id for call in mock_index_nodes.call_args_list for node in call[0][0]]
+        assert_equal(indexed_ids, ids[2:])
+        assert_equal(search_migration.Checkpoints(self.checkpoint_dir, 'test').get_last_id('nodes', 0), ids[-1])
+
+    @mock.patch('website.search_migration.migrate.set_up_alias')
+    @mock.patch('website.search_migration.migrate.migrate_parallel', side_effect=Exception('shard failed'))
+    def test_alias_not_switched_when_a_shard_fails(self, mock_migrate_parallel, mock_set_up_alias):
+        with assert_raises(Exception):
+            migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app, workers=2, checkpoint_dir=self.checkpoint_dir)
+        assert_false(mock_set_up_alias.called)
+        manifest = search_migration.Checkpoints(self.checkpoint_dir, settings.ELASTIC_INDEX).get_manifest()
+        assert_is_not_none(manifest)
+
+
 class TestSearchMigration(OsfTestCase):
     # Verify that the correct indices are created/deleted during migration
 
@@ -991,3 +1047,57 @@ class TestSearchFiles(OsfTestCase):
 
         find = query_file('GreenLight.mp3')['results']
         assert_equal(len(find), 0)
+
+
+class TestDebouncedNodeIndexing(OsfTestCase):
+
+    def setUp(self):
+        super(TestDebouncedNodeIndexing, self).setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.node = factories.ProjectFactory(is_public=True)
+
+    @mock.patch('website.search.elastic_search.index_node_debounced.apply_async')
+    def test_updates_within_window_are_coalesced(self, mock_apply_async):
+        assert_true(elastic_search.debounce_node_update(self.node._id, reindex_files=False))
+        assert_false(elastic_search.debounce_node_update(self.node._id, reindex_files=True))
+        assert_equal(mock_apply_async.call_count, 1)
+        assert_equal(mock_apply_async.call_args[1]['countdown'], settings.SEARCH_INDEX_DEBOUNCE)
+
+    @mock.patch('website.search.elastic_search.update_node')
+    @mock.patch('website.search.elastic_search.index_node_debounced.apply_async')
+    def test_coalesced_file_reindex_is_not_lost(self, mock_apply_async, mock_update_node):
+        elastic_search.debounce_node_update(self.node._id, reindex_files=False)
+        elastic_search.debounce_node_update(self.node._id, reindex_files=True)
+        elastic_search.index_node_debounced(**mock_apply_async.call_args[1]['kwargs'])
+        assert_true(mock_update_node.call_args[1]['reindex_files'])
+        assert_false(mock_update_node.call_args[1]['refresh'])
+        # The markers are cleared, so the next update schedules a new reindex
+        assert_true(elastic_search.debounce_node_update(self.node._id, reindex_files=False))
+
+    @mock.patch('website.search.elastic_search.debounce_node_update')
+    @mock.patch('website.search.elastic_search.update_node')
+    def test_no_debounce_with_per_process_cache(self, mock_update_node, mock_debounce):
+        with mock.patch.object(settings, 'SEARCH_INDEX_DEBOUNCE', 5), mock.patch.object(settings, 'USE_CELERY', True):
+            assert_false(elastic_search.debounce_enabled())
+            elastic_search.update_node_async(self.node._id, reindex_files=False)
+        assert_false(mock_debounce.called)
+        assert_true(mock_update_node.called)
+
+    @mock.patch('website.search.elastic_search.update_node_async')
+    def test_file_reindex_only_for_file_fields(self, mock_update_node_async):
+        search.update_node(self.node, saved_fields=['description'])
+        assert_false(mock_update_node_async.call_args[1]['reindex_files'])
+        search.update_node(self.node, saved_fields=['title'])
+        assert_true(mock_update_node_async.call_args[1]['reindex_files'])
+
+    @mock.patch('website.search.elastic_search.helpers.bulk', return_value=(2, []))
+    def test_node_and_files_sent_in_one_bulk_request(self, mock_bulk):
+        root = self.node.get_addon('osfstorage').get_root()
+        root.append_file('Respect.mp3')
+        mock_bulk.reset_mock()
+        elastic_search.update_node(self.node, refresh=False)
+        assert_equal(mock_bulk.call_count, 1)
+        actions = mock_bulk.call_args[0][1]
+        assert_equal({action['_type'] for action in actions}, {'file', 'project'})
+        assert_false(mock_bulk.call_args[1]['refresh'])
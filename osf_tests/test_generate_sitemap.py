@@ -1,3 +1,4 @@
+import gzip
 import os
 
 import pytest
@@ -13,22 +14,33 @@ from osf_tests.factories import (AuthUserFactory, ProjectFactory, RegistrationFa
 from website import settings
 
 
+NAMESPACE = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def read_sitemap_urls():
+    # Parse the index and every gzipped sitemap file it lists
+    # Note: namespace was defined in the XML file, therefore necessary to include in tag
+    sitemap_dir = os.path.join(settings.STATIC_FOLDER, 'sitemaps')
+    with open(os.path.join(sitemap_dir, 'sitemap_index.xml')) as f:
+        index = xml.etree.ElementTree.parse(f)
+
+    urls = []
+    for element in index.iter(NAMESPACE + 'loc'):
+        file_name = urlparse.urlparse(element.text).path.split('/')[-1]
+        with gzip.open(os.path.join(sitemap_dir, file_name + '.gz')) as f:
+            tree = xml.etree.ElementTree.parse(f)
+        urls.extend(url.text for url in tree.iter(NAMESPACE + 'loc'))
+    return urls
+
+
 def get_all_sitemap_urls():
     # Create temporary directory for the sitemaps to be generated
 
     generate_sitemap.main()
-
-    # Parse the generated XML sitemap file
-    with open(os.path.join(settings.STATIC_FOLDER, 'sitemaps/sitemap_0.xml')) as f:
-        tree = xml.etree.ElementTree.parse(f)
+    urls = read_sitemap_urls()
 
     shutil.rmtree(settings.STATIC_FOLDER)
 
-    # Get all the urls in the sitemap
-    # Note: namespace was defined in the XML file, therefore necessary to include in tag
-    namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
-    urls = [element.text for element in tree.iter(namespace + 'loc')]
-
     return urls
 
 
@@ -166,3 +178,31 @@ class TestGenerateSitemap:
             urls = get_all_sitemap_urls()
 
         assert urlparse.urljoin(settings.DOMAIN, project_deleted.url) not in urls
+
+    def test_sections_split_at_url_max(self, all_included_links, create_tmp_directory):
+
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory), \
+                mock.patch('website.settings.SITEMAP_URL_MAX', 2), \
+                mock.patch('website.settings.SITEMAP_QUERY_CHUNK_SIZE', 1):
+            generate_sitemap.main()
+            urls = read_sitemap_urls()
+            file_names = os.listdir(os.path.join(settings.STATIC_FOLDER, 'sitemaps'))
+
+        assert set(urls) == set(all_included_links)
+        assert 'sitemap_users_0.xml.gz' in file_names
+        assert 'sitemap_nodes_1.xml.gz' in file_names
+
+    def test_incremental_only_rewrites_changed_files(self, user_admin_project_public, create_tmp_directory):
+        sitemap_dir = os.path.join(create_tmp_directory, 'sitemaps')
+
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory):
+            generate_sitemap.main()
+            for file_name in os.listdir(sitemap_dir):
+                os.utime(os.path.join(sitemap_dir, file_name), (0, 0))
+
+            ProjectFactory(creator=user_admin_project_public, is_public=True)
+            generate_sitemap.main(incremental=True)
+
+            assert os.path.getmtime(os.path.join(sitemap_dir, 'sitemap_users_0.xml.gz')) == 0
+            assert os.path.getmtime(os.path.join(sitemap_dir, 'sitemap_nodes_0.xml.gz')) != 0
+            assert len(read_sitemap_urls()) == len(get_all_sitemap_urls())
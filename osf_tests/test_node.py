@@ -2,7 +2,9 @@ import datetime
 
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 import mock
 import pytest
 import pytz
@@ -16,7 +18,7 @@ from website.exceptions import NodeStateError
 from website.util import permissions, disconnected_from_listeners, api_url_for, web_url_for
 from website.citations.utils import datetime_to_csl
 from website import language, settings
-from website.project.tasks import on_node_updated
+from website.project.tasks import on_node_updated, check_nodes_spam
 
 from osf.models import (
     AbstractNode,
@@ -26,6 +28,7 @@ from osf.models import (
     Contributor,
     MetaSchema,
     Sanction,
+    NodeAncestry,
     NodeRelation,
     Registration,
     DraftRegistration,
@@ -33,9 +36,12 @@ from osf.models import (
 )
 from osf.models.node import AbstractNodeQuerySet
 from osf.models.spam import SpamStatus
+from osf.utils.requests import DummyRequest
 from addons.wiki.models import NodeWikiPage
 from osf.exceptions import ValidationError, ValidationValueError
 from osf.utils.auth import Auth
+from osf.utils.forks import NodeForker
+from osf.utils.registrations import NodeRegistrar
 
 from osf_tests.factories import (
     AuthUserFactory,
@@ -54,6 +60,7 @@ from osf_tests.factories import (
     InstitutionFactory,
     SessionFactory,
     TagFactory,
+    make_node_tree,
 )
 from .factories import get_default_metaschema
 from addons.wiki.tests.factories import NodeWikiFactory
@@ -1656,6 +1663,40 @@ class TestRegisterNode:
             assert r.registered_meta[meta_schema._id] == data
             assert r.registered_schema.first() == meta_schema
 
+    @mock.patch('website.project.signals.after_create_registration')
+    def test_register_deep_tree(self, mock_signal, user, auth):
+        project = make_node_tree(user, depth=4, breadth=2, logs=3)
+        pointee = ProjectFactory()
+        project.add_pointer(pointee, auth=auth)
+        registration = project.register_node(get_default_metaschema(), auth, {'some': 'data'})
+
+        descendants = AbstractNode.objects.filter(_ancestor_paths__ancestor=registration)
+        assert descendants.count() == 30
+        assert set(descendants.values_list('root_id', flat=True)) == {registration.id}
+        assert NodeAncestry.objects.find_inconsistencies() == (0, 0)
+        assert list(registration.nodes_pointer.all()) == [pointee]
+        assert mock_signal.send.call_count == 31
+        for child in descendants:
+            assert child.is_registration is True
+            assert child.is_public is False
+            assert child.registered_user == user
+            assert child.registered_from.title == child.title
+            assert list(child.contributors.all()) == list(child.registered_from.contributors.all())
+            assert child.logs.count() == child.registered_from.logs.count()
+            assert child.registered_schema.get() == get_default_metaschema()
+
+    def test_register_copy_queries_do_not_grow_with_tree(self, user, auth):
+        def count_copy_queries(project):
+            registrar = NodeRegistrar(project, get_default_metaschema(), auth, '')
+            registrar.collect()
+            with CaptureQueriesContext(connection) as ctx:
+                registrar.copy()
+            return len(ctx.captured_queries)
+
+        small = make_node_tree(user, depth=1, logs=2)
+        large = make_node_tree(user, depth=5, breadth=2, logs=2)
+        assert count_copy_queries(small) == count_copy_queries(large)
+
 
 # Copied from tests/test_models.py
 class TestAddUnregisteredContributor:
@@ -1920,6 +1961,60 @@ class TestNodeSpam:
                 assert project.check_spam(user, None, None) is True
                 assert project.is_public is True
 
+    @mock.patch.object(settings, 'SPAM_CHECK_ENABLED', True)
+    def test_save_queues_spam_check(self, project, user):
+        with mock.patch('osf.models.node.get_request_and_user_id', return_value=(DummyRequest(), user._id)), \
+                mock.patch('osf.models.node.enqueue_batched_task') as mock_enqueue, \
+                mock.patch('osf.models.AbstractNode.do_check_spam', side_effect=Exception('should not get here')):
+            project.description = 'spammy'
+            project.save()
+        mock_enqueue.assert_called_once_with(check_nodes_spam, [project._id, user._id, ['description'], {}])
+
+    @mock.patch.object(settings, 'SPAM_CHECK_ENABLED', True)
+    def test_save_of_other_fields_does_not_queue_spam_check(self, project, user):
+        with mock.patch('osf.models.node.get_request_and_user_id', return_value=(DummyRequest(), user._id)), \
+                mock.patch('osf.models.node.enqueue_batched_task') as mock_enqueue:
+            project.category = 'data'
+            project.save()
+        assert mock_enqueue.called is False
+
+    @mock.patch.object(settings, 'SPAM_CHECK_ENABLED', True)
+    def test_spam_checks_are_batched_per_request(self, project, user):
+        handlers.celery_before_request()
+        with mock.patch('framework.celery_tasks.handlers._in_request_context', return_value=True):
+            handlers.enqueue_batched_task(check_nodes_spam, [project._id, user._id, ['title'], {}])
+            handlers.enqueue_batched_task(check_nodes_spam, [project._id, user._id, ['description'], {}])
+        assert len(handlers.queue()) == 1
+        assert handlers.queue()[0].args[0] == [
+            [project._id, user._id, ['title'], {}],
+            [project._id, user._id, ['description'], {}],
+        ]
+        handlers.celery_before_request()
+
+    @mock.patch.object(settings, 'SPAM_CHECK_ENABLED', True)
+    def test_check_nodes_spam_applies_result_once(self, project, user):
+        client = mock.Mock()
+        client.check_comment.return_value = (True, 'tip')
+        check = [project._id, user._id, ['description'], {'Remote-Addr': '127.0.0.1'}]
+        with mock.patch('osf.models.node.Node._get_spam_content', mock.Mock(return_value='some content!')), \
+                mock.patch('osf.models.spam._get_client', return_value=client):
+            check_nodes_spam([check, check])
+        project.reload()
+        assert project.spam_status == SpamStatus.FLAGGED
+        assert project.spam_pro_tip == 'tip'
+        assert client.check_comment.call_count == 1
+
+    @mock.patch.object(settings, 'SPAM_CHECK_ENABLED', True)
+    def test_check_nodes_spam_skips_ham(self, project, user):
+        project.confirm_ham(save=True)
+        client = mock.Mock()
+        with mock.patch('osf.models.node.Node._get_spam_content', mock.Mock(return_value='some content!')), \
+                mock.patch('osf.models.spam._get_client', return_value=client):
+            check_nodes_spam([[project._id, user._id, ['description'], {'Remote-Addr': '127.0.0.1'}]])
+        project.reload()
+        assert project.spam_status == SpamStatus.HAM
+        assert client.check_comment.called is False
+
     def test_flag_spam_make_node_private(self, project):
         assert project.is_public
         with mock.patch.object(settings, 'SPAM_FLAGGED_MAKE_NODE_PRIVATE', True):
@@ -2815,6 +2910,48 @@ class TestForkNode:
         assert registration_wiki_version.node == fork
         assert registration_wiki_version._id != wiki._id
 
+    def test_fork_deep_tree(self, user, auth):
+        project = make_node_tree(user, depth=4, breadth=2, logs=3)
+        pointee = ProjectFactory()
+        project.add_pointer(pointee, auth=auth)
+        fork = project.fork_node(auth)
+
+        descendants = AbstractNode.objects.filter(_ancestor_paths__ancestor=fork)
+        assert descendants.count() == project.descendants.exclude(id=project.id).count() == 30
+        assert set(descendants.values_list('root_id', flat=True)) == {fork.id}
+        assert fork.root_id == fork.id
+        assert NodeAncestry.objects.find_inconsistencies() == (0, 0)
+        assert list(fork.nodes_pointer.all()) == [pointee]
+        for child in descendants:
+            assert child.is_fork is True
+            assert child.is_public is False
+            assert child.forked_from.title == child.title
+            assert list(child.contributors.all()) == [user]
+            assert child.logs.count() == child.forked_from.logs.count() + 1
+            assert child.logs.latest().params['fork'] == child._id
+
+    def test_fork_copy_queries_do_not_grow_with_tree(self, user, auth):
+        def count_copy_queries(project):
+            forker = NodeForker(project, auth)
+            forker.collect()
+            with CaptureQueriesContext(connection) as ctx:
+                forker.copy()
+            return len(ctx.captured_queries)
+
+        small = make_node_tree(user, depth=1, logs=2)
+        large = make_node_tree(user, depth=5, breadth=2, logs=2)
+        assert count_copy_queries(small) == count_copy_queries(large)
+
+    def test_fork_copies_inherited_license(self, user, auth):
+        license = NodeLicenseRecordFactory()
+        project = make_node_tree(user, depth=1)
+        project.node_license = license
+        project.save()
+        fork = project.fork_node(auth)
+        child = fork.nodes_primary.get()
+        assert child.node_license.license_id == license.license_id
+        assert child.node_license_id not in (license.id, fork.node_license_id)
+
 class TestContributorOrdering:
 
     def test_can_get_contributor_order(self, node):
@@ -0,0 +1,81 @@
+import pytest
+
+from osf.models import AbstractNode, NodeAncestry, NodeRelation
+from osf.utils.auth import Auth
+from osf_tests.factories import NodeFactory, ProjectFactory, UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def root():
+    return ProjectFactory()
+
+@pytest.fixture()
+def child(root):
+    return NodeFactory(parent=root)
+
+@pytest.fixture()
+def grandchild(child):
+    return NodeFactory(parent=child)
+
+
+def ancestry(node):
+    return set(NodeAncestry.objects.filter(descendant=node).values_list('ancestor_id', 'depth'))
+
+
+class TestNodeAncestry:
+
+    def test_rows_created_with_components(self, root, child, grandchild):
+        assert ancestry(root) == set()
+        assert ancestry(child) == {(root.id, 1)}
+        assert ancestry(grandchild) == {(child.id, 1), (root.id, 2)}
+
+    def test_node_links_are_ignored(self, root, child):
+        other = ProjectFactory()
+        other.add_node_link(child, auth=Auth(other.creator), save=True)
+        assert ancestry(child) == {(root.id, 1)}
+
+    def test_attaching_subtree_links_all_descendants(self, root, child, grandchild):
+        new_root = ProjectFactory()
+        NodeRelation.objects.filter(parent=root, child=child).delete()
+        assert ancestry(child) == set()
+        assert ancestry(grandchild) == {(child.id, 1)}
+
+        NodeRelation.objects.create(parent=new_root, child=child)
+        assert ancestry(child) == {(new_root.id, 1)}
+        assert ancestry(grandchild) == {(child.id, 1), (new_root.id, 2)}
+
+    def test_rebuild_matches_incremental(self, root, child, grandchild):
+        expected = set(NodeAncestry.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        NodeAncestry.objects.rebuild()
+        assert set(NodeAncestry.objects.values_list('ancestor_id', 'descendant_id', 'depth')) == expected
+        assert NodeAncestry.objects.find_inconsistencies() == (0, 0)
+
+    def test_find_inconsistencies(self, root, child, grandchild):
+        NodeAncestry.objects.filter(descendant=grandchild, ancestor=root).delete()
+        assert NodeAncestry.objects.find_inconsistencies() == (1, 0)
+
+
+class TestAncestryBackedNodeMethods:
+
+    def test_get_root(self, root, child, grandchild):
+        assert grandchild.get_root() == root
+        assert child.get_root() == root
+        assert root.get_root() == root
+
+    def test_parents(self, root, child, grandchild):
+        assert grandchild.parents == [child, root]
+        assert root.parents == []
+
+    def test_get_children_of_component(self, root, child, grandchild):
+        great_grandchild = NodeFactory(parent=grandchild, is_deleted=True)
+        assert set(AbstractNode.objects.get_children(child)) == {grandchild, great_grandchild}
+        assert set(AbstractNode.objects.get_children(child, active=True)) == {grandchild}
+
+    def test_is_admin_parent(self, root, child, grandchild):
+        user = UserFactory()
+        assert grandchild.is_admin_parent(user) is False
+        root.add_contributor(user, permissions=['read', 'write', 'admin'], save=True)
+        assert grandchild.is_admin_parent(user) is True
+        assert grandchild.is_admin_parent(None) is False
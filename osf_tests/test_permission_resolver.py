@@ -0,0 +1,90 @@
+import mock
+import pytest
+
+from osf.utils.auth import Auth
+from osf.utils.permission_resolver import (
+    PermissionResolver,
+    get_permission_resolver,
+    prefetch_permissions,
+)
+from osf.utils.requests import DummyRequest
+from osf_tests.factories import NodeFactory, ProjectFactory, UserFactory
+from website.util.permissions import ADMIN, READ, WRITE
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.yield_fixture()
+def request_context():
+    req = DummyRequest()
+    with mock.patch('osf.utils.permission_resolver.get_current_request', return_value=req):
+        yield req
+
+@pytest.fixture()
+def user():
+    return UserFactory()
+
+@pytest.fixture()
+def project(user):
+    return ProjectFactory(creator=user)
+
+@pytest.fixture()
+def component(project):
+    return NodeFactory(parent=project, creator=project.creator)
+
+
+class TestPermissionResolver:
+
+    def test_explicit_permissions(self, user, project):
+        resolver = PermissionResolver(user.pk)
+        resolver.prefetch([project.pk])
+        assert resolver.get_permissions(project) == [READ, WRITE, ADMIN]
+        assert resolver.has_permission(project, ADMIN)
+
+    def test_implicit_admin_parent(self, user, project):
+        component = NodeFactory(parent=project)
+        resolver = PermissionResolver(user.pk)
+        resolver.prefetch([component.pk])
+        assert resolver.get_permissions(component) == []
+        assert resolver.is_admin_parent(component)
+        assert resolver.has_permission(component, READ)
+        assert not resolver.has_permission(component, READ, check_parent=False)
+        assert not resolver.has_permission(component, WRITE)
+
+    def test_non_contributor(self, project):
+        resolver = PermissionResolver(UserFactory().pk)
+        resolver.prefetch([project.pk])
+        assert not resolver.has_permission(project, READ)
+        assert not resolver.is_admin_parent(project)
+
+    @pytest.mark.django_assert_num_queries
+    def test_prefetch_is_constant_in_node_count(self, user, project, django_assert_num_queries):
+        nodes = [NodeFactory(parent=project) for _ in range(5)]
+        resolver = PermissionResolver(user.pk)
+        with django_assert_num_queries(2):
+            resolver.prefetch([node.pk for node in nodes])
+        with django_assert_num_queries(0):
+            for node in nodes:
+                assert resolver.has_permission(node, READ)
+
+
+class TestRequestScopedResolver:
+
+    def test_no_resolver_without_request(self, user, project):
+        assert prefetch_permissions(user, [project]) is None
+        assert get_permission_resolver(user) is None
+
+    def test_node_methods_use_resolver(self, request_context, user, project, component):
+        prefetch_permissions(user, [project, component])
+        assert get_permission_resolver(user) is not None
+        with mock.patch.object(PermissionResolver, 'has_permission', return_value=False) as mock_has_permission:
+            assert not component.can_edit(Auth(user))
+            assert mock_has_permission.called
+
+    def test_contributor_changes_clear_resolver(self, request_context, user, project):
+        other = UserFactory()
+        prefetch_permissions(other, [project])
+        assert not project.has_permission(other, READ)
+        project.add_contributor(other, permissions=[READ], auth=Auth(user), save=True)
+        assert get_permission_resolver(other) is None
+        assert project.has_permission(other, READ)
@@ -0,0 +1,177 @@
+import datetime as dt
+
+import mock
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from framework.sessions import store as session_store
+from framework.sessions.store import LastLoginBuffer, SessionStore
+from osf.models import OSFUser, Session
+from osf_tests.factories import AuthUserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def shared_cache():
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture()
+def store():
+    store = SessionStore(size=10, timeout=60)
+    with mock.patch.object(session_store, '_store', store):
+        yield store
+
+
+@pytest.fixture()
+def user_session():
+    session = Session(data={'auth_user_id': 'abc12', 'date': timezone.now()})
+    session.save()
+    return session
+
+
+class TestSessionStore:
+
+    def test_load_is_cached(self, store, user_session):
+        assert store.load(user_session._id).data == user_session.data
+        with CaptureQueriesContext(connection) as ctx:
+            loaded = store.load(user_session._id)
+        assert len(ctx.captured_queries) == 0
+        assert loaded.pk == user_session.pk
+        assert loaded.data == user_session.data
+        assert not loaded._state.adding
+
+    def test_loaded_sessions_do_not_share_data(self, store, user_session):
+        store.load(user_session._id).data['auth_user_id'] = 'changed'
+        assert store.load(user_session._id).data['auth_user_id'] == 'abc12'
+
+    def test_missing_session(self, store):
+        assert store.load('notasession') is None
+
+    def test_saving_evicts(self, store, user_session):
+        store.load(user_session._id)
+        user_session.data['auth_user_id'] = 'def34'
+        user_session.save()
+        assert store.load(user_session._id).data['auth_user_id'] == 'def34'
+
+    def test_deleting_evicts(self, store, user_session):
+        store.load(user_session._id)
+        user_session.delete()
+        assert store.load(user_session._id) is None
+
+    def test_lru_size(self, store):
+        sessions = [Session.objects.create() for i in range(11)]
+        for session in sessions:
+            store.load(session._id)
+        assert sessions[0]._id not in store._lru
+        assert len(store._lru) == 10
+
+    def test_expired_entries_are_reloaded(self, store, user_session):
+        store.load(user_session._id)
+        Session.objects.filter(pk=user_session.pk).update(data={'auth_user_id': 'def34'})
+        expires, snapshot = store._lru[user_session._id]
+        store._lru[user_session._id] = (0, snapshot)
+        assert store.load(user_session._id).data['auth_user_id'] == 'def34'
+
+    def test_shared_cache(self, user_session, shared_cache):
+        SessionStore(size=0, timeout=60, shared_cache=shared_cache).load(user_session._id)
+        other_process = SessionStore(size=0, timeout=60, shared_cache=shared_cache)
+        with CaptureQueriesContext(connection) as ctx:
+            assert other_process.load(user_session._id).data == user_session.data
+        assert len(ctx.captured_queries) == 0
+        assert other_process.stats['shared_hits'] == 1
+
+
+class TestWriteBehind:
+
+    @pytest.fixture()
+    def store(self, shared_cache):
+        store = SessionStore(size=10, timeout=60, shared_cache=shared_cache, write_behind=True)
+        with mock.patch.object(session_store, '_store', store):
+            yield store
+
+    def test_requires_shared_cache(self):
+        assert not SessionStore(size=10, timeout=60, write_behind=True).write_behind
+
+    @mock.patch('framework.sessions.store._in_request', return_value=True)
+    @mock.patch('framework.sessions.store.enqueue_postcommit_task')
+    def test_database_is_written_after_request(self, mock_enqueue, mock_in_request, store, user_session):
+        user_session.data['status'] = ['saved']
+        store.save(user_session)
+        store.save(user_session)
+
+        assert 'status' not in Session.objects.get(pk=user_session.pk).data
+        assert store.load(user_session._id).data['status'] == ['saved']
+
+        # Both saves share one batch
+        batches = set(call[0][1][0] for call in mock_enqueue.call_args_list)
+        assert len(batches) == 1
+        session_store.flush_sessions(batches.pop())
+        assert Session.objects.get(pk=user_session.pk).data['status'] == ['saved']
+
+    def test_saves_outside_requests_are_immediate(self, store, user_session):
+        user_session.data['status'] = ['saved']
+        store.save(user_session)
+        assert Session.objects.get(pk=user_session.pk).data['status'] == ['saved']
+
+
+class TestLastLoginBuffer:
+
+    def test_users_are_updated_in_one_query(self):
+        users = [AuthUserFactory(date_last_login=None) for i in range(3)]
+        buffer = LastLoginBuffer(interval=60, throttle=60)
+        for user in users:
+            buffer.add(user._id)
+            buffer.add(user._id)
+        assert buffer._pending == set(user._id for user in users)
+
+        with CaptureQueriesContext(connection) as ctx:
+            assert buffer.flush() == 3
+        assert len(ctx.captured_queries) == 1
+        assert OSFUser.objects.filter(pk__in=[user.pk for user in users], date_last_login__isnull=True).count() == 0
+
+    def test_recently_updated_users_are_skipped(self):
+        recent = timezone.now() - dt.timedelta(seconds=5)
+        user = AuthUserFactory(date_last_login=recent)
+        buffer = LastLoginBuffer(interval=60, throttle=60)
+        buffer.add(user._id)
+        assert buffer.flush() == 0
+        user.reload()
+        assert user.date_last_login == recent
+
+    def test_flushes_when_due(self):
+        user = AuthUserFactory(date_last_login=None)
+        buffer = LastLoginBuffer(interval=0, throttle=60)
+        buffer.add(user._id)
+        user.reload()
+        assert user.date_last_login is not None
+
+    def test_idle_buffer_is_flushed_periodically(self):
+        user = AuthUserFactory(date_last_login=None)
+        buffer = LastLoginBuffer(interval=60, throttle=60)
+        buffer.add(user._id)
+        buffer._last_flush -= buffer.interval
+
+        with mock.patch('framework.sessions.store.time.sleep', side_effect=[None, SystemExit]), \
+                mock.patch('framework.sessions.store.connection') as mock_connection:
+            with pytest.raises(SystemExit):
+                session_store._flush_last_logins_periodically(buffer)
+        user.reload()
+        assert user.date_last_login is not None
+        assert mock_connection.close.called
+
+    def test_failed_flush_keeps_users_pending(self):
+        user = AuthUserFactory(date_last_login=None)
+        buffer = LastLoginBuffer(interval=60, throttle=60)
+        buffer.add(user._id)
+        with mock.patch.object(OSFUser.objects, 'filter', side_effect=Exception('database is down')):
+            with pytest.raises(Exception):
+                buffer.flush()
+        assert buffer._pending == {user._id}
+        assert buffer.flush() == 1
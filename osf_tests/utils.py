@@ -1,12 +1,19 @@
+import BaseHTTPServer
 import contextlib
 import datetime as dt
 import functools
+import json
 import mock
+import SocketServer
+import threading
+import time
+import urlparse
 
 from framework.auth import Auth
 from django.utils import timezone
 
 import blinker
+from website import settings
 from website.signals import ALL_SIGNALS
 from website.archiver import ARCHIVER_SUCCESS
 from website.archiver import listeners as archiver_listeners
@@ -169,3 +176,87 @@ class MockShareResponse:
     def raise_for_status(self):
         if self.status_code >= 400:
             raise Exception
+
+
+class FakeWaterButler(object):
+    """A local WaterButler serving the folder listings of ``file_tree`` over HTTP,
+    for testing and benchmarking the archiver's file tree crawler.
+
+    :param dict file_tree: tree of folders and files, as returned by ``_get_file_tree``
+    :param float latency: seconds each listing takes
+    :param dict errors: folder path -> list of status codes to respond with, in turn,
+        before listing the folder
+
+    Example use:
+
+    with FakeWaterButler(file_tree_factory(5, 3, 3), latency=0.05) as waterbutler:
+        start = time.time()
+        node.get_addon('dropbox')._get_file_tree(user=user)
+        print(time.time() - start, len(waterbutler.requests), waterbutler.max_in_flight)
+    """
+    def __init__(self, file_tree, latency=0, errors=None):
+        self.latency = latency
+        self.errors = {path: list(codes) for path, codes in (errors or {}).items()}
+        self.listings = {}
+        folders = [file_tree]
+        while folders:
+            folder = folders.pop()
+            children = folder.get('children', [])
+            self.listings[folder['path']] = [
+                {key: value for key, value in child.items() if key != 'children'}
+                for child in children
+            ]
+            folders.extend(child for child in children if child['kind'] == 'folder')
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def respond(self, path):
+        with self._lock:
+            self.requests.append(path)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            errors = self.errors.get(path)
+            status = errors.pop(0) if errors else 200
+        try:
+            time.sleep(self.latency)
+            if status != 200:
+                return status, {'message': 'Fake error'}
+            if path not in self.listings:
+                return 404, {'message': 'Not found'}
+            return 200, {'data': self.listings[path]}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def __enter__(self):
+        waterbutler = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+                status, body = waterbutler.respond(query.get('path', ['/'])[0])
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(body))
+
+            def log_message(self, *args):
+                pass
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self._patch = mock.patch.object(
+            settings, 'WATERBUTLER_INTERNAL_URL', 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        )
+        self._patch.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
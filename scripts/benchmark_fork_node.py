@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Benchmark AbstractNode.fork_node on a deep project tree.
+
+Creates a project with ``--depth`` levels of components, ``--breadth`` components
+per node and ``--logs`` logs on every node, in a transaction that is rolled back
+at the end. It then forks the project ``--rounds`` times and reports the best
+wall-clock time, split into the bulk copy and the per-fork addon hooks, along
+with the number of queries each phase issued.
+
+The tree is made with the test factories, so this needs the development requirements::
+
+    python -m scripts.benchmark_fork_node --depth 6 --breadth 2
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import time
+
+import django
+django.setup()
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from osf.models import AbstractNode
+from osf.utils.auth import Auth
+from osf.utils.forks import NodeForker
+from osf_tests.factories import AuthUserFactory, make_node_tree
+from website.app import init_app
+
+
+class Rollback(Exception):
+    pass
+
+
+def timed(func):
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+    return elapsed, len(ctx.captured_queries)
+
+
+def fork(project, auth):
+    forker = NodeForker(project, auth)
+    results = {}
+    results['collect'] = timed(forker.collect)
+    results['copy'] = timed(forker.copy)
+    results['hooks'] = timed(forker.run_hooks)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Time forking a deep project tree.')
+    parser.add_argument('--depth', type=int, default=6, help='Levels of components below the project')
+    parser.add_argument('--breadth', type=int, default=2, help='Components per node')
+    parser.add_argument('--logs', type=int, default=50, help='Logs per node')
+    parser.add_argument('--rounds', type=int, default=3, help='Best of this many forks')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        with transaction.atomic():
+            user = AuthUserFactory()
+            project = make_node_tree(user, depth=args.depth, breadth=args.breadth, logs=args.logs)
+            nodes = AbstractNode.objects.filter(root=project).count()
+            runs = [fork(project, Auth(user)) for _ in range(args.rounds)]
+            raise Rollback
+    except Rollback:
+        pass
+
+    best = min(runs, key=lambda run: sum(elapsed for elapsed, queries in run.values()))
+    print('Forked {} nodes with {} logs each, best of {} rounds:'.format(nodes, args.logs, args.rounds))
+    for phase in ('collect', 'copy', 'hooks'):
+        elapsed, queries = best[phase]
+        print('  {:<8}{:.3f}s {:>6} queries'.format(phase, elapsed, queries))
+    print('  total   {:.3f}s'.format(sum(elapsed for elapsed, queries in best.values())))
+
+
+if __name__ == '__main__':
+    init_app(set_backends=True, routes=False)
+    main()
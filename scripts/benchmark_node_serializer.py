@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Benchmark JSONAPISerializer field plans on NodeSerializer.
+
+Creates ``--nodes`` public projects in a transaction that is rolled back at the end,
+then serializes them all with one serializer instance, the way a list response does,
+in two modes:
+
+* ``compiled``: the field plan is compiled once and reused for every node.
+* ``per-object``: the plan is discarded before every node, which is what
+  to_representation did before field plans existed.
+
+Both modes issue the same queries, so the difference in CPU time is the cost of
+recomputing sparse fieldsets, anonymization, embed validation and field kinds per node.
+
+Nodes are made with the test factories, so this needs the development requirements::
+
+    python -m scripts.benchmark_node_serializer --nodes 1000
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import os
+
+import django
+django.setup()
+
+from django.db import transaction
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+from api.nodes.serializers import NodeSerializer
+from osf.models import Node
+from osf_tests.factories import AuthUserFactory, ProjectFactory
+from website.app import init_app
+
+
+class Rollback(Exception):
+    pass
+
+
+def cpu_time():
+    user, system = os.times()[:2]
+    return user + system
+
+
+def make_request(version):
+    http_request = HttpRequest()
+    http_request.META['SERVER_NAME'] = 'localhost'
+    http_request.META['SERVER_PORT'] = 8000
+    request = Request(http_request)
+    request.parser_context['kwargs'] = {'version': 'v2'}
+    request.version = version
+    return request
+
+
+def serialize(nodes, request, recompile):
+    serializer = NodeSerializer(context={'request': request, 'envelope': None})
+    start = cpu_time()
+    for node in nodes:
+        if recompile:
+            serializer._field_plan = None
+        serializer.to_representation(node)
+    return cpu_time() - start
+
+
+def create_nodes(count):
+    creator = AuthUserFactory()
+    for i in range(count):
+        ProjectFactory(creator=creator, is_public=True, title='Benchmark project {}'.format(i))
+    return list(Node.objects.filter(creator=creator))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare NodeSerializer CPU time with and without reusing compiled field plans.')
+    parser.add_argument('--nodes', type=int, default=1000, help='Number of nodes to serialize')
+    parser.add_argument('--rounds', type=int, default=3, help='Best of this many rounds per mode')
+    parser.add_argument('--api-version', dest='api_version', default='2.0', help='API version to serialize as')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        with transaction.atomic():
+            nodes = create_nodes(args.nodes)
+            request = make_request(args.api_version)
+            # Warm up caches (guids, contenttypes, url resolvers) before timing
+            serialize(nodes, request, recompile=False)
+            results = {}
+            for mode, recompile in (('compiled', False), ('per-object', True)):
+                results[mode] = min(serialize(nodes, request, recompile) for _ in range(args.rounds))
+            raise Rollback
+    except Rollback:
+        pass
+
+    saved = results['per-object'] - results['compiled']
+    print('Serialized {} nodes, best of {} rounds (CPU seconds):'.format(len(nodes), args.rounds))
+    for mode in ('compiled', 'per-object'):
+        print('  {:<12}{:.3f}s ({:.3f}ms/node)'.format(mode, results[mode], results[mode] * 1000 / len(nodes)))
+    print('  saved       {:.3f}s ({:.1f}%)'.format(saved, 100 * saved / results['per-object'] if results['per-object'] else 0))
+
+
+if __name__ == '__main__':
+    init_app(set_backends=True, routes=False)
+    main()
@@ -1,21 +1,38 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-"""Generate a sitemap for osf.io"""
+"""Generate a sitemap for osf.io
+
+Each section (static pages, users, nodes, preprints) is written to its own
+numbered sitemap files of at most ``SITEMAP_URL_MAX`` URLs. The user, node and
+preprint sections are read in keyset chunks of ``SITEMAP_QUERY_CHUNK_SIZE`` rows
+with ``values_list`` and generated in up to ``SITEMAP_PROCESSES`` worker
+processes. The XML is streamed into the plain and gzipped files as it is built.
+
+With ``--incremental`` (or ``main(incremental=True)``), a file whose content has
+the same hash as in the previous run's ``sitemap_manifest.json`` is neither
+rewritten nor uploaded, and keeps its ``lastmod`` in the sitemap index.
+"""
 import boto3
 import datetime
 import gzip
+import hashlib
+import json
+import multiprocessing
 import os
-import shutil
+import sys
 import urlparse
-import xml
+from collections import OrderedDict
+from xml.sax.saxutils import escape
 
 import django
 django.setup()
 import logging
 
+from django import db
+
 from framework import sentry
 from framework.celery_tasks import app as celery_app
-from osf.models import OSFUser, AbstractNode, PreprintService, PreprintProvider
+from osf.models import OSFUser, AbstractNode, PreprintService
 from scripts import utils as script_utils
 from website import settings
 from website.app import init_app
@@ -23,12 +40,66 @@ from website.app import init_app
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+MANIFEST_FILE_NAME = 'sitemap_manifest.json'
+
+
+def chunked_values(queryset, fields, chunk_size=None):
+    """Yield ``values_list(*fields)`` rows of ``queryset`` in chunks ordered by id,
+    without loading model instances or holding the whole result at once.
+    """
+    chunk_size = chunk_size or settings.SITEMAP_QUERY_CHUNK_SIZE
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row[1:]
+        last_id = rows[-1][0]
+
+
+class SitemapFile(object):
+    """One sitemap file, streamed into ``<name>.xml`` and ``<name>.xml.gz`` at once.
+
+    Both are written next to their final paths and only moved into place by
+    ``commit``, so an unchanged file can be discarded without touching the old one.
+    """
+
+    def __init__(self, sitemap_dir, name):
+        self.name = name
+        self.path = os.path.join(sitemap_dir, name + '.xml')
+        self.zip_path = self.path + '.gz'
+        self._xml = open(self.path + '.tmp', 'wb')
+        # mtime=0 keeps the gzipped bytes of unchanged content the same between runs
+        self._zip = gzip.GzipFile(filename=name + '.xml', mode='wb', fileobj=open(self.zip_path + '.tmp', 'wb'), mtime=0)
+        self._hash = hashlib.sha1()
+        self.url_count = 0
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self._xml.write(data)
+        self._zip.write(data)
+        self._hash.update(data)
+
+    def close(self):
+        self._xml.close()
+        self._zip.close()
+        self._zip.fileobj.close()
+        return self._hash.hexdigest()
+
+    def commit(self):
+        os.rename(self.path + '.tmp', self.path)
+        os.rename(self.zip_path + '.tmp', self.zip_path)
+
+    def discard(self):
+        os.remove(self.path + '.tmp')
+        os.remove(self.zip_path + '.tmp')
+
 
 class Sitemap(object):
-    def __init__(self):
-        self.sitemap_count = 0
-        self.errors = 0
-        self.new_doc()
+    def __init__(self, incremental=False):
+        self.incremental = incremental
         self.sitemap_dir = os.path.join(settings.STATIC_FOLDER, 'sitemaps')
         if not os.path.exists(self.sitemap_dir):
             print('Creating sitemap directory at `{}`'.format(self.sitemap_dir))
@@ -37,59 +108,30 @@ class Sitemap(object):
             assert settings.SITEMAP_AWS_BUCKET, 'SITEMAP_AWS_BUCKET must be set for sitemap files to be sent to S3'
             assert settings.AWS_ACCESS_KEY_ID, 'AWS_ACCESS_KEY_ID must be set for sitemap files to be sent to S3'
             assert settings.AWS_SECRET_ACCESS_KEY, 'AWS_SECRET_ACCESS_KEY must be set for sitemap files to be sent to S3'
-            self.s3 = boto3.resource(
+        self.manifest = self.read_manifest() if incremental else {}
+
+    @property
+    def s3(self):
+        # Created on first use, in the process that uploads
+        if not hasattr(self, '_s3'):
+            self._s3 = boto3.resource(
                 's3',
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
                 region_name='us-east-1'
             )
+        return self._s3
 
-    def new_doc(self):
-        """Creates new sitemap document and resets the url_count."""
-        self.doc = xml.dom.minidom.Document()
-        self.urlset = self.doc.createElement('urlset')
-        self.urlset.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        self.doc.appendChild(self.urlset)
-        self.url_count = 0
-
-    def add_tag(self, name, text):
-        """Adds a tag to the current url"""
-        tag = self.doc.createElement(name)
-        self.url.appendChild(tag)
-        tag_text = self.doc.createTextNode(text)
-        tag.appendChild(tag_text)
-
-    def add_url(self, config):
-        """Adds a url to the current urlset"""
-        if self.url_count >= settings.SITEMAP_URL_MAX:
-            self.write_doc()
-            self.new_doc()
-        self.url = self.doc.createElement('url')
-        self.urlset.appendChild(self.url)
-
-        for k, v in config.iteritems():
-            self.add_tag(k, v)
-        self.url_count += 1
-
-    def write_doc(self):
-        """Writes and gzips each sitemap xml file"""
-        file_name = 'sitemap_{}.xml'.format(str(self.sitemap_count))
-        file_path = os.path.join(self.sitemap_dir, file_name)
-        zip_file_name = file_name + '.gz'
-        zip_file_path = file_path + '.gz'
-        print('Writing and gzipping `{}`: url_count = {}'.format(file_path, str(self.url_count)))
-
-        xml_str = self.doc.toprettyxml(indent="  ", encoding='utf-8')
-        with open(file_path, 'wb') as f:
-            f.write(xml_str)
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.sitemap_dir, MANIFEST_FILE_NAME)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
 
-        # Write zipped file
-        with open(file_path, 'rb') as f_in, gzip.open(zip_file_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        if settings.SITEMAP_TO_S3:
-            self.ship_to_s3(file_name, file_path)
-            self.ship_to_s3(zip_file_name, zip_file_path)
-        self.sitemap_count += 1
+    def write_manifest(self, manifest):
+        with open(os.path.join(self.sitemap_dir, MANIFEST_FILE_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
 
     def ship_to_s3(self, name, path):
         data = open(path, 'rb')
@@ -101,36 +143,138 @@ class Sitemap(object):
             sentry.log_message('ERROR: Sitemaps could not be uploaded to s3, see `generate_sitemap` logs')
         data.close()
 
-    def write_sitemap_index(self):
-        """Writes the index file for all of the sitemap files"""
-        doc = xml.dom.minidom.Document()
-        sitemap_index = self.doc.createElement('sitemapindex')
-        sitemap_index.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        doc.appendChild(sitemap_index)
-
-        for f in range(self.sitemap_count):
-            sitemap = doc.createElement('sitemap')
-            sitemap_index.appendChild(sitemap)
-
-            loc = doc.createElement('loc')
-            sitemap.appendChild(loc)
-            loc_text = self.doc.createTextNode(urlparse.urljoin(settings.DOMAIN, 'sitemaps/sitemap_{}.xml'.format(str(f))))
-            loc.appendChild(loc_text)
-
-            datemod = doc.createElement('lastmod')
-            sitemap.appendChild(datemod)
-            datemod_text = self.doc.createTextNode(datetime.datetime.now().strftime('%Y-%m-%d'))
-            datemod.appendChild(datemod_text)
+    def write_section(self, section):
+        """Write the sitemap files of ``section``. Returns the manifest entries of the
+        files written and the number of errors, and runs in a worker process.
+        """
+        writer = SectionWriter(self, section)
+        for config in SECTIONS[section](writer):
+            writer.add_url(config)
+        return writer.close(), writer.errors
 
+    def write_sitemap_index(self, manifest):
+        """Writes the index file for all of the sitemap files"""
         print('Writing `sitemap_index.xml`')
         file_name = 'sitemap_index.xml'
         file_path = os.path.join(self.sitemap_dir, file_name)
-        xml_str = doc.toprettyxml(indent="  ", encoding='utf-8')
         with open(file_path, 'wb') as f:
-            f.write(xml_str)
+            f.write(u'<?xml version="1.0" encoding="utf-8"?>\n<sitemapindex xmlns="{}">\n'.format(SITEMAP_NAMESPACE).encode('utf-8'))
+            for entry in manifest.values():
+                f.write(u'  <sitemap>\n    <loc>{}</loc>\n    <lastmod>{}</lastmod>\n  </sitemap>\n'.format(
+                    escape(urlparse.urljoin(settings.DOMAIN, 'sitemaps/{}.xml'.format(entry['name']))),
+                    entry['lastmod'],
+                ).encode('utf-8'))
+            f.write(u'</sitemapindex>\n'.encode('utf-8'))
         if settings.SITEMAP_TO_S3:
             self.ship_to_s3(file_name, file_path)
 
+    def remove_stale_files(self, manifest):
+        """Remove the files of a previous run that this run did not produce."""
+        current = set(manifest)
+        for file_name in os.listdir(self.sitemap_dir):
+            base_name = file_name.split('.', 1)[0]
+            if base_name.startswith('sitemap_') and base_name not in current and file_name not in ('sitemap_index.xml', MANIFEST_FILE_NAME):
+                os.remove(os.path.join(self.sitemap_dir, file_name))
+
+    def generate(self):
+        print('Generating Sitemap')
+
+        processes = settings.SITEMAP_PROCESSES
+        if multiprocessing.current_process().daemon:
+            # e.g. a celery prefork worker, whose processes may not have children
+            processes = 1
+        if processes > 1:
+            # Forked workers must not share the parent's database connection
+            db.connections.close_all()
+            pool = multiprocessing.Pool(min(processes, len(SECTIONS)))
+            try:
+                results = pool.map(_write_section, [(self, section) for section in SECTIONS])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.write_section(section) for section in SECTIONS]
+
+        manifest = OrderedDict()
+        errors = 0
+        for entries, section_errors in results:
+            manifest.update((entry['name'], entry) for entry in entries)
+            errors += section_errors
+
+        self.remove_stale_files(manifest)
+        self.write_manifest(manifest)
+        # Create index file
+        self.write_sitemap_index(manifest)
+
+        # TODO: once the sitemap is validated add a ping to google with sitemap index file location
+        # Sitemap indexable limit check
+        if len(manifest) > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
+            sentry.log_message('WARNING: Max sitemaps nearly reached.')
+        print('Total url_count = {}'.format(sum(entry['url_count'] for entry in manifest.values())))
+        print('Total sitemap_count = {}'.format(len(manifest)))
+        if errors:
+            sentry.log_message('WARNING: Generate sitemap encountered errors. See logs for details.')
+            print('Total errors = {}'.format(str(errors)))
+        else:
+            print('No errors')
+
+
+def _write_section(args):
+    sitemap, section = args
+    return sitemap.write_section(section)
+
+
+class SectionWriter(object):
+    """Streams the ``<url>`` entries of one section into ``sitemap_<section>_<n>.xml`` files."""
+
+    def __init__(self, sitemap, section):
+        self.sitemap = sitemap
+        self.section = section
+        self.errors = 0
+        self.entries = []
+        self.file = None
+
+    def add_url(self, config):
+        """Adds a url to the current sitemap file"""
+        if self.file is None or self.file.url_count >= settings.SITEMAP_URL_MAX:
+            self.close_file()
+            self.file = SitemapFile(self.sitemap.sitemap_dir, 'sitemap_{}_{}'.format(self.section, len(self.entries)))
+            self.file.write(u'<?xml version="1.0" encoding="utf-8"?>\n<urlset xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+        self.file.write(u'  <url>\n{}  </url>\n'.format(u''.join(
+            u'    <{0}>{1}</{0}>\n'.format(key, escape(value)) for key, value in config.items()
+        )))
+        self.file.url_count += 1
+
+    def close_file(self):
+        """Writes and gzips the current sitemap file, unless it is unchanged"""
+        sitemap_file, self.file = self.file, None
+        if sitemap_file is None:
+            return
+        sitemap_file.write(u'</urlset>\n')
+        content_hash = sitemap_file.close()
+        previous = self.sitemap.manifest.get(sitemap_file.name)
+        entry = {
+            'name': sitemap_file.name,
+            'hash': content_hash,
+            'url_count': sitemap_file.url_count,
+            'lastmod': datetime.datetime.now().strftime('%Y-%m-%d'),
+        }
+        if previous and previous['hash'] == content_hash and os.path.exists(sitemap_file.zip_path):
+            print('Skipping unchanged `{}`'.format(sitemap_file.path))
+            sitemap_file.discard()
+            entry['lastmod'] = previous['lastmod']
+        else:
+            print('Writing and gzipping `{}`: url_count = {}'.format(sitemap_file.path, sitemap_file.url_count))
+            sitemap_file.commit()
+            if settings.SITEMAP_TO_S3:
+                self.sitemap.ship_to_s3(os.path.basename(sitemap_file.path), sitemap_file.path)
+                self.sitemap.ship_to_s3(os.path.basename(sitemap_file.zip_path), sitemap_file.zip_path)
+        self.entries.append(entry)
+
+    def close(self):
+        self.close_file()
+        return self.entries
+
     def log_errors(self, obj, obj_id, error):
         if not self.errors:
             script_utils.add_file_logger(logger, __file__)
@@ -145,115 +289,97 @@ class Sitemap(object):
             sentry.log_message('ERROR: generate_sitemap stopped execution after reaching 1000 errors. See logs for details.')
             raise Exception('Too many errors generating sitemap.')
 
-    def generate(self):
-        print('Generating Sitemap')
 
-        # Progress bar
-        progress = script_utils.Progress()
-
-        # Static urls
-        progress.start(len(settings.SITEMAP_STATIC_URLS), 'STAT: ')
-        for config in settings.SITEMAP_STATIC_URLS:
-            config['loc'] = urlparse.urljoin(settings.DOMAIN, config['loc'])
-            self.add_url(config)
-            progress.increment()
-        progress.stop()
-
-        # User urls
-        objs = OSFUser.objects.filter(is_active=True).values_list('guids___id', flat=True)
-        progress.start(objs.count(), 'USER: ')
-        for obj in objs:
-            try:
-                config = settings.SITEMAP_USER_CONFIG
-                config['loc'] = urlparse.urljoin(settings.DOMAIN, '/{}/'.format(obj))
-                self.add_url(config)
-            except Exception as e:
-                self.log_errors('USER', obj, e)
-            progress.increment()
-        progress.stop()
-
-        # AbstractNode urls (Nodes and Registrations, no Collections)
-        objs = (AbstractNode.objects
-            .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
-            .exclude(type__in=["osf.collection", "osf.quickfilesnode"])
-            .values('guids___id', 'date_modified'))
-        progress.start(objs.count(), 'NODE: ')
-        for obj in objs:
-            try:
-                config = settings.SITEMAP_NODE_CONFIG
-                config['loc'] = urlparse.urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id']))
-                config['lastmod'] = obj['date_modified'].strftime('%Y-%m-%d')
-                self.add_url(config)
-            except Exception as e:
-                self.log_errors('NODE', obj['guids___id'], e)
-            progress.increment()
-        progress.stop()
-
-        # Preprint urls
-        objs = (PreprintService.objects
-                    .filter(node__isnull=False, node__is_deleted=False, node__is_public=True, is_published=True)
-                    .select_related('node', 'provider', 'node__preprint_file'))
-        progress.start(objs.count() * 2, 'PREP: ')
-        osf = PreprintProvider.objects.get(_id='osf')
-        for obj in objs:
-            try:
-                preprint_date = obj.date_modified.strftime('%Y-%m-%d')
-                config = settings.SITEMAP_PREPRINT_CONFIG
-                preprint_url = obj.url
-                provider = obj.provider
-                domain = provider.domain if (provider.domain_redirect_enabled and provider.domain) else settings.DOMAIN
-                if provider == osf:
-                    preprint_url = '/preprints/{}/'.format(obj._id)
-                config['loc'] = urlparse.urljoin(domain, preprint_url)
-                config['lastmod'] = preprint_date
-                self.add_url(config)
-
-                # Preprint file urls
-                try:
-                    file_config = settings.SITEMAP_PREPRINT_FILE_CONFIG
-                    file_config['loc'] = urlparse.urljoin(
-                        settings.DOMAIN,
-                        os.path.join(
-                            'project',
-                            obj.node._id,   # Parent node id
-                            'files',
-                            'osfstorage',
-                            obj.primary_file._id,  # Preprint file deep_url
-                            '?action=download'
-                        )
-                    )
-                    file_config['lastmod'] = preprint_date
-                    self.add_url(file_config)
-                except Exception as e:
-                    self.log_errors(obj.primary_file, obj.primary_file._id, e)
-            except Exception as e:
-                self.log_errors(obj, obj._id, e)
-            progress.increment(2)
-        progress.stop()
-
-        # Final write
-        self.write_doc()
-        # Create index file
-        self.write_sitemap_index()
+def static_urls(writer):
+    for config in settings.SITEMAP_STATIC_URLS:
+        config = OrderedDict(config)
+        config['loc'] = urlparse.urljoin(settings.DOMAIN, config['loc'])
+        yield config
+
+
+def user_urls(writer):
+    users = OSFUser.objects.filter(is_active=True)
+    for guid, in chunked_values(users, ['guids___id']):
+        try:
+            config = OrderedDict(settings.SITEMAP_USER_CONFIG)
+            config['loc'] = urlparse.urljoin(settings.DOMAIN, '/{}/'.format(guid))
+            yield config
+        except Exception as e:
+            writer.log_errors('USER', guid, e)
+
+
+def node_urls(writer):
+    # AbstractNode urls (Nodes and Registrations, no Collections)
+    nodes = (AbstractNode.objects
+        .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
+        .exclude(type__in=['osf.collection', 'osf.quickfilesnode']))
+    for guid, date_modified in chunked_values(nodes, ['guids___id', 'date_modified']):
+        try:
+            config = OrderedDict(settings.SITEMAP_NODE_CONFIG)
+            config['loc'] = urlparse.urljoin(settings.DOMAIN, '/{}/'.format(guid))
+            config['lastmod'] = date_modified.strftime('%Y-%m-%d')
+            yield config
+        except Exception as e:
+            writer.log_errors('NODE', guid, e)
+
+
+def preprint_urls(writer):
+    preprints = PreprintService.objects.filter(node__isnull=False, node__is_deleted=False, node__is_public=True, is_published=True)
+    fields = [
+        'guids___id', 'date_modified', 'provider___id', 'provider__domain', 'provider__domain_redirect_enabled',
+        'node__guids___id', 'node__preprint_file___id',
+    ]
+    for guid, date_modified, provider_id, domain, domain_redirect_enabled, node_guid, file_id in chunked_values(preprints, fields):
+        try:
+            preprint_date = date_modified.strftime('%Y-%m-%d')
+            # See PreprintService.url
+            redirect = domain_redirect_enabled and domain
+            if provider_id == 'osf':
+                preprint_url = '/preprints/{}/'.format(guid)
+            elif redirect:
+                preprint_url = '/{}/'.format(guid)
+            else:
+                preprint_url = '/preprints/{}/{}/'.format(provider_id, guid)
+            config = OrderedDict(settings.SITEMAP_PREPRINT_CONFIG)
+            config['loc'] = urlparse.urljoin(domain if redirect else settings.DOMAIN, preprint_url)
+            config['lastmod'] = preprint_date
+            yield config
+
+            # Preprint file urls
+            if not file_id:
+                writer.log_errors('PREPRINT FILE', guid, ValueError('Preprint has no primary file'))
+                continue
+            file_config = OrderedDict(settings.SITEMAP_PREPRINT_FILE_CONFIG)
+            file_config['loc'] = urlparse.urljoin(
+                settings.DOMAIN,
+                os.path.join(
+                    'project',
+                    node_guid,   # Parent node id
+                    'files',
+                    'osfstorage',
+                    file_id,  # Preprint file deep_url
+                    '?action=download'
+                )
+            )
+            file_config['lastmod'] = preprint_date
+            yield file_config
+        except Exception as e:
+            writer.log_errors('PREPRINT', guid, e)
+
+
+SECTIONS = OrderedDict([
+    ('static', static_urls),
+    ('users', user_urls),
+    ('nodes', node_urls),
+    ('preprints', preprint_urls),
+])
 
-        # TODO: once the sitemap is validated add a ping to google with sitemap index file location
-        # TODO: server side cursor query wrapper might be useful as the index gets larger.
-        # Sitemap indexable limit check
-        if self.sitemap_count > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
-            sentry.log_message('WARNING: Max sitemaps nearly reached.')
-        print('Total url_count = {}'.format((self.sitemap_count - 1) * settings.SITEMAP_URL_MAX + self.url_count))
-        print('Total sitemap_count = {}'.format(str(self.sitemap_count)))
-        if self.errors:
-            sentry.log_message('WARNING: Generate sitemap encountered errors. See logs for details.')
-            print('Total errors = {}'.format(str(self.errors)))
-        else:
-            print('No errors')
 
 @celery_app.task(name='scripts.generate_sitemap')
-def main():
+def main(incremental=False):
     init_app(routes=False)  # Sets the storage backends on all models
-    Sitemap().generate()
+    Sitemap(incremental=incremental).generate()
 
 if __name__ == '__main__':
     init_app(set_backends=True, routes=False)
-    main()
+    main(incremental='--incremental' in sys.argv)
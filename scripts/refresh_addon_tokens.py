@@ -3,19 +3,23 @@
 
 import logging
 import math
-import time
+from multiprocessing.pool import ThreadPool
+
 from django.utils import timezone
 
 import django
 from oauthlib.oauth2 import OAuth2Error
 from dateutil.relativedelta import relativedelta
 django.setup()
+from django.db import connection
 
 from framework.celery_tasks import app as celery_app
 
 from scripts import utils as scripts_utils
 
+from website import settings
 from website.app import init_app
+from addons.base.crawler import TokenBucket
 from addons.box.models import Provider as Box
 from addons.googledrive.models import GoogleDriveProvider
 from addons.mendeley.models import Mendeley
@@ -42,50 +46,113 @@ def get_targets(delta, addon_short_name):
         provider=addon_short_name
     )
 
-def main(delta, Provider, rate_limit, dry_run):
-    allowance = rate_limit[0]
-    last_call = time.time()
-    for record in get_targets(delta, Provider.short_name):
-        if Provider(record).has_expired_credentials:
-            logger.info(
-                'Found expired record {}, skipping'.format(record.__repr__())
-            )
-            continue
+SAVE_TOKENS_SQL = """
+    UPDATE osf_externalaccount AS A
+    SET oauth_key = V.oauth_key
+      , refresh_token = V.refresh_token
+      , expires_at = V.expires_at :: TIMESTAMPTZ
+      , date_last_refreshed = V.date_last_refreshed :: TIMESTAMPTZ
+    FROM (VALUES {values}) AS V (id, oauth_key, refresh_token, expires_at, date_last_refreshed)
+    WHERE A.id = V.id;
+"""
+
+def iter_target_chunks(delta, addon_short_name, chunk_size=None):
+    """Yield the target accounts in chunks ordered by id"""
+    chunk_size = chunk_size or settings.OAUTH_REFRESH_BATCH_SIZE
+    last_id = 0
+    while True:
+        chunk = list(get_targets(delta, addon_short_name).filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+def save_tokens(records):
+    """Write the refreshed tokens of ``records`` with one query"""
+    if not records:
+        return
+    fields = [ExternalAccount._meta.get_field(name) for name in ('oauth_key', 'refresh_token')]
+    params = []
+    for record in records:
+        params.append(record.id)
+        params.extend(field.get_db_prep_value(getattr(record, field.name), connection=connection) for field in fields)
+        params.extend([record.expires_at, record.date_last_refreshed])
+    with connection.cursor() as cursor:
+        cursor.execute(SAVE_TOKENS_SQL.format(values=', '.join(['(%s, %s, %s, %s, %s)'] * len(records))), params)
 
+def refresh_tokens(Provider, records, bucket):
+    """Refresh the tokens of ``records`` with up to OAUTH_REFRESH_CONCURRENCY threads.
+    The threads only talk to the provider; the new tokens are saved together afterwards,
+    even if a refresh fails, since the provider may already have revoked the old ones.
+    """
+    def refresh(record):
+        bucket.acquire()
+        try:
+            return Provider(record).refresh_oauth_key(force=True, save=False)
+        except OAuth2Error as e:
+            logger.error(e)
+            return False
+        except Exception as e:
+            logger.exception(e)
+            return False
+
+    refreshed = []
+
+    def collect(record, success):
         logger.info(
-            'Refreshing tokens on record {0}; expires at {1}'.format(
+            'Status of record {}: {}'.format(
                 record.__repr__(),
-                record.expires_at.strftime('%c')
-            )
+                'SUCCESS' if success else 'FAILURE')
         )
-        if not dry_run:
-            if allowance < 1:
-                try:
-                    time.sleep(rate_limit[1] - (time.time() - last_call))
-                except (ValueError, IOError):
-                    pass  # Value/IOError indicates negative sleep time in Py 3.5/2.7, respectively
-                allowance = rate_limit[0]
-
-            allowance -= 1
-            last_call = time.time()
-            success = False
+        if success:
+            refreshed.append(record)
+
+    try:
+        if settings.OAUTH_REFRESH_CONCURRENCY > 1:
+            pool = ThreadPool(settings.OAUTH_REFRESH_CONCURRENCY)
             try:
-                success = Provider(record).refresh_oauth_key(force=True)
-            except OAuth2Error as e:
-                logger.error(e)
-            else:
+                for record, success in zip(records, pool.imap(refresh, records)):
+                    collect(record, success)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for record in records:
+                collect(record, refresh(record))
+    finally:
+        save_tokens(refreshed)
+    return refreshed
+
+def main(delta, Provider, rate_limit, dry_run):
+    """
+    :param tuple rate_limit: of form (<requests>, <seconds>), shared by all refreshing threads
+    """
+    bucket = TokenBucket(rate=rate_limit[0] / float(rate_limit[1]), capacity=rate_limit[0])
+    for records in iter_target_chunks(delta, Provider.short_name):
+        to_refresh = []
+        for record in records:
+            if Provider(record).has_expired_credentials:
                 logger.info(
-                    'Status of record {}: {}'.format(
-                        record.__repr__(),
-                        'SUCCESS' if success else 'FAILURE')
+                    'Found expired record {}, skipping'.format(record.__repr__())
                 )
+                continue
+
+            logger.info(
+                'Refreshing tokens on record {0}; expires at {1}'.format(
+                    record.__repr__(),
+                    record.expires_at.strftime('%c')
+                )
+            )
+            to_refresh.append(record)
+        if not dry_run:
+            refresh_tokens(Provider, to_refresh, bucket)
 
 
 @celery_app.task(name='scripts.refresh_addon_tokens')
 def run_main(addons=None, rate_limit=(5, 1), dry_run=True):
     """
     :param dict addons: of form {'<addon_short_name>': int(<refresh_token validity duration in days>)}
-    :param tuple rate_limit: of form (<requests>, <seconds>). Default is five per second
+    :param tuple rate_limit: of form (<requests>, <seconds>), per provider. Default is five per second
     """
     init_app(set_backends=True, routes=False)
     if not dry_run:
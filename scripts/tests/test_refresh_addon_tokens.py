@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import mock
+from oauthlib.oauth2 import OAuth2Error
+from requests.exceptions import ConnectionError
 from django.utils import timezone
 from nose.tools import *  # noqa
 
@@ -17,7 +19,7 @@ from dateutil.relativedelta import relativedelta
 from website.oauth.models import ExternalAccount
 
 from scripts.refresh_addon_tokens import (
-    get_targets, main, look_up_provider, PROVIDER_CLASSES
+    get_targets, main, look_up_provider, save_tokens, Box, PROVIDER_CLASSES
 )
 
 
@@ -74,3 +76,66 @@ class TestRefreshTokens(OsfTestCase):
         assert_equal(1, mock_box_refresh.call_count)
         assert_equal(1, mock_drive_refresh.call_count)
         assert_equal(1, mock_mendeley_refresh.call_count)
+
+    @mock.patch('scripts.refresh_addon_tokens.settings.OAUTH_REFRESH_BATCH_SIZE', 2)
+    def test_refresh_saves_tokens_in_batches(self):
+        records = [
+            BoxAccountFactory(date_last_refreshed=timezone.now() - datetime.timedelta(days=4))
+            for _ in range(3)
+        ]
+        refreshed_at = timezone.now()
+
+        def refresh(provider, force=False, save=True):
+            assert_false(save)
+            provider.account.oauth_key = 'new_key_{}'.format(provider.account.id)
+            provider.account.refresh_token = 'new_refresh_{}'.format(provider.account.id)
+            provider.account.expires_at = refreshed_at + datetime.timedelta(hours=1)
+            provider.account.date_last_refreshed = refreshed_at
+            return True
+
+        with mock.patch('scripts.refresh_addon_tokens.save_tokens', wraps=save_tokens) as mock_save:
+            with mock.patch.object(Box, 'refresh_oauth_key', autospec=True, side_effect=refresh):
+                main(delta=relativedelta(days=3), Provider=Box, rate_limit=(5, 1), dry_run=False)
+
+        assert_equal(mock_save.call_count, 2)
+        for record in records:
+            record.reload()
+            assert_equal(record.oauth_key, 'new_key_{}'.format(record.id))
+            assert_equal(record.refresh_token, 'new_refresh_{}'.format(record.id))
+            assert_true(record.date_last_refreshed > timezone.now() - datetime.timedelta(days=1))
+
+    @mock.patch('scripts.refresh_addon_tokens.Box.refresh_oauth_key')
+    def test_refresh_error_does_not_save(self, mock_box_refresh):
+        mock_box_refresh.side_effect = OAuth2Error()
+        record = BoxAccountFactory(date_last_refreshed=timezone.now() - datetime.timedelta(days=4))
+        old_key = record.oauth_key
+
+        main(delta=relativedelta(days=3), Provider=Box, rate_limit=(5, 1), dry_run=False)
+        record.reload()
+
+        assert_equal(1, mock_box_refresh.call_count)
+        assert_equal(record.oauth_key, old_key)
+
+    @mock.patch('scripts.refresh_addon_tokens.settings.OAUTH_REFRESH_CONCURRENCY', 2)
+    def test_refresh_error_does_not_lose_other_tokens(self):
+        records = [
+            BoxAccountFactory(date_last_refreshed=timezone.now() - datetime.timedelta(days=4))
+            for _ in range(3)
+        ]
+        broken = records[1]
+        old_key = broken.oauth_key
+
+        def refresh(provider, force=False, save=True):
+            if provider.account.id == broken.id:
+                raise ConnectionError('connection reset')
+            provider.account.oauth_key = 'new_key_{}'.format(provider.account.id)
+            return True
+
+        with mock.patch.object(Box, 'refresh_oauth_key', autospec=True, side_effect=refresh):
+            main(delta=relativedelta(days=3), Provider=Box, rate_limit=(5, 1), dry_run=False)
+
+        for record in records:
+            record.reload()
+        assert_equal(records[0].oauth_key, 'new_key_{}'.format(records[0].id))
+        assert_equal(records[2].oauth_key, 'new_key_{}'.format(records[2].id))
+        assert_equal(broken.oauth_key, old_key)
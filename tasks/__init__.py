@@ -278,8 +278,12 @@ def elasticsearch(ctx):
         print('Your system is not recognized, you will have to start elasticsearch manually')
 
 @task
-def migrate_search(ctx, delete=False, index=settings.ELASTIC_INDEX):
-    """Migrate the search-enabled models."""
+def migrate_search(ctx, delete=False, index=settings.ELASTIC_INDEX, workers=0, resume=False):
+    """Migrate the search-enabled models.
+
+    Pass --workers=N to reindex in N parallel processes; --resume continues an
+    interrupted parallel run.
+    """
     from website.app import init_app
     init_app(routes=False, set_backends=False)
     from website.search_migration.migrate import migrate
@@ -290,7 +294,7 @@ def migrate_search(ctx, delete=False, index=settings.ELASTIC_INDEX):
     for logger in SILENT_LOGGERS:
         logging.getLogger(logger).setLevel(logging.ERROR)
 
-    migrate(delete, index=index)
+    migrate(delete, index=index, workers=int(workers), resume=resume)
 
 
 @task
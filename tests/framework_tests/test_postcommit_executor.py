@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import gevent
+import mock
+from nose.tools import *  # noqa (PEP8 asserts)
+
+from framework.postcommit_tasks.executor import PostcommitExecutor
+
+
+def make_executor(**kwargs):
+    defaults = dict(size=2, max_queue_size=10, task_timeout=1.0, queue_timeout=0.1)
+    defaults.update(kwargs)
+    return PostcommitExecutor(**defaults)
+
+
+@mock.patch('framework.postcommit_tasks.executor.close_old_connections', mock.Mock())
+@mock.patch('framework.postcommit_tasks.executor.log_exception', mock.Mock())
+class TestPostcommitExecutor(unittest.TestCase):
+
+    def test_async_submit_does_not_run_inline(self):
+        executor = make_executor()
+        calls = []
+        executor.submit(lambda: calls.append(1))
+        assert_equal(calls, [])
+        assert_true(executor.join(timeout=1))
+        assert_equal(calls, [1])
+        assert_equal(executor.stats()['completed'], 1)
+        assert_equal(executor.stats()['queue_depth'], 0)
+
+    def test_synchronous_mode_runs_inline_and_reraises(self):
+        executor = make_executor(synchronous=True)
+        calls = []
+        executor.submit(lambda: calls.append(1))
+        assert_equal(calls, [1])
+
+        def fail():
+            raise ValueError()
+        with assert_raises(ValueError):
+            executor.submit(fail)
+        assert_equal(executor.stats()['failed'], 1)
+
+    def test_failures_and_timeouts_are_counted(self):
+        executor = make_executor(task_timeout=0.05)
+
+        def fail():
+            raise ValueError()
+        executor.submit(fail)
+        executor.submit(lambda: gevent.sleep(1))
+        executor.join(timeout=1)
+        stats = executor.stats()
+        assert_equal(stats['failed'], 1)
+        assert_equal(stats['timed_out'], 1)
+        assert_greater(stats['max_latency'], 0)
+
+    def test_full_queue_runs_task_inline(self):
+        executor = make_executor(size=1, max_queue_size=1, queue_timeout=0.01)
+        # Keep the single worker from draining the queue
+        with mock.patch.object(executor, '_ensure_workers'):
+            calls = []
+            executor.submit(lambda: calls.append('queued'))
+            executor.submit(lambda: calls.append('inline'))
+        assert_equal(calls, ['inline'])
+        assert_equal(executor.stats()['overflowed'], 1)
+        assert_equal(executor.stats()['queue_depth'], 1)
@@ -1,8 +1,11 @@
 import os
 import json
+import mock
+from django.core.cache import cache
 from nose.tools import *
 
-from api.citations.utils import render_citation
+from api.citations import utils as citation_utils
+from api.citations.utils import render_citation, render_citations
 
 
 class Node:
@@ -43,3 +46,49 @@ class TestCiteprocpy:
                 print k
         assert(len(not_matches) == 0)
 
+
+
+class OtherNode:
+    _id = 'm2n4b'
+    csl = dict(Node.csl, id=u'm2n4b', title=u'The study of vanilla')
+
+
+class TestCitationCaches:
+    def setup(self):
+        citation_utils._styles.clear()
+        cache.clear()
+
+    def test_parsed_style_is_reused(self):
+        with mock.patch.object(citation_utils, 'CitationStylesStyle', wraps=citation_utils.CitationStylesStyle) as parse:
+            assert_equal(citation_utils.get_style('apa'), citation_utils.get_style('apa'))
+        assert_equal(parse.call_count, 1)
+
+    def test_changed_style_file_is_parsed_again(self):
+        style = citation_utils.get_style('apa')
+        path = citation_utils._styles.keys()[0]
+        citation_utils._styles[path] = (0, style)
+        with mock.patch.object(citation_utils, 'CitationStylesStyle', wraps=citation_utils.CitationStylesStyle) as parse:
+            citation_utils.get_style('apa')
+        assert_equal(parse.call_count, 1)
+
+    def test_unknown_style(self):
+        with assert_raises(ValueError):
+            citation_utils.get_style('not-a-style')
+
+    def test_rendered_citation_is_cached_until_csl_changes(self):
+        node = Node()
+        citation = render_citation(node, 'apa')
+        with mock.patch.object(citation_utils, '_render') as render:
+            assert_equal(render_citation(node, 'apa'), citation)
+        assert_false(render.called)
+
+        node.csl = dict(Node.csl, title=u'The study of chocolate in its few forms')
+        assert_in(u'few forms', render_citation(node, 'apa'))
+
+    def test_render_citations(self):
+        node, other_node = Node(), OtherNode()
+        render_citation(node, 'apa')
+        citations = render_citations([node, other_node], 'apa')
+        assert_equal(citations.keys(), [node._id, other_node._id])
+        assert_equal(citations[node._id], render_citation(node, 'apa'))
+        assert_in(u'vanilla', citations[other_node._id])
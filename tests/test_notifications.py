@@ -2,6 +2,8 @@ import collections
 import mock
 from babel import dates, Locale
 from schema import Schema, And, Use, Or
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from osf.modm_compat import Q
@@ -1230,6 +1232,36 @@ class TestCompileSubscriptions(NotificationTestCase):
         subs = emails.compile_subscriptions(node5, 'file_updated')
         assert_equal(subs, {'email_transactional': [], 'email_digest': [self.user_1._id], 'none': []})
 
+    def test_event_subscription_overrides_node_subscription(self):
+        self.base_sub.email_transactional.add(self.user_1)
+        self.shared_sub.email_transactional.add(self.user_1)
+        file_sub = factories.NotificationSubscriptionFactory(
+            _id=self.shared_node._id + '_xyz42_file_updated',
+            node=self.shared_node,
+            event_name='xyz42_file_updated'
+        )
+        file_sub.email_digest.add(self.user_1)
+        result = emails.compile_subscriptions(self.shared_node, 'file_updated', 'xyz42_file_updated')
+        assert_equal({'email_transactional': [], 'none': [], 'email_digest': [self.user_1._id]}, result)
+
+    def test_admin_of_parent_is_listed(self):
+        # user_4 is not a contributor on the child, but administers its parent
+        self.base_project.add_contributor(self.user_4, permissions='admin')
+        self.base_sub.email_digest.add(self.user_4)
+        result = emails.compile_subscriptions(self.private_node, 'file_updated')
+        assert_equal({'email_transactional': [], 'none': [], 'email_digest': [self.user_4._id]}, result)
+
+    def test_subscriptions_are_compiled_with_one_query(self):
+        self.base_sub.email_transactional.add(self.user_1)
+        node = self.shared_node
+        for _ in range(4):
+            node = factories.NodeFactory(parent=node)
+        emails.compile_subscriptions(node, 'file_updated')
+        with CaptureQueriesContext(connection) as queries:
+            subs = emails.compile_subscriptions(node, 'file_updated')
+        assert_equal(subs, {'email_transactional': [self.user_1._id], 'email_digest': [], 'none': []})
+        assert_equal(len(queries), 1)
+
 
 class TestMoveSubscription(NotificationTestCase):
     def setUp(self):
@@ -1389,6 +1421,21 @@ class TestSendEmails(NotificationTestCase):
         self.user_subscription.email_transactional.add(self.user)
         self.user_subscription.save()
 
+    @mock.patch('website.mails.render_message', return_value='message')
+    def test_store_emails(self, mock_render):
+        time_now = timezone.now()
+        recipients = [factories.UserFactory(), factories.UserFactory()]
+        emails.store_emails(
+            [recipient._id for recipient in recipients] + [self.user._id],
+            'email_digest', 'comments', self.user, self.node, time_now
+        )
+        digests = NotificationDigest.objects.filter(event='comments')
+        assert_equal(set(digest.user for digest in digests), set(recipients))
+        assert_equal(mock_render.call_count, 2)
+        for digest in digests:
+            assert_equal(digest.send_type, 'email_digest')
+            assert_equal(digest.node_lineage, [self.project._id, self.node._id])
+
     @mock.patch('website.notifications.emails.store_emails')
     def test_notify_no_subscription(self, mock_store):
         node = factories.ProjectFactory()
@@ -1779,6 +1826,65 @@ class TestSendDigest(OsfTestCase):
         message = group_by_node(user_groups[last_user_index]['info'])
         assert_equal(kwargs['message'], message)
 
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_sends_in_chunks_and_removes_sent_digests(self, mock_send_mail):
+        send_type = 'email_transactional'
+        sent = [
+            factories.NotificationDigestFactory(user=user, send_type=send_type, timestamp=self.timestamp,
+                                                message='Hello', node_lineage=[self.project._id])
+            for user in [self.user_1, self.user_1, self.user_2]
+        ]
+        kept = factories.NotificationDigestFactory(user=self.user_2, send_type='email_digest', timestamp=self.timestamp,
+                                                   message='Hello', node_lineage=[self.project._id])
+        with mock.patch.object(settings, 'NOTIFICATION_DIGEST_CHUNK_SIZE', 1):
+            send_users_email(send_type)
+
+        assert_equal(mock_send_mail.call_count, 2)
+        assert_equal(
+            sorted(kwargs['to_addr'] for args, kwargs in mock_send_mail.call_args_list),
+            sorted([self.user_1.username, self.user_2.username])
+        )
+        assert_false(NotificationDigest.objects.filter(_id__in=[d._id for d in sent]).exists())
+        assert_true(NotificationDigest.objects.filter(_id=kept._id).exists())
+
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_keeps_digests_that_failed_to_send(self, mock_send_mail):
+        send_type = 'email_transactional'
+        failed = factories.NotificationDigestFactory(user=self.user_1, send_type=send_type, timestamp=self.timestamp,
+                                                     message='Hello', node_lineage=[self.project._id])
+        sent = factories.NotificationDigestFactory(user=self.user_2, send_type=send_type, timestamp=self.timestamp,
+                                                   message='Hello', node_lineage=[self.project._id])
+        mock_send_mail.side_effect = lambda **kwargs: self.fail_for(kwargs['to_addr'], self.user_1.username)
+        send_users_email(send_type)
+
+        assert_equal(mock_send_mail.call_count, 2)
+        assert_false(NotificationDigest.objects.filter(_id=sent._id).exists())
+        kept = NotificationDigest.objects.get(_id=failed._id)
+        assert_equal((kept.user, kept.message, kept.node_lineage), (self.user_1, 'Hello', [self.project._id]))
+
+    @mock.patch('website.notifications.tasks.log_exception')
+    @mock.patch('website.notifications.tasks.OSFUser')
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_keeps_digests_of_missing_users(self, mock_send_mail, mock_user, mock_log_exception):
+        send_type = 'email_transactional'
+        missing = factories.NotificationDigestFactory(user=self.user_1, send_type=send_type, timestamp=self.timestamp,
+                                                      message='Hello', node_lineage=[self.project._id])
+        sent = factories.NotificationDigestFactory(user=self.user_2, send_type=send_type, timestamp=self.timestamp,
+                                                   message='Hello', node_lineage=[self.project._id])
+        mock_user.objects.filter.return_value.in_bulk.return_value = {self.user_2.id: self.user_2}
+        send_users_email(send_type)
+
+        assert_equal(mock_send_mail.call_count, 1)
+        assert_true(mock_log_exception.called)
+        assert_false(NotificationDigest.objects.filter(_id=sent._id).exists())
+        kept = NotificationDigest.objects.get(_id=missing._id)
+        assert_equal((kept.user, kept.message), (self.user_1, 'Hello'))
+
+    @staticmethod
+    def fail_for(to_addr, failing_addr):
+        if to_addr == failing_addr:
+            raise IOError('Could not connect')
+
     def test_remove_sent_digest_notifications(self):
         d = factories.NotificationDigestFactory(
             event='comment_replies',
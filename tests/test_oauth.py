@@ -6,14 +6,18 @@ import time
 import urlparse
 
 import httpretty
+import mock
 from nose.tools import *  # noqa
 import pytz
 from oauthlib.oauth2 import OAuth2Error
 
+from django.core.cache import cache
+
 from framework.auth import authenticate
 from framework.exceptions import PermissionsError, HTTPError
 from framework.sessions import session
-from osf.models.external import ExternalAccount, ExternalProvider, OAUTH1, OAUTH2
+from osf.models.external import ExternalAccount, ExternalProvider, OAUTH1, OAUTH2, REFRESH_AHEAD_LOCK_KEY
+from website.oauth.tasks import refresh_external_account
 from website.util import api_url_for, web_url_for
 
 from tests.base import OsfTestCase
@@ -741,3 +745,82 @@ class TestExternalProviderOAuth2(OsfTestCase):
 
         with assert_raises(OAuth2Error):
             self.provider.refresh_oauth_key(force=True)
+
+    def _due_account(self, expires_in):
+        return ExternalAccountFactory(
+            provider='mock2',
+            provider_id='mock_provider_id',
+            provider_name='Mock Provider',
+            oauth_key='old_key',
+            oauth_secret='old_secret',
+            refresh_token='old_refresh',
+            expires_at=datetime.utcfromtimestamp(time.time() + expires_in).replace(tzinfo=pytz.utc)
+        )
+
+    @httpretty.activate
+    @mock.patch('osf.models.external.enqueue_task')
+    def test_refresh_ahead_queues_refresh_of_valid_key(self, mock_enqueue):
+        # Inside refresh_time, but with more than OAUTH_REFRESH_AHEAD_MIN_VALIDITY left
+        external_account = self._due_account(200)
+        self.provider.account = external_account
+        self.addCleanup(cache.delete, REFRESH_AHEAD_LOCK_KEY.format(external_account._id))
+
+        assert_false(self.provider.refresh_oauth_key_ahead())
+        assert_false(self.provider.refresh_oauth_key_ahead())
+        external_account.reload()
+
+        assert_equal(external_account.oauth_key, 'old_key')
+        # Queued once while the first refresh is pending
+        assert_equal(mock_enqueue.call_count, 1)
+        assert_equal(mock_enqueue.call_args[0][0].args, (external_account._id, ))
+
+    @httpretty.activate
+    @mock.patch('osf.models.external.enqueue_task')
+    def test_refresh_ahead_refreshes_expiring_key(self, mock_enqueue):
+        external_account = self._due_account(10)
+        httpretty.register_uri(
+            httpretty.POST,
+            self.provider.auto_refresh_url,
+            body=json.dumps({
+                'access_token': 'refreshed_access_token',
+                'expires_in': 3600,
+                'refresh_token': 'refreshed_refresh_token'
+            })
+        )
+        self.provider.account = external_account
+
+        assert_true(self.provider.refresh_oauth_key_ahead())
+        external_account.reload()
+
+        assert_equal(external_account.oauth_key, 'refreshed_access_token')
+        assert_false(mock_enqueue.called)
+
+    @mock.patch('osf.models.external.enqueue_task')
+    def test_refresh_ahead_does_not_need_refresh(self, mock_enqueue):
+        self.provider.account = self._due_account(9999)
+
+        assert_false(self.provider.refresh_oauth_key_ahead())
+        assert_false(mock_enqueue.called)
+
+    @httpretty.activate
+    def test_refresh_external_account_task(self):
+        external_account = self._due_account(200)
+        httpretty.register_uri(
+            httpretty.POST,
+            self.provider.auto_refresh_url,
+            body=json.dumps({
+                'access_token': 'refreshed_access_token',
+                'expires_in': 3600,
+                'refresh_token': 'refreshed_refresh_token'
+            })
+        )
+        lock_key = REFRESH_AHEAD_LOCK_KEY.format(external_account._id)
+        cache.set(lock_key, True)
+
+        with mock.patch.dict('website.oauth.tasks.PROVIDER_LOOKUP', {'mock2': MockOAuth2Provider}):
+            refresh_external_account(external_account._id)
+        external_account.reload()
+
+        assert_equal(external_account.oauth_key, 'refreshed_access_token')
+        assert_equal(external_account.refresh_token, 'refreshed_refresh_token')
+        assert_is_none(cache.get(lock_key))
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
+import mock
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from nose.tools import *  # flake8: noqa (PEP8 asserts)
 from modularodm.exceptions import ValidationValueError
 
 from tests.base import OsfTestCase
 from osf_tests.factories import SubjectFactory, PreprintFactory, PreprintProviderFactory
 
+from osf.models import Subject
 from osf.models.validators import validate_subject_hierarchy
+from osf.utils import taxonomy
+from osf.utils.taxonomy import get_taxonomy_tree
 
 
 class TestSubjectTreeValidation(OsfTestCase):
@@ -175,3 +181,54 @@ class TestSubjectProperties(OsfTestCase):
         assert self.bepress_child.path == 'bepress|BePress Text|BePress Child'
         assert self.other_subj.path == 'asdf|Other Text'
         assert self.other_child.path == 'asdf|Other Text|Other Child'
+
+
+class TestSubjectTaxonomyCache(OsfTestCase):
+    def setUp(self):
+        super(TestSubjectTaxonomyCache, self).setUp()
+
+        self.provider = PreprintProviderFactory(_id='osf', share_title='bepress')
+        # Tests run in a transaction; treat the taxonomy as committed
+        with mock.patch.object(taxonomy.transaction, 'on_commit', side_effect=lambda func: func()):
+            self.root = SubjectFactory(text='Root', provider=self.provider)
+            self.parent = SubjectFactory(text='Parent', provider=self.provider, parent=self.root)
+            self.child = SubjectFactory(text='Child', provider=self.provider, parent=self.parent)
+
+    def test_hierarchy_is_served_from_memory(self):
+        get_taxonomy_tree(self.provider.id)
+        child = Subject.objects.get(id=self.child.id)
+        with CaptureQueriesContext(connection) as queries:
+            assert_equal(child.hierarchy, [self.root._id, self.parent._id, self.child._id])
+            assert_equal(Subject.objects.get(id=self.root.id).child_count, 1)
+        # Only the two Subject.objects.get
+        assert_equal(len(queries), 2)
+
+    def test_include_children(self):
+        subjects = Subject.objects.filter(id=self.root.id).include_children()
+        assert_equal(set(subjects), {self.root, self.parent, self.child})
+
+    def test_save_invalidates_tree(self):
+        assert_equal(self.root.child_count, 1)
+        other = SubjectFactory(text='Other', provider=self.provider)
+        other.parent = self.root
+        other.save()
+        assert_equal(self.root.child_count, 2)
+        assert_equal(Subject.objects.get(id=other.id).hierarchy, [self.root._id, other._id])
+
+    def test_delete_invalidates_tree(self):
+        self.child.delete()
+        assert_equal(self.parent.child_count, 0)
+        # Not cached until the deletion commits
+        assert_is_none(get_taxonomy_tree(self.provider.id))
+
+    def test_version_is_replaced_on_commit(self):
+        tree = get_taxonomy_tree(self.provider.id)
+        with mock.patch.object(taxonomy.transaction, 'on_commit') as mock_on_commit:
+            SubjectFactory(text='Other', provider=self.provider, parent=self.root)
+        # The other processes' trees are still current until the commit
+        assert_equal(taxonomy.cache.get(taxonomy.VERSION_KEY.format(self.provider.id)), tree.version)
+
+        for call in mock_on_commit.call_args_list:
+            call[0][0]()
+        assert_not_equal(taxonomy.cache.get(taxonomy.VERSION_KEY.format(self.provider.id)), tree.version)
+        assert_equal(get_taxonomy_tree(self.provider.id).child_count(self.root.id), 2)
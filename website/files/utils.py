@@ -14,6 +14,7 @@ def copy_files(src, target_node, parent=None, name=None):
     cloned.node = target_node
     cloned.name = name or cloned.name
     cloned.copied_from = src
+    cloned.download_count = 0
 
     cloned.save()
 
@@ -1,6 +1,8 @@
 from babel import dates, core, Locale
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 
-from osf.models import AbstractNode, OSFUser, NotificationDigest, NotificationSubscription
+from osf.models import AbstractNode, Contributor, Guid, NodeAncestry, OSFUser, NotificationDigest, NotificationSubscription
 
 from website import mails
 from website.notifications import constants
@@ -92,52 +94,95 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
     context['user'] = user
     node_lineage_ids = get_node_lineage(node) if node else []
 
-    for recipient_id in recipient_ids:
-        if recipient_id == user._id:
-            continue
-        recipient = OSFUser.load(recipient_id)
+    recipients = OSFUser.objects.filter(guids___id__in=set(recipient_ids) - {user._id})
+    digests = []
+    for recipient in recipients:
         context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
         message = mails.render_message(template, **context)
 
-        digest = NotificationDigest(
+        digests.append(NotificationDigest(
             timestamp=timestamp,
             send_type=notification_type,
             event=event,
             user=recipient,
             message=message,
             node_lineage=node_lineage_ids
-        )
-        digest.save()
-
-
-def compile_subscriptions(node, event_type, event=None, level=0):
-    """Recurse through node and parents for subscriptions.
+        ))
+    NotificationDigest.objects.bulk_create(digests)
+
+
+# Each user's subscription closest to the node wins, where the user can read the subscription's
+# node: either as a contributor with read access, or as an admin of that node or one of its
+# ancestors (see AbstractNode.has_permission). A subscription to the particular event on the node
+# itself beats its subscription to the event type. Users who cannot read the node are left out.
+SUBSCRIBERS_SQL = """
+    WITH lineage (node_id, depth) AS (
+      SELECT %(node_id)s, 0
+      UNION ALL
+      SELECT ancestor_id, depth FROM "{ancestry}" WHERE descendant_id = %(node_id)s
+    ), subscribers (user_id, notification_type, depth, rank) AS (
+      {subscribers}
+    ), readable (user_id, notification_type, depth, rank) AS (
+      SELECT * FROM subscribers AS S
+      WHERE EXISTS (
+        SELECT 1 FROM "{contributor}" AS C JOIN lineage AS L ON L.node_id = C.node_id
+        WHERE C.user_id = S.user_id AND ((L.depth = S.depth AND C.read) OR (L.depth >= S.depth AND C.admin))
+      )
+    )
+    SELECT DISTINCT ON (R.user_id)
+      R.notification_type,
+      (SELECT G._id FROM "{guid}" AS G
+       WHERE G.object_id = R.user_id AND G.content_type_id = %(user_content_type)s
+       ORDER BY G.created DESC LIMIT 1)
+    FROM readable AS R
+    WHERE EXISTS (
+      SELECT 1 FROM "{contributor}" AS C JOIN lineage AS L ON L.node_id = C.node_id
+      WHERE C.user_id = R.user_id AND ((L.depth = 0 AND C.read) OR C.admin)
+    )
+    ORDER BY R.user_id, R.rank;
+"""
+
+SUBSCRIBERS_OF_TYPE_SQL = """
+      SELECT T.osfuser_id, '{notification_type}', L.depth, L.depth * 2 + CASE WHEN S.event_name = %(event)s THEN 0 ELSE 1 END
+      FROM lineage AS L
+        JOIN "{subscription}" AS S ON S.node_id = L.node_id
+        JOIN "{users}" AS T ON T.notificationsubscription_id = S.id
+      WHERE S.event_name = %(event_type)s OR (L.depth = 0 AND S.event_name = %(event)s)
+"""
+
+
+def compile_subscriptions(node, event_type, event=None):
+    """Find the users subscribed to ``event_type`` on ``node`` or its parents, with one query.
 
     :param node: current node
     :param event_type: Generally node_subscriptions_available
     :param event: Particular event such a file_updated that has specific file subs
-    :param level: How deep the recursion is
     :return: a dict of notification types with lists of users.
     """
-    subscriptions = check_node(node, event_type)
-    if event:
-        subscriptions = check_node(node, event)  # Gets particular event subscriptions
-        parent_subscriptions = compile_subscriptions(node, event_type, level=level + 1)  # get node and parent subs
-    elif node.parent_id:
-        parent_subscriptions = \
-            compile_subscriptions(AbstractNode.load(node.parent_id), event_type, level=level + 1)
-    else:
-        parent_subscriptions = check_node(None, event_type)
-    for notification_type in parent_subscriptions:
-        p_sub_n = parent_subscriptions[notification_type]
-        p_sub_n.extend(subscriptions[notification_type])
-        for nt in subscriptions:
-            if notification_type != nt:
-                p_sub_n = list(set(p_sub_n).difference(set(subscriptions[nt])))
-        if level == 0:
-            p_sub_n, removed = utils.separate_users(node, p_sub_n)
-        parent_subscriptions[notification_type] = p_sub_n
-    return parent_subscriptions
+    subscriptions = {key: [] for key in constants.NOTIFICATION_TYPES}
+    sql = SUBSCRIBERS_SQL.format(
+        ancestry=NodeAncestry._meta.db_table,
+        contributor=Contributor._meta.db_table,
+        guid=Guid._meta.db_table,
+        subscribers='UNION ALL'.join(
+            SUBSCRIBERS_OF_TYPE_SQL.format(
+                notification_type=notification_type,
+                subscription=NotificationSubscription._meta.db_table,
+                users=getattr(NotificationSubscription, notification_type).through._meta.db_table,
+            )
+            for notification_type in constants.NOTIFICATION_TYPES
+        )
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            'node_id': node.pk,
+            'event': event or event_type,
+            'event_type': event_type,
+            'user_content_type': ContentType.objects.get_for_model(OSFUser).pk,
+        })
+        for notification_type, user_id in cursor.fetchall():
+            subscriptions[notification_type].append(user_id)
+    return subscriptions
 
 
 def check_node(node, event):
@@ -1,7 +1,19 @@
 """
 Tasks for making even transactional emails consolidated.
+
+Pending digests are read in keyset chunks of ``NOTIFICATION_DIGEST_CHUNK_SIZE``
+users, so no query has to hold every pending digest at once. Each chunk is
+claimed by deleting its digests before they are sent, so a run that crashes
+never sends an email twice when it is started again; at worst the emails of the
+chunk in flight are lost. Claimed digests are sent by a pool of
+``NOTIFICATION_DIGEST_SEND_CONCURRENCY`` threads, and digests whose email could
+not be sent are put back for the next run. Rendering the digest template reads
+the nodes' titles, so each sending thread opens its own database connection and
+closes it once the email is sent.
 """
+import functools
 import itertools
+from multiprocessing.pool import ThreadPool
 
 from django.db import connection
 
@@ -9,9 +21,34 @@ from framework.celery_tasks import app as celery_app
 from framework.sentry import log_exception
 from osf.models import OSFUser
 from osf.models import NotificationDigest
-from website import mails
+from website import mails, settings
 from website.notifications.utils import NotificationsDict
 
+DIGEST_FIELDS = ('id', '_id', 'user_id', 'timestamp', 'send_type', 'event', 'message', 'node_lineage')
+
+# The next ``limit`` users with pending digests, after the user with id ``after``
+DIGEST_USERS_SQL = """
+    SELECT DISTINCT user_id FROM osf_notificationdigest
+    WHERE send_type = %(send_type)s AND user_id > %(after)s
+    ORDER BY user_id
+    LIMIT %(limit)s
+"""
+
+DIGESTS_SQL = """
+    SELECT {fields} FROM osf_notificationdigest
+    WHERE send_type = %(send_type)s AND user_id IN ({users})
+    ORDER BY user_id, id;
+""".format(fields=', '.join(DIGEST_FIELDS), users=DIGEST_USERS_SQL)
+
+CLAIM_DIGESTS_SQL = """
+    WITH claimed AS (
+      DELETE FROM osf_notificationdigest
+      WHERE send_type = %(send_type)s AND user_id IN ({users})
+      RETURNING {fields}
+    )
+    SELECT * FROM claimed ORDER BY user_id, id;
+""".format(fields=', '.join(DIGEST_FIELDS), users=DIGEST_USERS_SQL)
+
 
 @celery_app.task(name='website.notifications.tasks.send_users_email', max_retries=0)
 def send_users_email(send_type):
@@ -20,24 +57,86 @@ def send_users_email(send_type):
     :param send_type
     :return:
     """
-    grouped_emails = get_users_emails(send_type)
-    for group in grouped_emails:
-        user = OSFUser.load(group['user_id'])
-        if not user:
-            log_exception()
-            continue
-        info = group['info']
-        notification_ids = [message['_id'] for message in info]
-        sorted_messages = group_by_node(info)
-        if sorted_messages:
-            mails.send_mail(
-                to_addr=user.username,
-                mimetype='html',
-                mail=mails.DIGEST,
-                name=user.fullname,
-                message=sorted_messages,
-            )
-            remove_notifications(email_notification_ids=notification_ids)
+    concurrency = settings.NOTIFICATION_DIGEST_SEND_CONCURRENCY
+    if concurrency > 1:
+        pool = ThreadPool(concurrency)
+        send = functools.partial(pool.map, _send_digest_email_in_thread)
+    else:
+        pool = None
+        send = functools.partial(map, _send_digest_email)
+    try:
+        for chunk in iter_digest_chunks(send_type, claim=True):
+            users = OSFUser.objects.filter(id__in=[user_id for user_id, _ in chunk]).in_bulk()
+            groups = []
+            failed = []
+            for user_id, digests in chunk:
+                if user_id not in users:
+                    log_exception()
+                    # Claimed, but not sent; put them back
+                    failed.extend(digests)
+                    continue
+                groups.append((users[user_id], digests))
+            sent = send(groups)
+            failed.extend(digest for (user, digests), ok in zip(groups, sent) if not ok for digest in digests)
+            if failed:
+                NotificationDigest.objects.bulk_create(
+                    NotificationDigest(**{field: digest[field] for field in DIGEST_FIELDS if field != 'id'})
+                    for digest in failed
+                )
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+
+def _send_digest_email(group):
+    user, digests = group
+    try:
+        mails.send_mail(
+            to_addr=user.username,
+            mimetype='html',
+            mail=mails.DIGEST,
+            name=user.fullname,
+            message=group_by_node(digests),
+        )
+    except Exception:
+        log_exception()
+        return False
+    return True
+
+
+def _send_digest_email_in_thread(group):
+    try:
+        return _send_digest_email(group)
+    finally:
+        # Don't leave the pool thread's connection open
+        connection.close()
+
+
+def iter_digest_chunks(send_type, claim=False, chunk_size=None):
+    """Yield lists of ``(user id, digests)`` for the users with pending digests of
+    ``send_type``, in order of user id and ``chunk_size`` users at a time.
+    Digests are dicts of ``DIGEST_FIELDS``.
+
+    :param bool claim: Delete the digests as they are read
+    """
+    sql = CLAIM_DIGESTS_SQL if claim else DIGESTS_SQL
+    params = {
+        'send_type': send_type,
+        'after': 0,
+        'limit': chunk_size or settings.NOTIFICATION_DIGEST_CHUNK_SIZE,
+    }
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = [dict(zip(DIGEST_FIELDS, row)) for row in cursor.fetchall()]
+        if not rows:
+            return
+        yield [
+            (user_id, list(digests))
+            for user_id, digests in itertools.groupby(rows, key=lambda row: row['user_id'])
+        ]
+        params['after'] = rows[-1]['user_id']
 
 
 def get_users_emails(send_type):
@@ -61,29 +160,17 @@ def get_users_emails(send_type):
             }
         }
     """
-
-    sql = """
-    SELECT json_build_object(
-            'user_id', osf_guid._id,
-            'info', json_agg(
-                json_build_object(
-                    'message', nd.message,
-                    'node_lineage', nd.node_lineage,
-                    '_id', nd._id
-                )
-            )
-        )
-    FROM osf_notificationdigest AS nd
-      LEFT JOIN osf_guid ON nd.user_id = osf_guid.object_id
-    WHERE send_type = %s
-    AND osf_guid.content_type_id = (SELECT id FROM django_content_type WHERE model = 'osfuser')
-    GROUP BY osf_guid.id
-    ORDER BY osf_guid.id ASC
-    """
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [send_type, ])
-        return itertools.chain.from_iterable(cursor.fetchall())
+    for chunk in iter_digest_chunks(send_type):
+        users = OSFUser.objects.filter(id__in=[user_id for user_id, _ in chunk]).in_bulk()
+        for user_id, digests in chunk:
+            yield {
+                'user_id': users[user_id]._id,
+                'info': [{
+                    'message': digest['message'],
+                    'node_lineage': digest['node_lineage'],
+                    '_id': digest['_id'],
+                } for digest in digests]
+            }
 
 
 def group_by_node(notifications, limit=15):
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+
+from framework.celery_tasks import app as celery_app
+from website.oauth.utils import PROVIDER_LOOKUP
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(ignore_results=True)
+def refresh_external_account(account_id):
+    """Refresh the oauth_key of an account queued by ``ExternalProvider.refresh_oauth_key_ahead``.
+    Does nothing if the key has been refreshed since it was queued.
+    """
+    # avoid circular imports
+    from osf.models.external import REFRESH_AHEAD_LOCK_KEY
+    ExternalAccount = apps.get_model('osf.ExternalAccount')
+    try:
+        with transaction.atomic():
+            # Locked so that refreshes of one account, which may invalidate its refresh token, run one at a time
+            account = ExternalAccount.load(account_id, select_for_update=True)
+            if account is None or account.provider not in PROVIDER_LOOKUP:
+                return
+            if PROVIDER_LOOKUP[account.provider](account).refresh_oauth_key():
+                logger.info('Refreshed the oauth_key of {!r} ahead of its expiry'.format(account))
+    finally:
+        cache.delete(REFRESH_AHEAD_LOCK_KEY.format(account_id))
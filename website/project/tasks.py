@@ -1,4 +1,5 @@
 from django.apps import apps
+from django.db import transaction
 import logging
 import urlparse
 import random
@@ -31,9 +32,35 @@ def on_node_updated(node_id, user_id, first_save, saved_fields, request_headers=
         need_update = False
 
     if need_update:
-        node.update_search()
+        node.update_search(saved_fields=saved_fields)
         update_node_share(node)
 
+@celery_app.task(ignore_results=True)
+def on_nodes_updated(node_ids, user_id, first_save, saved_fields, request_headers=None):
+    """Run on_node_updated for nodes that were created or updated together, in one task."""
+    for node_id in node_ids:
+        on_node_updated(node_id, user_id, first_save, saved_fields, request_headers)
+
+@celery_app.task(ignore_results=True)
+def check_nodes_spam(checks):
+    """Check nodes for spam after the requests that saved them, with one Akismet client.
+
+    :param list checks: [node_id, user_id, saved_fields, request_headers] of each saved node
+    """
+    AbstractNode = apps.get_model('osf.AbstractNode')
+    OSFUser = apps.get_model('osf.OSFUser')
+    users = {user._id: user for user in OSFUser.objects.filter(guids___id__in={check[1] for check in checks})}
+    for node_id, user_id, saved_fields, request_headers in checks:
+        user = users.get(user_id)
+        try:
+            with transaction.atomic():
+                # Locked so that repeated checks of one node apply their results one after the other
+                node = AbstractNode.load(node_id, select_for_update=True)
+                if node and user:
+                    node.apply_spam_check(user, saved_fields, request_headers)
+        except Exception as e:
+            logger.exception('Error checking node {} for spam: {}'.format(node_id, e))
+
 def update_node_share(node):
     # Wrapper that ensures share_url and token exist
     if settings.SHARE_URL:
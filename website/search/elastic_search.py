@@ -14,6 +14,9 @@ from framework import sentry
 import six
 
 from django.apps import apps
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.paginator import Paginator
 from django.db.models import Q
 from elasticsearch import (ConnectionError, Elasticsearch, NotFoundError,
@@ -313,11 +316,63 @@ def get_doctype_from_node(node):
         return node.category
 
 @celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
-def update_node_async(self, node_id, index=None, bulk=False):
+def update_node_async(self, node_id, index=None, bulk=False, reindex_files=True):
+    if debounce_enabled() and not bulk:
+        return debounce_node_update(node_id, index=index, reindex_files=reindex_files)
     AbstractNode = apps.get_model('osf.AbstractNode')
     node = AbstractNode.load(node_id)
     try:
-        update_node(node=node, index=index, bulk=bulk, async=True)
+        update_node(node=node, index=index, bulk=bulk, async=True, reindex_files=reindex_files)
+    except Exception as exc:
+        self.retry(exc=exc)
+
+def _debounce_keys(node_id, index):
+    index = index or INDEX
+    return (
+        'search:node-scheduled:{}:{}'.format(index, node_id),
+        'search:node-files:{}:{}'.format(index, node_id),
+    )
+
+def debounce_enabled():
+    """Coalescing needs the markers to be shared by every process: a marker set in
+    a per-process cache is never cleared by the worker that runs the reindex, and
+    would make that process drop the node's updates until the marker expires.
+    """
+    if not (settings.SEARCH_INDEX_DEBOUNCE and settings.USE_CELERY):
+        return False
+    if isinstance(caches['default'], (LocMemCache, DummyCache)):
+        logger.warn('SEARCH_INDEX_DEBOUNCE is ignored without a shared cache in CACHES')
+        return False
+    return True
+
+def debounce_node_update(node_id, index=None, reindex_files=True):
+    """Schedule ``node_id`` to be reindexed in ``SEARCH_INDEX_DEBOUNCE`` seconds,
+    unless a reindex is already scheduled, in which case that one will pick up
+    this change. Whether files need reindexing is accumulated across coalesced updates.
+    """
+    scheduled_key, files_key = _debounce_keys(node_id, index)
+    timeout = settings.SEARCH_INDEX_DEBOUNCE + settings.SEARCH_INDEX_DEBOUNCE_GRACE
+    if reindex_files:
+        cache.set(files_key, True, timeout)
+    if cache.add(scheduled_key, True, timeout):
+        index_node_debounced.apply_async(
+            kwargs={'node_id': node_id, 'index': index, 'reindex_files': reindex_files},
+            countdown=settings.SEARCH_INDEX_DEBOUNCE,
+        )
+        return True
+    return False
+
+@celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
+def index_node_debounced(self, node_id, index=None, reindex_files=True):
+    scheduled_key, files_key = _debounce_keys(node_id, index)
+    reindex_files = reindex_files or bool(cache.get(files_key))
+    # Clear the markers before reading the node, so that changes committed
+    # from now on schedule a new reindex rather than being coalesced into this one
+    cache.delete_many([scheduled_key, files_key])
+    AbstractNode = apps.get_model('osf.AbstractNode')
+    node = AbstractNode.load(node_id)
+    try:
+        update_node(node=node, index=index, async=True, reindex_files=reindex_files, refresh=False)
     except Exception as exc:
         self.retry(exc=exc)
 
@@ -381,22 +436,47 @@ def serialize_node(node, category):
 
     return elastic_document
 
-@requires_search
-def update_node(node, index=None, bulk=False, async=False):
+def _send_bulk(actions, refresh=False):
+    """Send ``actions`` in one bulk request, ignoring deletes of missing documents."""
+    if not actions:
+        return
+    _, errors = helpers.bulk(client(), actions, refresh=refresh, raise_on_error=False)
+    errors = [
+        error for error in errors
+        if error.get('delete', {}).get('status') != 404
+    ]
+    if errors:
+        raise exceptions.SearchException('Bulk indexing failed: {}'.format(errors))
+
+def file_actions(node, index=None):
+    """Bulk actions to reindex or remove every OsfStorage file of ``node``."""
     from addons.osfstorage.models import OsfStorageFile
     index = index or INDEX
+    actions = []
     for file_ in paginated(OsfStorageFile, Q(node=node)):
-        update_file(file_, index=index)
+        file_doc = serialize_file(file_)
+        if file_doc is None:
+            actions.append({'_op_type': 'delete', '_index': index, '_type': 'file', '_id': file_._id})
+        else:
+            actions.append({'_op_type': 'index', '_index': index, '_type': 'file', '_id': file_._id, '_source': file_doc})
+    return actions
+
+@requires_search
+def update_node(node, index=None, bulk=False, async=False, reindex_files=True, refresh=True):
+    index = index or INDEX
+    actions = file_actions(node, index=index) if reindex_files else []
 
     if node.is_deleted or not node.is_public or node.archiving or (node.is_spammy and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or node.is_quickfiles:
+        _send_bulk(actions, refresh=refresh)
         delete_doc(node._id, node, index=index)
     else:
         category = get_doctype_from_node(node)
         elastic_document = serialize_node(node, category)
         if bulk:
+            _send_bulk(actions, refresh=refresh)
             return elastic_document
-        else:
-            client().index(index=index, doc_type=category, id=node._id, body=elastic_document, refresh=True)
+        actions.append({'_op_type': 'index', '_index': index, '_type': category, '_id': node._id, '_source': elastic_document})
+        _send_bulk(actions, refresh=refresh)
 
 def bulk_update_nodes(serialize, nodes, index=None):
     """Updates the list of input projects
@@ -444,28 +524,7 @@ def update_contributors_async(self, user_id):
     for page_num in p.page_range:
         bulk_update_contributors(p.page(page_num).object_list)
 
-@requires_search
-def update_user(user, index=None):
-
-    index = index or INDEX
-    if not user.is_active:
-        try:
-            client().delete(index=index, doc_type='user', id=user._id, refresh=True, ignore=[404])
-            # update files in their quickfiles node if the user has been marked as spam
-            if 'spam_confirmed' in user.system_tags:
-                quickfiles = QuickFilesNode.objects.get_for_user(user)
-                for quickfile_id in quickfiles.files.values_list('_id', flat=True):
-                    client().delete(
-                        index=index,
-                        doc_type='file',
-                        id=quickfile_id,
-                        refresh=True,
-                        ignore=[404]
-                    )
-        except NotFoundError:
-            pass
-        return
-
+def serialize_user(user):
     names = dict(
         fullname=user.fullname,
         given_name=user.given_name,
@@ -483,7 +542,7 @@ def update_user(user, index=None):
                 pass  # This is fine, will only happen in 2.x if val is already unicode
             normalized_names[key] = unicodedata.normalize('NFKD', val).encode('ascii', 'ignore')
 
-    user_doc = {
+    return {
         'id': user._id,
         'user': user.fullname,
         'normalized_user': normalized_names['fullname'],
@@ -500,22 +559,54 @@ def update_user(user, index=None):
         'boost': 2,  # TODO(fabianvf): Probably should make this a constant or something
     }
 
-    client().index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
+@requires_search
+def bulk_update_users(users, index=None):
+    """Index the active users in ``users`` in a single bulk request. Inactive
+    users are skipped rather than removed; use ``update_user`` for those.
+    """
+    index = index or INDEX
+    actions = [
+        {
+            '_op_type': 'index',
+            '_index': index,
+            '_type': 'user',
+            '_id': user._id,
+            '_source': serialize_user(user),
+        }
+        for user in users if user.is_active
+    ]
+    _send_bulk(actions)
+    return len(actions)
 
 @requires_search
-def update_file(file_, index=None, delete=False):
+def update_user(user, index=None):
+
     index = index or INDEX
+    if not user.is_active:
+        try:
+            client().delete(index=index, doc_type='user', id=user._id, refresh=True, ignore=[404])
+            # update files in their quickfiles node if the user has been marked as spam
+            if 'spam_confirmed' in user.system_tags:
+                quickfiles = QuickFilesNode.objects.get_for_user(user)
+                for quickfile_id in quickfiles.files.values_list('_id', flat=True):
+                    client().delete(
+                        index=index,
+                        doc_type='file',
+                        id=quickfile_id,
+                        refresh=True,
+                        ignore=[404]
+                    )
+        except NotFoundError:
+            pass
+        return
+
+    client().index(index=index, doc_type='user', body=serialize_user(user), id=user._id, refresh=True)
 
+def serialize_file(file_):
+    """Return the search document for ``file_``, or None if it should not be searchable."""
     # TODO: Can remove 'not file_.name' if we remove all base file nodes with name=None
-    if not file_.name or not file_.node.is_public or delete or file_.node.is_deleted or file_.node.archiving:
-        client().delete(
-            index=index,
-            doc_type='file',
-            id=file_._id,
-            refresh=True,
-            ignore=[404]
-        )
-        return
+    if not file_.name or not file_.node.is_public or file_.node.is_deleted or file_.node.archiving:
+        return None
 
     # We build URLs manually here so that this function can be
     # run outside of a Flask request context (e.g. in a celery task)
@@ -530,7 +621,7 @@ def update_file(file_, index=None, delete=False):
     file_guid = file_.get_guid(create=False)
     if file_guid:
         guid_url = '/{file_guid}/'.format(file_guid=file_guid._id)
-    file_doc = {
+    return {
         'id': file_._id,
         'deep_url': file_deep_url,
         'guid_url': guid_url,
@@ -545,6 +636,21 @@ def update_file(file_, index=None, delete=False):
         'extra_search_terms': clean_splitters(file_.name),
     }
 
+@requires_search
+def update_file(file_, index=None, delete=False):
+    index = index or INDEX
+
+    file_doc = None if delete else serialize_file(file_)
+    if file_doc is None:
+        client().delete(
+            index=index,
+            doc_type='file',
+            id=file_._id,
+            refresh=True,
+            ignore=[404]
+        )
+        return
+
     client().index(
         index=index,
         doc_type='file',
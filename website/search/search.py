@@ -30,6 +30,9 @@ def update_node(node, index=None, bulk=False, async=True, saved_fields=None):
         'index': index,
         'bulk': bulk
     }
+    if saved_fields is not None:
+        # Only reindex the node's files if a field that appears in file documents changed
+        kwargs['reindex_files'] = bool(node.FILE_SEARCH_UPDATE_FIELDS.intersection(saved_fields))
     if async:
         node_id = node._id
         # We need the transaction to be committed before trying to run celery tasks.
@@ -3,9 +3,18 @@
 '''Migration script for Search-enabled Models.'''
 from __future__ import absolute_import
 
+import functools
+import json
 import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import time
 
-from django.db.models import Q
+from dateutil.parser import parse as parse_date
+from django.db import connections
+from django.db.models import Max, Min, Q
 from django.utils import timezone
 from elasticsearch import helpers
 
@@ -15,6 +24,7 @@ from scripts import utils as script_utils
 from osf.models import OSFUser, Institution, AbstractNode
 from website import settings
 from website.app import init_app
+from website.search import elastic_search
 from website.search.elastic_search import client as es_client
 from website.search.search import update_institution
 
@@ -41,12 +51,10 @@ def migrate_users(index):
     logger.info('Migrating users to index: {}'.format(index))
     n_migr = 0
     n_iter = 0
-    users = paginated(OSFUser, query=None, each=True)
-    for user in users:
-        if user.is_active:
-            search.update_user(user, index=index)
-            n_migr += 1
-        n_iter += 1
+    pages = paginated(OSFUser, query=None, increment=500, each=False)
+    for page in pages:
+        n_migr += elastic_search.bulk_update_users(page, index=index)
+        n_iter += len(page)
 
     logger.info('Users iterated: {0}\nUsers migrated: {1}'.format(n_iter, n_migr))
 
@@ -54,7 +62,164 @@ def migrate_institutions(index):
     for inst in Institution.objects.filter(is_deleted=False):
         update_institution(inst, index)
 
-def migrate(delete, index=None, app=None):
+def _node_query():
+    return AbstractNode.objects.filter(is_public=True, is_deleted=False)
+
+def _user_query():
+    return OSFUser.objects.filter(is_active=True)
+
+def _index_nodes(nodes, index):
+    serialize = functools.partial(search.update_node, index=index, bulk=True, async=False)
+    search.bulk_update_nodes(serialize, nodes, index=index)
+    return len(nodes)
+
+def _index_users(users, index):
+    return elastic_search.bulk_update_users(users, index=index)
+
+# kind -> (queryset factory, bulk indexing function, relations to include)
+PARALLEL_KINDS = {
+    'nodes': (_node_query, _index_nodes, ['contributor__user__guids']),
+    'users': (_user_query, _index_users, None),
+}
+
+
+class Checkpoints(object):
+    """Progress of a parallel reindex, stored as one small JSON file per shard
+    (plus a manifest naming the target index) so an interrupted run can resume.
+    """
+
+    def __init__(self, directory, index):
+        self.directory = os.path.join(directory, index)
+
+    def _path(self, name):
+        return os.path.join(self.directory, '{}.json'.format(name))
+
+    def _read(self, name):
+        try:
+            with open(self._path(name)) as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return None
+
+    def _write(self, name, data):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                pass  # Created by another worker
+        tmp_path = '{}.tmp'.format(self._path(name))
+        with open(tmp_path, 'w') as fp:
+            json.dump(data, fp)
+        os.rename(tmp_path, self._path(name))
+
+    def get_manifest(self):
+        return self._read('manifest')
+
+    def set_manifest(self, new_index, start_time):
+        self._write('manifest', {'index': new_index, 'start_time': start_time.isoformat()})
+
+    def get_last_id(self, kind, shard):
+        data = self._read('{}-{}'.format(kind, shard))
+        return data['last_id'] if data else None
+
+    def set_last_id(self, kind, shard, last_id):
+        self._write('{}-{}'.format(kind, shard), {'last_id': last_id})
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            os.rmdir(self.directory)
+
+
+def shard_ranges(queryset, shards):
+    """Split the primary key space of ``queryset`` into ``shards`` contiguous [start, end) ranges."""
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    step = int(math.ceil((bounds['high'] - bounds['low'] + 1) / float(shards)))
+    return [
+        (start, min(start + step, bounds['high'] + 1))
+        for start in range(bounds['low'], bounds['high'] + 1, step)
+    ]
+
+
+def reindex_shard(kind, shard, start, end, index, checkpoint_dir, chunk_size=500):
+    """Stream one shard of ``kind`` into ``index`` in keyset-paginated bulk requests,
+    recording the last indexed id after every chunk. Runs in a worker process.
+    """
+    # Don't share the parent's connections across the fork
+    connections.close_all()
+    elastic_search.CLIENT = None
+
+    get_queryset, index_chunk, include = PARALLEL_KINDS[kind]
+    checkpoints = Checkpoints(checkpoint_dir, index)
+    last_id = checkpoints.get_last_id(kind, shard)
+    if last_id is None:
+        last_id = start - 1
+    queryset = get_queryset().filter(id__lt=end).order_by('id')
+    if include:
+        # Same prefetching as the serial migration, to avoid queries per document
+        queryset = queryset.include(*include)
+
+    indexed = 0
+    started = time.time()
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        indexed += index_chunk(chunk, index)
+        last_id = chunk[-1].id
+        checkpoints.set_last_id(kind, shard, last_id)
+        logger.info('{} shard {}: {} documents indexed, {:.1f} docs/s, at id {} of [{}, {})'.format(
+            kind, shard, indexed, indexed / max(time.time() - started, 0.001), last_id, start, end
+        ))
+    return kind, shard, indexed, time.time() - started
+
+
+def _reindex_shard_star(args):
+    return reindex_shard(*args)
+
+
+def migrate_parallel(new_index, workers, checkpoint_dir, chunk_size=500):
+    """Reindex nodes and users into ``new_index`` using ``workers`` processes.
+    Raises if any shard fails, so the caller does not switch the alias.
+    """
+    jobs = []
+    for kind, (get_queryset, _, _) in PARALLEL_KINDS.items():
+        for shard, (start, end) in enumerate(shard_ranges(get_queryset(), workers)):
+            jobs.append((kind, shard, start, end, new_index, checkpoint_dir, chunk_size))
+
+    logger.info('Reindexing {} shards into {} with {} workers'.format(len(jobs), new_index, workers))
+    started = time.time()
+    total = 0
+    # Connections must not be inherited by the forked workers
+    connections.close_all()
+    pool = multiprocessing.Pool(workers)
+    try:
+        for kind, shard, indexed, elapsed in pool.imap_unordered(_reindex_shard_star, jobs):
+            total += indexed
+            logger.info('{} shard {} finished: {} documents in {:.0f}s. {} documents total, {:.1f} docs/s overall'.format(
+                kind, shard, indexed, elapsed, total, total / max(time.time() - started, 0.001)
+            ))
+        pool.close()
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return total
+
+
+def migrate(delete, index=None, app=None, workers=0, resume=False, checkpoint_dir=None):
+    """Reindex every search-enabled model into a new versioned index, then point
+    the ``index`` alias at it.
+
+    :param int workers: If greater than 0, reindex nodes and users in this many
+        processes, sharded by id, recording progress under ``checkpoint_dir``.
+    :param bool resume: Continue an interrupted parallel run instead of
+        starting from a new index.
+    """
     index = index or settings.ELASTIC_INDEX
     app = app or init_app('website.settings', set_backends=True, routes=True)
 
@@ -65,13 +230,34 @@ def migrate(delete, index=None, app=None):
     ctx = app.test_request_context()
     ctx.push()
 
-    new_index = set_up_index(index)
-    start_time = timezone.now()
+    checkpoints = None
+    manifest = None
+    if workers:
+        checkpoint_dir = checkpoint_dir or os.path.join(tempfile.gettempdir(), 'osf-search-migration')
+        checkpoints = Checkpoints(checkpoint_dir, index)
+        manifest = checkpoints.get_manifest() if resume else None
+        if resume and not manifest:
+            logger.warn('No interrupted reindex of {} found; starting a new one'.format(index))
+        elif not resume:
+            checkpoints.clear()
+
+    if manifest:
+        new_index = manifest['index']
+        start_time = parse_date(manifest['start_time'])
+        logger.info('Resuming reindex into {} started at {}'.format(new_index, start_time))
+    else:
+        new_index = set_up_index(index)
+        start_time = timezone.now()
+        if checkpoints:
+            checkpoints.set_manifest(new_index, start_time)
 
     if settings.ENABLE_INSTITUTIONS:
         migrate_institutions(new_index)
-    migrate_nodes(new_index)
-    migrate_users(new_index)
+    if workers:
+        migrate_parallel(new_index, workers, checkpoint_dir)
+    else:
+        migrate_nodes(new_index)
+        migrate_users(new_index)
 
     set_up_alias(index, new_index)
 
@@ -81,6 +267,9 @@ def migrate(delete, index=None, app=None):
     if delete:
         delete_old(new_index)
 
+    if checkpoints:
+        checkpoints.clear()
+
     ctx.pop()
 
 def set_up_index(idx):
@@ -42,12 +42,17 @@ EXPIRATION_TIME_DICT = {
 }
 
 CITATION_STYLES_PATH = os.path.join(BASE_PATH, 'static', 'vendor', 'bower_components', 'styles')
+# Parsed CSL styles each process keeps, and seconds rendered citations are cached; 0 disables
+CITATION_STYLE_CACHE_SIZE = 64
+CITATION_CACHE_TIMEOUT = 60 * 60 * 24
 
 # Minimum seconds between forgot password email attempts
 SEND_EMAIL_THROTTLE = 30
 
 # Seconds that must elapse before updating a user's date_last_login field
 DATE_LAST_LOGIN_THROTTLE = 60
+# Seconds between the batched date_last_login updates issued by each process
+DATE_LAST_LOGIN_FLUSH_INTERVAL = 10
 
 # Hours before pending embargo/retraction/registration automatically becomes active
 RETRACTION_PENDING_TIME = datetime.timedelta(days=2)
@@ -80,6 +85,9 @@ PREPRINT_PROVIDER_DOMAINS = {
     'prefix': PROTOCOL,
     'suffix': '/'
 }
+# Seconds each process keeps a provider's subject taxonomy in memory; 0 disables.
+# Without a shared CACHES backend trees are kept for at most a minute (see osf.utils.taxonomy).
+SUBJECT_TAXONOMY_CACHE_TIMEOUT = 60 * 60
 # External Ember App Local Development
 USE_EXTERNAL_EMBER = False
 PROXY_EMBER_APPS = False
@@ -98,6 +106,13 @@ SEARCH_ENGINE = 'elastic'  # Can be 'elastic', or None
 ELASTIC_URI = 'localhost:9200'
 ELASTIC_TIMEOUT = 10
 ELASTIC_INDEX = 'website'
+# Seconds to wait before reindexing an updated node; further updates to the
+# same node within this window are coalesced into a single reindex.
+# 0 (the default) reindexes immediately. Requires USE_CELERY and a CACHES
+# backend shared by all processes (e.g. memcached); ignored otherwise.
+SEARCH_INDEX_DEBOUNCE = 0
+# Extra seconds the coalescing markers live in the cache past the debounce window
+SEARCH_INDEX_DEBOUNCE_GRACE = 300
 
 # Sessions
 COOKIE_NAME = 'osf'
@@ -109,6 +124,16 @@ OSF_SESSION_TIMEOUT = 30 * 24 * 60 * 60  # 30 days in seconds
 SECRET_KEY = 'CHANGEME'
 SESSION_COOKIE_SECURE = SECURE_MODE
 SESSION_COOKIE_HTTPONLY = True
+# Sessions kept in each process's LRU cache, and for how many seconds; 0 (the default) disables the cache.
+# Other processes can serve a logged out or changed session from their cache until it expires,
+# so only enable it where that delay is acceptable, and keep the timeout short.
+SESSION_CACHE_SIZE = 0
+SESSION_CACHE_TIMEOUT = 5
+# Alias in CACHES of a cache shared between processes, e.g. memcached; None disables it
+SESSION_CACHE_BACKEND = None
+SESSION_SHARED_CACHE_TIMEOUT = 60 * 60
+# Write session changes to the database after the response; requires SESSION_CACHE_BACKEND
+SESSION_WRITE_BEHIND = False
 
 # local path to private key and cert for local development using https, overwrite in local.py
 OSF_SERVER_KEY = None
@@ -154,6 +179,22 @@ MAILGUN_API_KEY = None
 # Use Celery for file rendering
 USE_CELERY = True
 
+# Postcommit tasks (varnish bans, search updates, ...) run on a process-wide
+# pool of greenlets after the response has been returned.
+# Set POSTCOMMIT_ASYNC to False to run them synchronously at the end of the request.
+POSTCOMMIT_ASYNC = True
+POSTCOMMIT_POOL_SIZE = 30  # one db connection per greenlet
+POSTCOMMIT_QUEUE_SIZE = 1000
+# Seconds to wait for room in a full queue before running the task inline
+POSTCOMMIT_QUEUE_TIMEOUT = 1.0
+POSTCOMMIT_TASK_TIMEOUT = 5.0
+
+# Page view, download and user activity counts are buffered in each process and
+# written every ANALYTICS_FLUSH_INTERVAL seconds, or once ANALYTICS_FLUSH_MAX_KEYS
+# counters are pending. Set ANALYTICS_FLUSH_INTERVAL to 0 to write them immediately.
+ANALYTICS_FLUSH_INTERVAL = 10
+ANALYTICS_FLUSH_MAX_KEYS = 10000
+
 # File rendering timeout (in ms)
 MFR_TIMEOUT = 30000
 
@@ -177,8 +218,23 @@ CANONICAL_DOMAIN = 'openscienceframework.org'
 COOKIE_DOMAIN = '.openscienceframework.org'  # Beaker
 SHORT_DOMAIN = 'osf.io'
 
+# Threads refreshing external account tokens in refresh_addon_tokens, and accounts refreshed
+# and saved at a time
+OAUTH_REFRESH_CONCURRENCY = 8
+OAUTH_REFRESH_BATCH_SIZE = 100
+# Seconds an oauth_key due for a refresh must still be valid for WaterButler to be given it
+# while a queued task refreshes it; closer to expiry it is refreshed during the request
+OAUTH_REFRESH_AHEAD_MIN_VALIDITY = 60
+
+# Users whose notification digests are read and sent at a time, and threads sending them
+NOTIFICATION_DIGEST_CHUNK_SIZE = 500
+NOTIFICATION_DIGEST_SEND_CONCURRENCY = 8
+
 # TODO: Combine Python and JavaScript config
 COMMENT_MAXLENGTH = 500
+# Seconds to keep each user's unread comment counts in the Django cache; 0 disables.
+# Use a shared cache backend (e.g. memcached) so invalidations reach every process.
+UNREAD_COMMENTS_CACHE_TIMEOUT = 0
 
 # Profile image options
 PROFILE_IMAGE_LARGE = 70
@@ -188,6 +244,9 @@ PROFILE_IMAGE_SMALL = 20
 # Conference options
 CONFERENCE_MIN_COUNT = 5
 
+# Seconds to cache the rendered HTML and text of wiki page versions; 0 disables
+WIKI_RENDER_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
 WIKI_WHITELIST = {
     'tags': [
         'a', 'abbr', 'acronym', 'b', 'bdo', 'big', 'blockquote', 'br',
@@ -333,6 +392,16 @@ ARCHIVE_TIMEOUT_TIMEDELTA = timedelta(1)  # 24 hours
 
 ENABLE_ARCHIVER = True
 
+# Folders listed at once while statting an addon's file tree, and the WaterButler
+# listings per second (per worker process) allowed for each provider; 0 is unlimited
+ARCHIVER_CRAWL_CONCURRENCY = 8
+ARCHIVER_CRAWL_RATE_LIMIT = 5
+ARCHIVER_CRAWL_RATE_LIMITS = {}  # e.g. {'dropbox': 10}
+# Retries of listings that fail with 429 or 5xx, waiting ARCHIVER_CRAWL_RETRY_BACKOFF
+# seconds before the first and twice as long before every following one
+ARCHIVER_CRAWL_MAX_RETRIES = 5
+ARCHIVER_CRAWL_RETRY_BACKOFF = 1
+
 JWT_SECRET = 'changeme'
 JWT_ALGORITHM = 'HS256'
 
@@ -419,6 +488,7 @@ CELERY_IMPORTS = (
     'website.archiver.tasks',
     'website.search.search',
     'website.project.tasks',
+    'website.oauth.tasks',
     'scripts.populate_new_and_noteworthy_projects',
     'scripts.populate_popular_projects_and_registrations',
     'scripts.refresh_addon_tokens',
@@ -529,6 +599,7 @@ else:
         'generate_sitemap': {
             'task': 'scripts.generate_sitemap',
             'schedule': crontab(minute=0, hour=0),  # Daily 12:00 a.m.
+            'kwargs': {'incremental': True},
         }
     }
 
@@ -598,6 +669,9 @@ ENABLE_INSTITUTIONS = True
 ENABLE_VARNISH = False
 ENABLE_ESI = False
 VARNISH_SERVERS = []  # This should be set in local.py or cache invalidation won't work
+VARNISH_BAN_TIMEOUT = 0.3  # seconds
+# Bans queued during a request are merged into regexes of at most this many characters
+VARNISH_BAN_MAX_PATTERN_LENGTH = 2000
 ESI_MEDIA_TYPES = {'application/vnd.api+json', 'application/json'}
 
 # Used for gathering meta information about the current build
@@ -1814,6 +1888,9 @@ SITEMAP_TO_S3 = False
 SITEMAP_AWS_BUCKET = None
 SITEMAP_URL_MAX = 25000
 SITEMAP_INDEX_MAX = 50000
+# Rows read per query, and worker processes generating the user, node and preprint sections
+SITEMAP_QUERY_CHUNK_SIZE = 10000
+SITEMAP_PROCESSES = 3
 SITEMAP_STATIC_URLS = [
     OrderedDict([('loc', ''), ('changefreq', 'yearly'), ('priority', '0.5')]),
     OrderedDict([('loc', 'preprints'), ('changefreq', 'yearly'), ('priority', '0.5')]),
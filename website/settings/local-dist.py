@@ -53,6 +53,7 @@ ELASTIC_TIMEOUT = 10
 
 # Comment out to use celery in development
 USE_CELERY = False
+POSTCOMMIT_ASYNC = False  # Run postcommit tasks before returning the response
 
 # Email
 USE_EMAIL = False
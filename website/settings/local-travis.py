@@ -38,6 +38,13 @@ SEARCH_ENGINE = 'elastic'
 
 USE_EMAIL = False
 USE_CELERY = False
+POSTCOMMIT_ASYNC = False  # Run postcommit tasks before returning the response
+SESSION_CACHE_SIZE = 0  # Tests change sessions behind the cache's back
+ANALYTICS_FLUSH_INTERVAL = 0  # Tests read counters right after updating them
+DATE_LAST_LOGIN_FLUSH_INTERVAL = 0  # No flushing thread outside the test transaction
+NOTIFICATION_DIGEST_SEND_CONCURRENCY = 1  # Sending threads would not see the test transaction
+SITEMAP_PROCESSES = 1  # Worker processes would not see the test transaction
+ARCHIVER_CRAWL_RATE_LIMIT = 0  # WaterButler is mocked
 
 # Email
 MAIL_SERVER = 'localhost:1025'  # For local testing
@@ -160,10 +160,11 @@ def waterbutler_url_for(route, provider, path, node, user=None, _internal=False,
         'provider': provider,
     })
 
-    if user:
-        url.args['cookie'] = user.get_or_create_cookie()
-    elif website_settings.COOKIE_NAME in request.cookies:
-        url.args['cookie'] = request.cookies[website_settings.COOKIE_NAME]
+    if 'cookie' not in kwargs:  # An explicit cookie saves looking up the user's session
+        if user:
+            url.args['cookie'] = user.get_or_create_cookie()
+        elif website_settings.COOKIE_NAME in request.cookies:
+            url.args['cookie'] = request.cookies[website_settings.COOKIE_NAME]
 
     view_only = False
     if 'view_only' in kwargs:
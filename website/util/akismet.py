@@ -19,6 +19,8 @@ class AkismetClient(object):
         self.apikey = apikey
         self.website = website
         self._apikey_is_valid = None
+        # Keeps connections to Akismet open between checks
+        self._session = requests.Session()
         if verify:
             self._verify_apikey()
 
@@ -32,7 +34,7 @@ class AkismetClient(object):
         if self._apikey_is_valid is not None:
             return self._apikey_is_valid
         else:
-            res = requests.post(
+            res = self._session.post(
                 '{}{}/1.1/verify-key'.format(self.API_PROTOCOL, self.API_HOST),
                 data={
                     'key': self.apikey,
@@ -69,7 +71,7 @@ class AkismetClient(object):
         data['user_agent'] = user_agent
 
         try:
-            res = requests.post(
+            res = self._session.post(
                 '{}{}.{}/1.1/comment-check'.format(self.API_PROTOCOL, self.apikey, self.API_HOST),
                 data=data,
                 headers=self._default_headers,
@@ -92,7 +94,7 @@ class AkismetClient(object):
         data['user_ip'] = user_ip
         data['user_agent'] = user_agent
 
-        res = requests.post(
+        res = self._session.post(
             '{}{}.{}/1.1/submit-spam'.format(self.API_PROTOCOL, self.apikey, self.API_HOST),
             data=data,
             headers=self._default_headers
@@ -112,7 +114,7 @@ class AkismetClient(object):
         data['user_ip'] = user_ip
         data['user_agent'] = user_agent
 
-        res = requests.post(
+        res = self._session.post(
             '{}{}.{}/1.1/submit-ham'.format(self.API_PROTOCOL, self.apikey, self.API_HOST),
             data=data,
             headers=self._default_headers
@@ -9,6 +9,7 @@ from django.utils import timezone
 
 from framework import sentry
 from framework.auth.decorators import Auth
+from osf.utils.permission_resolver import prefetch_permissions
 
 from django.apps import apps
 
@@ -156,6 +157,11 @@ class NodeFileCollector(object):
         self.node = node.child if isinstance(node, NodeRelation) else node
         self.auth = auth
         self.extra = kwargs
+        if auth and auth.user:
+            # Every component in the tree is permission-checked; load them all at once
+            AbstractNode = apps.get_model('osf.AbstractNode')
+            component_ids = AbstractNode.objects.get_children(self.node).values_list('id', flat=True)
+            prefetch_permissions(auth.user, [self.node.id] + list(component_ids))
         self.can_view = self.node.can_view(auth)
         self.can_edit = self.node.can_edit(auth) and not self.node.is_registration
 
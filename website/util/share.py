@@ -77,6 +77,8 @@ def format_subject(subject, context=None):
         is_deleted=False,
         uri=subject.absolute_api_v2_url,
     )
-    context[subject.id].attrs['parent'] = format_subject(subject.parent, context)
+    # object_hierarchy comes from the cached taxonomy, unlike subject.parent
+    parent = subject.object_hierarchy[-2] if len(subject.object_hierarchy) > 1 else None
+    context[subject.id].attrs['parent'] = format_subject(parent, context)
     context[subject.id].attrs['central_synonym'] = format_subject(subject.bepress_subject, context)
     return context[subject.id]